@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+    Copyright (C) 2025 plugin.video.youtube
+
+    SPDX-License-Identifier: GPL-2.0-only
+    See LICENSES/GPL-2.0-only for more information.
+
+    Load test of the httpd with concurrent range clients.
+
+    Each of --clients clients makes --requests sequential range requests of
+    --range-size KiB over a kept alive connection to the httpd. The httpd
+    relays each range from a local stand-in upstream, optionally limited to
+    --rate MiB/s per connection, using RequestHandler._relay_content. Two
+    servers are compared:
+
+      threading  a thread per connection with no limit, as the httpd used
+                 before the bounded server (ThreadingMixIn)
+      bounded    HTTPServer, with connections queued for a fixed pool of
+                 MAX_WORKERS worker threads
+
+    threads is the peak number of threads in the process, including the
+    clients and the upstream, and started is the number of threads started
+    by the server under test.
+
+    Usage: python3 bench_httpd_load.py [--clients N] [--requests N]
+                                       [--range-size KiB] [--rate MiB/s]
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import resource
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import TCPServer, ThreadingMixIn
+
+import kodi_env
+
+
+kodi_env.setup()
+
+import requests  # noqa: E402
+from requests.adapters import HTTPAdapter  # noqa: E402
+
+from youtube_plugin.kodion.network.http_server import (  # noqa: E402
+    HTTPServer,
+    RequestHandler,
+)
+
+
+BLOCK = b'\0' * (64 * 1024)
+
+
+class Upstream(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    rate = 0
+
+    def do_GET(self):
+        start, _, end = self.headers['Range'][6:].partition('-')
+        size = int(end) - int(start) + 1
+        self.send_response(206)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Content-Range', 'bytes {0}-{1}/*'.format(start, end))
+        self.send_header('Content-Length', str(size))
+        self.end_headers()
+        rate = self.rate
+        start_time = time.time()
+        sent = 0
+        while sent < size:
+            block = BLOCK[:size - sent]
+            self.wfile.write(block)
+            sent += len(block)
+            if rate:
+                delay = start_time + sent / rate - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+
+    def log_message(self, *args):
+        pass
+
+
+class Context(object):
+    def get_settings(self):
+        return self
+
+    @staticmethod
+    def httpd_whitelist():
+        return []
+
+
+class Handler(RequestHandler):
+    upstream_url = None
+    session = None
+
+    def do_GET(self):
+        # Only stream segment connections are kept alive by the httpd, and
+        # only while no other connections are waiting for a worker
+        self._keep_alive = not self.server.has_pending_requests()
+        response = self.session.get(self.upstream_url,
+                                    headers={'Range': self.headers['Range']},
+                                    stream=True)
+        with response:
+            self.send_response(response.status_code)
+            for header in ('Content-Type', 'Content-Range', 'Content-Length'):
+                self.send_header(header, response.headers[header])
+            self.end_headers()
+            self._relay_content(response)
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingServer(ThreadingMixIn, TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    finish_request = HTTPServer.finish_request
+    threads_started = 0
+
+    def process_request(self, request, client_address):
+        self.threads_started += 1
+        super(ThreadingServer, self).process_request(request, client_address)
+
+    @staticmethod
+    def has_pending_requests():
+        return False
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[min(int(len(values) * percent / 100), len(values) - 1)]
+
+
+def run(name, server_class, args):
+    Handler._close_all = False
+    Handler.timeout = None
+    server = server_class(('127.0.0.1', 0), Handler)
+    server_thread = threading.Thread(target=server.serve_forever,
+                                     kwargs={'poll_interval': 0.1})
+    server_thread.daemon = True
+    server_thread.start()
+    url = 'http://127.0.0.1:{0}/videoplayback'.format(server.server_address[1])
+    range_size = args.range_size * 1024
+
+    latencies = []
+    errors = []
+    peak_threads = [threading.active_count()]
+    running = [True]
+
+    def _client(client_id):
+        session = requests.Session()
+        offset = client_id * args.requests * range_size
+        try:
+            for idx in range(args.requests):
+                start = offset + idx * range_size
+                start_time = time.time()
+                response = session.get(url, headers={
+                    'Range': 'bytes={0}-{1}'.format(start,
+                                                    start + range_size - 1),
+                })
+                if len(response.content) != range_size:
+                    errors.append(client_id)
+                latencies.append(time.time() - start_time)
+        except requests.RequestException:
+            errors.append(client_id)
+        finally:
+            session.close()
+
+    def _monitor():
+        while running[0]:
+            peak_threads[0] = max(peak_threads[0], threading.active_count())
+            time.sleep(0.01)
+
+    monitor = threading.Thread(target=_monitor)
+    monitor.daemon = True
+    monitor.start()
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    cpu_time = usage.ru_utime + usage.ru_stime
+    clients = [threading.Thread(target=_client, args=(client_id,))
+               for client_id in range(args.clients)]
+    start_time = time.time()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.time() - start_time
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    cpu_time = usage.ru_utime + usage.ru_stime - cpu_time
+    running[0] = False
+
+    server.shutdown()
+    server.server_close()
+
+    total = len(latencies) * range_size / 1024 / 1024
+    print('{name:>9}  {elapsed:7.2f}s  {rate:8.1f}  {p50:8.3f}s  {p90:8.3f}s'
+          '  {max:8.3f}s  {threads:7d}  {started:7d}  {cpu:7.2f}s'
+          '  {errors:6d}'.format(
+              name=name,
+              elapsed=elapsed,
+              rate=total / elapsed,
+              p50=percentile(latencies, 50),
+              p90=percentile(latencies, 90),
+              max=max(latencies),
+              threads=peak_threads[0],
+              started=(server.threads_started
+                       if isinstance(server, ThreadingServer) else
+                       len(server._workers)),
+              cpu=cpu_time,
+              errors=len(errors),
+          ))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--range-size', type=int, default=1024,
+                        help='size of each range request, in KiB')
+    parser.add_argument('--rate', type=float, default=0,
+                        help='upstream rate per connection, in MiB/s,'
+                             ' or 0 for no limit')
+    args = parser.parse_args()
+
+    Upstream.rate = args.rate * 1024 * 1024
+    upstream = ThreadingHTTPServer(('127.0.0.1', 0), Upstream)
+    upstream.daemon_threads = True
+    upstream_thread = threading.Thread(target=upstream.serve_forever)
+    upstream_thread.daemon = True
+    upstream_thread.start()
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_maxsize=max(args.clients, 10))
+    session.mount('http://', adapter)
+    Handler.session = session
+    Handler.upstream_url = 'http://127.0.0.1:{0}/'.format(
+        upstream.server_port
+    )
+    Handler._context = Context()
+    RequestHandler.requests = session
+
+    print('{clients} clients x {requests} requests of {size} KiB,'
+          ' upstream rate {rate}, MAX_WORKERS {workers}'.format(
+              clients=args.clients,
+              requests=args.requests,
+              size=args.range_size,
+              rate=('{0} MiB/s'.format(args.rate)
+                    if args.rate else
+                    'unlimited'),
+              workers=HTTPServer.MAX_WORKERS,
+          ))
+    print('   server     total      MiB/s       p50        p90'
+          '        max  threads  started      CPU  errors')
+    run('threading', ThreadingServer, args)
+    run('bounded', HTTPServer, args)
+    upstream.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+    Copyright (C) 2025 plugin.video.youtube
+
+    SPDX-License-Identifier: GPL-2.0-only
+    See LICENSES/GPL-2.0-only for more information.
+
+    Build time of MPD manifests generated by _generate_mpd_manifest, for
+    synthetic stream maps of 10, 100 and 500 Representations, and for the
+    stream map of the sanitised player response in the data folder.
+
+    Synthetic stream maps are from stream_maps.stream_map, with half video
+    and half audio Representations, audio spread across up to 10 languages,
+    and 2 subtitle AdaptationSets. Each result is the best of --runs runs, each
+    averaged over enough iterations to take a measurable time.
+
+    Usage: python3 bench_mpd_generation.py [--runs N] [--sizes N [N ...]]
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import time
+
+import kodi_env
+import stream_maps
+
+
+kodi_env.setup()
+
+from youtube_plugin.youtube.client.player_client import (  # noqa: E402
+    YouTubePlayerClient,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=15)
+    parser.add_argument('--sizes', type=int, nargs='+', default=(10, 100, 500))
+    args = parser.parse_args()
+
+    stream_sets = [
+        (num_representations, stream_maps.stream_map(num_representations))
+        for num_representations in args.sizes
+    ]
+    stream_sets.append((
+        'player response',
+        stream_maps.player_response_stream_map(YouTubePlayerClient),
+    ))
+
+    print('representations  frameRate hint  no frameRate hint')
+    for name, stream_map in stream_sets:
+        num_representations = sum(
+            len(streams)
+            for data in stream_map[:2]
+            for _, streams in data
+        )
+        iterations = max(20, 20000 // num_representations)
+        results = []
+        for frame_rate_hint in (True, False):
+            generate = stream_maps.manifest_generator(YouTubePlayerClient,
+                                                      frame_rate_hint)
+            best = None
+            for _ in range(args.runs):
+                start_time = time.time()
+                for _ in range(iterations):
+                    generate(*stream_map)
+                elapsed = (time.time() - start_time) / iterations
+                if best is None or elapsed < best:
+                    best = elapsed
+            results.append(best * 1000)
+        print('{0:>15}  {1:11.3f} ms  {2:14.3f} ms'.format(name, *results))
+
+
+if __name__ == '__main__':
+    main()
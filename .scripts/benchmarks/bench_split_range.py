@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+    Copyright (C) 2025 plugin.video.youtube
+
+    SPDX-License-Identifier: GPL-2.0-only
+    See LICENSES/GPL-2.0-only for more information.
+
+    Throughput and peak memory use of relaying a range over one connection,
+    compared to split range requests over parallel connections.
+
+    A local stand-in upstream serves ranges limited to --rate MiB/s per
+    connection, similar to the per connection limit of googlevideo servers.
+    A range of --range-size MiB is relayed with RequestHandler._relay_content
+    over a single connection, and with RequestHandler._split_request over
+    each number of --connections. Each run is in its own process, so that
+    peak RSS is measured separately.
+
+    Usage: python3 bench_split_range.py [--range-size MiB] [--rate MiB/s]
+                                        [--connections N [N ...]]
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import os
+import resource
+import socket
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import kodi_env
+
+
+BLOCK = b'\0' * (64 * 1024)
+SERVER = 'rr1---sn-benchmark.googlevideo.com'
+PATH = '/videoplayback'
+
+
+class Upstream(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    rate = 0
+
+    def do_GET(self):
+        start, _, end = self.headers['Range'][6:].partition('-')
+        size = int(end) - int(start) + 1
+        self.send_response(206)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Content-Range', 'bytes {0}-{1}/*'.format(start, end))
+        self.send_header('Content-Length', str(size))
+        self.end_headers()
+        rate = self.rate
+        start_time = time.time()
+        sent = 0
+        while sent < size:
+            block = BLOCK[:size - sent]
+            self.wfile.write(block)
+            sent += len(block)
+            delay = start_time + sent / rate - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+    def log_message(self, *args):
+        pass
+
+
+class SocketWriter(object):
+    closed = False
+
+    def __init__(self, sock):
+        self.write = sock.sendall
+
+
+class Requests(object):
+    """
+    Stand-in for BaseRequestsClass.request, sending the https requests made
+    by the stream proxy to the local upstream over http instead
+    """
+
+    def __init__(self, port):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self._exceptions = requests.RequestException
+        self._netloc = '127.0.0.1:{0}'.format(port)
+        self._session = session = requests.Session()
+        session.mount('http://', HTTPAdapter(pool_maxsize=16))
+
+    def request(self,
+                url=None,
+                method='GET',
+                headers=None,
+                allow_redirects=True,
+                stream=False,
+                cache=None,
+                prepared_request=None):
+        from youtube_plugin.kodion.compatibility import urlsplit, urlunsplit
+
+        try:
+            if prepared_request is not None:
+                return self._session.send(prepared_request,
+                                          allow_redirects=allow_redirects,
+                                          stream=stream)
+            url = urlsplit(url)
+            url = urlunsplit(('http', self._netloc, url.path, url.query, ''))
+            return self._session.request(method,
+                                         url,
+                                         headers=headers,
+                                         allow_redirects=allow_redirects,
+                                         stream=stream)
+        except self._exceptions:
+            return None
+
+
+def max_rss_mib():
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, and in KiB elsewhere
+    if sys.platform == 'darwin':
+        return max_rss / 1024 / 1024
+    return max_rss / 1024
+
+
+def run(connections, port, range_size):
+    kodi_env.setup()
+    from youtube_plugin.kodion.network.http_server import RequestHandler
+
+    handler = RequestHandler.__new__(RequestHandler)
+    handler.requests = Requests(port)
+    handler.send_response = handler.send_header = lambda *args: None
+    handler.end_headers = lambda: None
+
+    relay, sink = socket.socketpair()
+    received = [0]
+
+    def _sink():
+        while 1:
+            data = sink.recv(1024 * 1024)
+            if not data:
+                break
+            received[0] += len(data)
+
+    sink_thread = threading.Thread(target=_sink)
+    sink_thread.start()
+    handler.wfile = SocketWriter(relay)
+
+    rss_before = max_rss_mib()
+    start_time = time.time()
+    if connections > 1:
+        handler._split_request(SERVER,
+                               connections,
+                               PATH,
+                               '',
+                               'GET',
+                               {},
+                               0,
+                               range_size - 1)
+    else:
+        response = handler.requests.request(
+            'https://{0}{1}'.format(SERVER, PATH),
+            headers={
+                'Host': SERVER,
+                'Range': 'bytes=0-{0}'.format(range_size - 1),
+            },
+            allow_redirects=False,
+            stream=True,
+        )
+        with response:
+            handler._relay_content(response)
+    elapsed = time.time() - start_time
+
+    relay.shutdown(socket.SHUT_WR)
+    sink_thread.join()
+    relay.close()
+    sink.close()
+
+    print('{connections:>11}  {elapsed:7.2f}s  {rate:7.1f}  {size:8.1f} MiB'
+          '  {delta:8.1f} MiB'.format(
+              connections=connections,
+              elapsed=elapsed,
+              rate=received[0] / 1024 / 1024 / elapsed,
+              size=received[0] / 1024 / 1024,
+              delta=max_rss_mib() - rss_before,
+          ))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--range-size', type=int, default=8,
+                        help='size of the requested range, in MiB')
+    parser.add_argument('--rate', type=float, default=4,
+                        help='upstream rate per connection, in MiB/s')
+    parser.add_argument('--connections', type=int, nargs='+',
+                        default=(1, 2, 4, 8))
+    parser.add_argument('--run', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    range_size = args.range_size * 1024 * 1024
+    if args.run:
+        run(args.run, args.port, range_size)
+        return
+
+    Upstream.rate = args.rate * 1024 * 1024
+    upstream = ThreadingHTTPServer(('127.0.0.1', 0), Upstream)
+    upstream.daemon_threads = True
+    thread = threading.Thread(target=upstream.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    print('{0} MiB range, upstream rate {1} MiB/s per connection'.format(
+        args.range_size, args.rate,
+    ))
+    print('connections     total    MiB/s       relayed  RSS increase')
+    for connections in args.connections:
+        subprocess.check_call([
+            sys.executable,
+            os.path.abspath(__file__),
+            '--range-size', str(args.range_size),
+            '--run', str(connections),
+            '--port', str(upstream.server_port),
+        ])
+    upstream.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+    Copyright (C) 2025 plugin.video.youtube
+
+    SPDX-License-Identifier: GPL-2.0-only
+    See LICENSES/GPL-2.0-only for more information.
+
+    Time taken to prune a DataCache to half of its data size, with the
+    correlated SUM(size) subquery used before the size accounting, compared
+    to Storage._optimize_file_size.
+
+    Each DataCache is filled with rows of about 165 bytes, each with its own
+    timestamp, and its size limit is set just below the size of its data.
+    The old query is run against a copy of the same database, and both are
+    checked to have removed the same rows.
+
+    Usage: python3 bench_storage_prune.py [--sizes N [N ...]]
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+import kodi_env
+
+
+kodi_env.setup()
+
+from youtube_plugin.kodion.sql_store import DataCache  # noqa: E402
+
+
+OLD_PRUNE_BY_SIZE = (
+    'DELETE'
+    ' FROM storage_v2'
+    ' WHERE rowid IN ('
+    '  SELECT rowid'
+    '  FROM storage_v2'
+    '  WHERE ('
+    '   SELECT SUM(size)'
+    '   FROM storage_v2 AS _'
+    '   WHERE timestamp<=storage_v2.timestamp'
+    '  ) <= {0}'
+    ' );'
+)
+
+
+def _keys(filepath):
+    db = sqlite3.connect(filepath)
+    try:
+        return {row[0] for row in db.execute('SELECT key FROM storage_v2;')}
+    finally:
+        db.close()
+
+
+def run(num_rows, path):
+    filename = 'data_{0}.sqlite'.format(num_rows)
+    filepath = os.path.join(path, filename)
+    cache = DataCache((path, filename), max_file_size_mb=0)
+    cache.set_items({
+        'item_{0:06d}'.format(idx): 'value' * 30
+        for idx in range(num_rows)
+    })
+    with cache as (db, cursor):
+        cursor.execute('UPDATE storage_v2 SET timestamp = rowid;')
+        db.commit()
+        size_kb = cursor.execute(
+            'SELECT total FROM storage_v2_size WHERE id = 0;'
+        ).fetchone()[0] // 1024
+    cache._close(event=True)
+
+    max_size_kb = size_kb - 1
+    prune_size = 1024 * int(size_kb - max_size_kb / 2)
+
+    old_filepath = filepath + '.old'
+    shutil.copyfile(filepath, old_filepath)
+    db = sqlite3.connect(old_filepath)
+    start_time = time.time()
+    db.execute(OLD_PRUNE_BY_SIZE.format(prune_size))
+    db.commit()
+    old_time = time.time() - start_time
+    db.close()
+
+    cache._max_file_size_kb = max_size_kb
+    start_time = time.time()
+    with cache as (db, cursor):
+        query = cache._optimize_file_size(defer=True, db=db)
+        if query:
+            cache._execute(cursor, ('BEGIN IMMEDIATE;', query, 'COMMIT;'))
+    new_time = time.time() - start_time
+    cache._close(event=True)
+
+    old_keys = _keys(old_filepath)
+    new_keys = _keys(filepath)
+    print('{rows:>7}  {size:7d} KiB  {old:9.3f}s  {new:9.3f}s'
+          '  {kept:>7}  {same}'.format(
+              rows=num_rows,
+              size=size_kb,
+              old=old_time,
+              new=new_time,
+              kept=len(new_keys),
+              same=old_keys == new_keys,
+          ))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=(1000, 5000, 10000))
+    args = parser.parse_args()
+
+    path = tempfile.mkdtemp()
+    try:
+        print('   rows       size         old         new     kept  same')
+        for num_rows in args.sizes:
+            run(num_rows, path)
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
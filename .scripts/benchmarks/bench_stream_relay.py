@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+    Copyright (C) 2025 plugin.video.youtube
+
+    SPDX-License-Identifier: GPL-2.0-only
+    See LICENSES/GPL-2.0-only for more information.
+
+    Time to first byte and peak memory use of relaying a large 200 response
+    through the stream proxy.
+
+    A local stand-in upstream serves a response of --size MiB. Each mode runs
+    in its own process, so that peak RSS is measured separately:
+
+      buffered  reads the whole body with response.content before writing
+                it, as the proxy did for 200 responses before streaming
+      streamed  relays the body with RequestHandler._relay_content
+
+    The relayed body is written to a local socket and read by a sink thread,
+    which records when the first byte arrives.
+
+    Usage: python3 bench_stream_relay.py [--size MiB]
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import os
+import resource
+import socket
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import kodi_env
+
+
+BLOCK = b'\0' * (1024 * 1024)
+MODES = ('buffered', 'streamed')
+
+
+class Upstream(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    size = 0
+
+    def do_GET(self):
+        size = self.size
+        self.send_response(200)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Content-Length', str(size))
+        self.end_headers()
+        block_size = len(BLOCK)
+        while size > 0:
+            self.wfile.write(BLOCK[:size] if size < block_size else BLOCK)
+            size -= block_size
+
+    def log_message(self, *args):
+        pass
+
+
+class SocketWriter(object):
+    closed = False
+
+    def __init__(self, sock):
+        self.write = sock.sendall
+
+
+def max_rss_mib():
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, and in KiB elsewhere
+    if sys.platform == 'darwin':
+        return max_rss / 1024 / 1024
+    return max_rss / 1024
+
+
+def run_mode(mode, port):
+    kodi_env.setup()
+    import requests
+    from youtube_plugin.kodion.network.http_server import RequestHandler
+
+    session = requests.Session()
+    rss_before = max_rss_mib()
+
+    relay, sink = socket.socketpair()
+    result = {'first_byte': None, 'size': 0}
+
+    def _sink():
+        while 1:
+            data = sink.recv(1024 * 1024)
+            if not data:
+                break
+            if result['first_byte'] is None:
+                result['first_byte'] = time.time()
+            result['size'] += len(data)
+
+    sink_thread = threading.Thread(target=_sink)
+    sink_thread.start()
+
+    handler = RequestHandler.__new__(RequestHandler)
+    handler.wfile = SocketWriter(relay)
+
+    start_time = time.time()
+    response = session.get('http://127.0.0.1:{0}/'.format(port), stream=True)
+    with response:
+        if mode == 'buffered':
+            handler.wfile.write(response.content)
+        else:
+            handler._relay_content(response)
+    end_time = time.time()
+
+    relay.shutdown(socket.SHUT_WR)
+    sink_thread.join()
+    relay.close()
+    sink.close()
+
+    print('{mode:>9}  {ttfb:8.3f}s  {total:7.2f}s  {size:8.1f} MiB'
+          '  {rss:8.1f} MiB  {delta:8.1f} MiB'.format(
+              mode=mode,
+              ttfb=result['first_byte'] - start_time,
+              total=end_time - start_time,
+              size=result['size'] / 1024 / 1024,
+              rss=max_rss_mib(),
+              delta=max_rss_mib() - rss_before,
+          ))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=200,
+                        help='size of the upstream response, in MiB')
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.port)
+        return
+
+    Upstream.size = args.size * 1024 * 1024
+    upstream = ThreadingHTTPServer(('127.0.0.1', 0), Upstream)
+    thread = threading.Thread(target=upstream.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    print('{0} MiB response'.format(args.size))
+    print('     mode      TTFB     total      relayed     peak RSS'
+          '  RSS increase')
+    for mode in MODES:
+        subprocess.check_call([
+            sys.executable,
+            os.path.abspath(__file__),
+            '--mode', mode,
+            '--port', str(upstream.server_port),
+        ])
+    upstream.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+    Copyright (C) 2025 plugin.video.youtube
+
+    SPDX-License-Identifier: GPL-2.0-only
+    See LICENSES/GPL-2.0-only for more information.
+
+    Time taken to rewrite the stream urls of a player response as stream
+    proxy urls, one url at a time with _process_url_params, compared to the
+    whole batch with _process_stream_urls.
+
+    Urls are synthetic googlevideo urls with about 40 parameters each, with
+    the same n value for all but the last 2 urls. nsig is calculated by a
+    stand-in that reverses the n value, so only the url processing and not
+    the player JavaScript is measured. The rewritten urls are also checked
+    to have the same parameters after parse_qs.
+
+    Usage: python3 bench_url_rewrite.py [--runs N] [--sizes N [N ...]]
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import timeit
+from random import Random
+
+import kodi_env
+
+
+kodi_env.setup()
+
+from youtube_plugin.kodion.compatibility import (  # noqa: E402
+    parse_qs,
+    unquote,
+    urlsplit,
+)
+from youtube_plugin.youtube.client.player_client import (  # noqa: E402
+    YouTubePlayerClient,
+)
+
+
+URL = (
+    'https://rr3---sn-4g5e6nze.googlevideo.com/videoplayback'
+    '?expire=1760000000'
+    '&ei=AbCdEfGhIjKlMnOp'
+    '&ip=203.0.113.7'
+    '&id=o-ABCDEFGHIJKLMNOPQRSTUVWXYZ012345'
+    '&itag={itag}'
+    '&aitags=133%2C134%2C135%2C136%2C137%2C160'
+    '&source=youtube'
+    '&requiressl=yes'
+    '&xpc=EgVo2aDSNQ%3D%3D'
+    '&mh=aB'
+    '&mm=31%2C29'
+    '&mn=sn-4g5e6nze%2Csn-4g5ednsl'
+    '&ms=au%2Crdu'
+    '&mv=m'
+    '&mvi=3'
+    '&pl=24'
+    '&rms=au%2Cau'
+    '&initcwndbps=1750000'
+    '&bui=AQn3pFQ'
+    '&spc=6dlaFI'
+    '&vprv=1'
+    '&svpuc=1'
+    '&mime=video%2Fmp4'
+    '&ns=abcdEFGH'
+    '&rqh=1'
+    '&gir=yes'
+    '&clen={clen}'
+    '&dur=212.040'
+    '&lmt=1700000000000000'
+    '&mt=1759990000'
+    '&fvip=4'
+    '&keepalive=yes'
+    '&c=WEB'
+    '&sefc=1'
+    '&txp=4532434'
+    '&n={n}'
+    '&sparams=expire%2Cei%2Cip%2Cid%2Caitags%2Csource%2Crequiressl'
+    '&sig=AJfQdSswRQIhAO%3D%3D'
+    '&lsparams=met%2Cmh%2Cmm%2Cmn%2Cms%2Cmv%2Cmvi%2Cpl%2Crms'
+    '&lsig=APaTxxMwRAIgX%3D%3D'
+)
+
+
+class CalculateN(object):
+    def __init__(self):
+        self.calls = 0
+
+    def calculate_n(self, n):
+        self.calls += 1
+        return n[::-1]
+
+
+class Context(object):
+    def get_settings(self):
+        return self
+
+    @staticmethod
+    def httpd_listen():
+        return '127.0.0.1'
+
+    @staticmethod
+    def httpd_port():
+        return 50152
+
+
+def stream_urls(num_urls, seed=0):
+    rand = Random(seed)
+    return [
+        unquote(URL.format(
+            itag=130 + idx,
+            clen=rand.randint(1000000, 90000000),
+            n='nValue{0:02d}abcdEF'.format(0 if idx < num_urls - 2 else 1),
+        ))
+        for idx in range(num_urls)
+    ]
+
+
+def client():
+    client = YouTubePlayerClient.__new__(YouTubePlayerClient)
+    client._context = Context()
+    client.video_id = 'dQw4w9WgXcQ'
+    client.yt_item = {'snippet': {}}
+    client._visitor_data = {'current': 'CgtWaXNpdG9yRGF0YSiA'}
+    client._visitor_data_key = 'current'
+    client._calculate_n = CalculateN()
+    client._player_js = ''
+    return client
+
+
+def per_url(urls):
+    headers = {'User-Agent': 'benchmark', 'X-YouTube-Client-Name': '1'}
+    _client = client()
+    return _client, [
+        _client._process_url_params(url,
+                                    stream_proxy=True,
+                                    headers=headers,
+                                    cpn='CPN0')
+        for url in urls
+    ]
+
+
+def batch(urls):
+    headers = {'User-Agent': 'benchmark', 'X-YouTube-Client-Name': '1'}
+    _client = client()
+    return _client, _client._process_stream_urls(urls,
+                                                 headers=headers,
+                                                 cpn='CPN0')
+
+
+def _parsed(url):
+    parts = urlsplit(url)
+    return parts.scheme, parts.netloc, parts.path, parse_qs(parts.query)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=15)
+    parser.add_argument('--sizes', type=int, nargs='+', default=(30, 50, 80))
+    args = parser.parse_args()
+
+    print('urls  _process_url_params x N  _process_stream_urls'
+          '  nsig calls  equivalent')
+    for num_urls in args.sizes:
+        urls = stream_urls(num_urls)
+
+        per_url_client, per_url_results = per_url(urls)
+        batch_client, batch_results = batch(urls)
+        equivalent = (
+            [_parsed(url) for url in per_url_results]
+            == [_parsed(url) for url in batch_results]
+        )
+
+        results = [
+            min(timeit.repeat(lambda: func(urls),
+                              number=20,
+                              repeat=args.runs)) / 20 * 1000
+            for func in (per_url, batch)
+        ]
+        print('{0:>4}  {1:20.3f} ms  {2:16.3f} ms  {3:>4} / {4:<4}  {5}'.format(
+            num_urls,
+            results[0],
+            results[1],
+            per_url_client._calculate_n.calls,
+            batch_client._calculate_n.calls,
+            equivalent,
+        ))
+
+
+if __name__ == '__main__':
+    main()
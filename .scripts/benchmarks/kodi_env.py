@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+
+    Copyright (C) 2025 plugin.video.youtube
+
+    SPDX-License-Identifier: GPL-2.0-only
+    See LICENSES/GPL-2.0-only for more information.
+
+    Makes the add-on modules importable outside of Kodi, for the benchmarks
+    in this folder. The add-on library path is added to sys.path and, if the
+    Kodi modules are not available, stand-in modules are installed in their
+    place. The stand-ins return mock objects for anything that is not defined
+    below, so only code paths that do not depend on Kodi can be measured.
+"""
+
+from __future__ import absolute_import, division, unicode_literals
+
+import os
+import sys
+import types
+
+
+ROOT_PATH = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), os.pardir, os.pardir)
+)
+LIB_PATH = os.path.join(ROOT_PATH, 'resources', 'lib')
+
+KODI_MODULES = ('xbmc', 'xbmcaddon', 'xbmcgui', 'xbmcplugin', 'xbmcvfs')
+KODI_VERSION = '21.2 (21.2.0) Git:20250101-benchmark'
+
+
+def _stub_module(name, mock):
+    module = types.ModuleType(name)
+    module.__getattr__ = lambda attr: getattr(mock, attr)
+    return module
+
+
+def _install_stubs():
+    from unittest.mock import MagicMock
+
+    mock = MagicMock()
+    modules = {name: _stub_module(name, mock) for name in KODI_MODULES}
+
+    xbmc = modules['xbmc']
+    for level, name in enumerate(('LOGDEBUG',
+                                  'LOGINFO',
+                                  'LOGWARNING',
+                                  'LOGERROR',
+                                  'LOGFATAL',
+                                  'LOGNONE')):
+        setattr(xbmc, name, level)
+    xbmc.log = lambda *args, **kwargs: None
+    xbmc.getInfoLabel = lambda label: KODI_VERSION
+    xbmc.executeJSONRPC = lambda request: (
+        '{"result": {"version": {"major": 21, "minor": 2}, "name": "Kodi"}}'
+    )
+
+    modules['xbmcvfs'].translatePath = lambda path: path
+
+    sys.modules.update(modules)
+
+
+def setup():
+    if LIB_PATH not in sys.path:
+        sys.path.insert(0, LIB_PATH)
+    try:
+        import xbmc  # noqa: F401
+    except ImportError:
+        _install_stubs()
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+
+    Copyright (C) 2025 plugin.video.youtube
+
+    SPDX-License-Identifier: GPL-2.0-only
+    See LICENSES/GPL-2.0-only for more information.
+
+    Synthetic stream maps, shaped like the adaptive streams processed from
+    player responses, the stream map of a sanitised player response, and a
+    minimal player client to generate MPD manifests from them outside of
+    Kodi.
+"""
+
+from __future__ import absolute_import, division, unicode_literals
+
+import json
+import os
+from random import Random
+
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+PLAYER_RESPONSE = os.path.join(DATA_PATH, 'player_response_streams.json')
+VIDEO_ID = 'dQw4w9WgXcQ'
+LANGUAGES = ('en', 'de', 'fr', 'es', 'it', 'ja', 'ko', 'pt', 'ru', 'zh')
+URL = (
+    'http://127.0.0.1:50152/youtube/videoplayback'
+    '?__id=' + VIDEO_ID +
+    '&amp;__host=rr3---sn-4g5e6nze.googlevideo.com'
+    '&amp;__path=/videoplayback'
+    '&amp;expire=1760000000'
+    '&amp;ei=AbCdEfGh'
+    '&amp;ip=203.0.113.7'
+    '&amp;id=o-ABCDEFGHIJKLMNOP'
+    '&amp;itag={itag}'
+    '&amp;aitags=133,134,135,136,137,160'
+    '&amp;source=youtube'
+    '&amp;requiressl=yes'
+    '&amp;mime={mime_type}'
+    '&amp;gir=yes'
+    '&amp;clen={clen}'
+    '&amp;dur=212.040'
+    '&amp;lmt=1700000000000000'
+    '&amp;keepalive=yes'
+    '&amp;n=abcdefgh'
+)
+
+
+def _stream(rand, media_type, itag, idx, language='en', role='main'):
+    container = 'mp4' if idx % 2 else 'webm'
+    mime_type = '/'.join((media_type, container))
+    height = 144 * (idx % 8 + 1)
+    stream = {
+        'mimeType': mime_type,
+        'baseUrl': URL.format(itag=itag,
+                              mime_type=mime_type,
+                              clen=rand.randint(1000000, 90000000)),
+        'mediaType': media_type,
+        'container': container,
+        'codecs': 'avc1.640028' if media_type == 'video' else 'opus',
+        'codec': 'avc1' if media_type == 'video' else 'opus',
+        'preferred_codec': False,
+        'id': str(itag),
+        'label': '{0}p'.format(height),
+        'bitrate': rand.randint(100000, 9000000),
+        'biasedBitrate': 1,
+        'duration': 213,
+        'indexRange': '741-1500',
+        'initRange': '0-740',
+        'drc': False,
+        'spatial': '',
+        'projection': '',
+        'stereoLayout': '',
+        'hdr': False,
+    }
+    if media_type == 'video':
+        stream.update({
+            'langCode': '',
+            'langName': None,
+            'role': None,
+            'roleOrder': 1,
+            'width': 256 * (idx % 8 + 1),
+            'height': height,
+            'fps': 30,
+            'frameRate': '30',
+            'sampleRate': None,
+            'channels': None,
+        })
+    else:
+        stream.update({
+            'langCode': language,
+            'langName': language.upper(),
+            'role': role,
+            'roleOrder': 1,
+            'width': None,
+            'height': None,
+            'fps': None,
+            'frameRate': None,
+            'sampleRate': 48000,
+            'channels': 2,
+        })
+    return stream
+
+
+def stream_map(num_representations, seed=1):
+    """
+    Returns video_data, audio_data and subs_data with num_representations
+    video and audio Representations in total, split evenly between video
+    and audio. Video is grouped 10 streams per AdaptationSet, and audio 5
+    streams per AdaptationSet across up to 10 languages.
+    """
+    rand = Random(seed)
+    num_video = num_representations // 2
+    num_audio = num_representations - num_video
+    itag = 100
+
+    video_data = []
+    for offset in range(0, num_video, 10):
+        streams = [_stream(rand, 'video', itag + idx, idx)
+                   for idx in range(min(10, num_video - offset))]
+        video_data.append(((streams[0]['mimeType'], 'avc1', False, ''),
+                           streams))
+        itag += 10
+
+    audio_data = []
+    for set_idx, offset in enumerate(range(0, num_audio, 5)):
+        language = LANGUAGES[set_idx % len(LANGUAGES)]
+        role = 'main' if not set_idx else 'dub'
+        streams = [_stream(rand, 'audio', itag + idx, idx, language, role)
+                   for idx in range(min(5, num_audio - offset))]
+        audio_data.append(((streams[0]['mimeType'], language, '4'),
+                           streams))
+        itag += 5
+
+    subs_data = {
+        'en': {
+            'lang': 'en',
+            'language': 'English',
+            'kind': 'manual',
+            'url': 'http://127.0.0.1:50152/api/timedtext?v=1&lang=en',
+            'mime_type': 'text/vtt',
+            'codec': 'wvtt',
+            'original': True,
+            'default': True,
+        },
+        'de': {
+            'lang': 'de',
+            'language': 'German',
+            'kind': 'translation',
+            'url': 'http://127.0.0.1:50152/api/timedtext?v=1&lang=de&tlang=de',
+            'mime_type': 'text/vtt',
+            'codec': 'wvtt',
+            'original': False,
+            'default': False,
+        },
+    }
+    return video_data, audio_data, subs_data
+
+
+class _Settings(object):
+    # Quality selections of AbstractSettings, up to the default of 1080p
+    _QUALITY_SELECTIONS = (
+        {'width_16:9': 1920, 'width_4:3': 1440, 'min_height': 787,
+         'nom_height': 1080, 'label': '{0}p{1} (FHD){2}{3}{4}'},
+        {'width_16:9': 1280, 'width_4:3': 960, 'min_height': 525,
+         'nom_height': 720, 'label': '{0}p{1} (HD){2}{3}{4}'},
+        {'width_16:9': 854, 'width_4:3': 640, 'min_height': 350,
+         'nom_height': 480, 'label': '{0}p{1}{2}{3}{4}'},
+        {'width_16:9': 640, 'width_4:3': 480, 'min_height': 263,
+         'nom_height': 360, 'label': '{0}p{1}{2}{3}{4}'},
+        {'width_16:9': 426, 'width_4:3': 320, 'min_height': 175,
+         'nom_height': 240, 'label': '{0}p{1}{2}{3}{4}'},
+        {'width_16:9': 256, 'width_4:3': 192, 'min_height': 105,
+         'nom_height': 144, 'label': '{0}p{1}{2}{3}{4}'},
+        {'width_16:9': 0, 'width_4:3': 0, 'min_height': 0,
+         'nom_height': 0, 'label': '{0}p{1}{2}{3}{4}'},
+    )
+
+    def __init__(self, frame_rate_hint):
+        self._stream_features = frozenset(
+            ('avc1', 'vp9', 'av01', 'mp4a', 'opus')
+            if frame_rate_hint else
+            ('avc1', 'vp9', 'av01', 'mp4a', 'opus', 'no_fr_hint')
+        )
+
+    def stream_features(self):
+        return self._stream_features
+
+    def mpd_video_qualities(self):
+        return list(self._QUALITY_SELECTIONS)
+
+    @staticmethod
+    def stream_select():
+        return 'auto+list'
+
+    @staticmethod
+    def httpd_listen():
+        return '127.0.0.1'
+
+    @staticmethod
+    def httpd_port():
+        return 50152
+
+
+class _Context(object):
+    def __init__(self, frame_rate_hint):
+        self._settings = _Settings(frame_rate_hint)
+
+    def get_settings(self):
+        return self._settings
+
+    @staticmethod
+    def localize(label, *args):
+        return ' '.join((label,) + args)
+
+    @staticmethod
+    def inputstream_adaptive_capabilities():
+        return frozenset((
+            'mp4a', 'opus', 'ac-3', 'ec-3', 'avc1', 'av01', 'vp9', 'vp9.2',
+        ))
+
+    _LANGUAGE_NAMES = {
+        'de': 'German',
+        'en': 'English',
+        'es': 'Spanish',
+        'fr': 'French',
+        'hi': 'Hindi',
+        'ja': 'Japanese',
+    }
+
+    @classmethod
+    def get_language_name(cls, language):
+        return cls._LANGUAGE_NAMES.get(language.split('-')[0], language)
+
+
+class _Response(object):
+    status_code = 201
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+def _client(client_class, frame_rate_hint=True):
+    class Client(client_class):
+        BASE_PATH = '.'
+        video_id = VIDEO_ID
+        output = None
+
+        _audio_only = False
+        _language_base = 'en'
+        _language_prefer_default = False
+
+        def __init__(self):
+            self._context = _Context(frame_rate_hint)
+
+        def request(self, url, data=None, **kwargs):
+            self.output = data
+            return _Response()
+
+        @staticmethod
+        def _process_url_params(url, **kwargs):
+            return url
+
+        @staticmethod
+        def _process_stream_urls(urls, **kwargs):
+            return urls
+
+    return Client()
+
+
+def player_response_stream_map(client_class, filepath=PLAYER_RESPONSE):
+    """
+    Returns video_data, audio_data and subs_data for the adaptive formats of
+    the sanitised player response in filepath, as processed by the
+    _process_adaptive_streams method of client_class with the default
+    stream features and a 1080p quality limit
+    """
+    with open(filepath, 'r') as response_file:
+        response = json.load(response_file)
+    client = _client(client_class)
+    video_data, audio_data = client._process_adaptive_streams(
+        responses={
+            'web': {
+                'client': {'headers': {}},
+                'adaptive_fmts': response['streamingData']['adaptiveFormats'],
+            },
+        },
+        default_lang_code='en',
+    )
+    _, _, subs_data = stream_map(0)
+    return video_data, audio_data, subs_data
+
+
+def manifest_generator(client_class, frame_rate_hint=True):
+    """
+    Returns a function that generates the MPD manifest for a stream map,
+    using the _generate_mpd_manifest method of client_class, and returns the
+    manifest as sent to the httpd
+    """
+    client = _client(client_class, frame_rate_hint)
+
+    def generate(video_data, audio_data, subs_data):
+        client._generate_mpd_manifest(video_data, audio_data, dict(subs_data))
+        return client.output
+
+    return generate
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+    Copyright (C) 2025 plugin.video.youtube
+
+    SPDX-License-Identifier: GPL-2.0-only
+    See LICENSES/GPL-2.0-only for more information.
+
+    Checks that MPD manifests generated from the precompiled MPDTemplate
+    fragments are identical to the output of the previous str.format based
+    generator.
+
+    The reference manifests in the data folder were generated by
+    _generate_mpd_manifest as it was before MPDTemplate was used, with and
+    without the frameRate hint, from two stream sets:
+      - the synthetic stream_maps.stream_map(30) stream set
+      - the adaptive formats of the sanitised player response in
+        data/player_response_streams.json, covering avc1, vp9 and av01 video,
+        mp4a and opus audio, DRC audio, and original, dubbed, auto-dubbed
+        and descriptive audio tracks across several languages
+
+    Usage: python3 -m unittest test_mpd_template
+           or python3 test_mpd_template.py
+"""
+
+from __future__ import absolute_import, division, unicode_literals
+
+import os
+import unittest
+
+import kodi_env
+import stream_maps
+
+
+kodi_env.setup()
+
+from youtube_plugin.youtube.client.player_client import (  # noqa: E402
+    YouTubePlayerClient,
+)
+from youtube_plugin.youtube.helper.mpd_template import (  # noqa: E402
+    MPDTemplate,
+)
+
+
+NUM_REPRESENTATIONS = 30
+
+
+class TestMPDTemplate(unittest.TestCase):
+    def test_render_matches_format(self):
+        template = ('<Set id="{set_id}" type="{mediaType}" lang="{lang}"'
+                    ' width="100%" name="{label}">{label}</Set>\n')
+        extra_fields = ('set_id', 'label')
+        mapping = {'mediaType': 'video', 'lang': 'en', 'unused': None}
+        extra = (3, '[B]1080p[/B]')
+
+        expected = template.format(**dict(mapping, **dict(zip(extra_fields,
+                                                               extra))))
+        rendered = MPDTemplate(template, extra_fields).render(mapping, *extra)
+        self.assertEqual(rendered, expected)
+
+    def test_render_single_and_no_fields(self):
+        self.assertEqual(MPDTemplate('<a>{id}</a>').render({'id': 7}),
+                         '<a>7</a>')
+        self.assertEqual(MPDTemplate('<b x="{n}"/>', ('n',)).render({}, 2),
+                         '<b x="2"/>')
+        self.assertEqual(MPDTemplate('</Period>\n').render({}),
+                         '</Period>\n')
+
+    def _assert_manifest(self, frame_rate_hint, filename, stream_map):
+        filepath = os.path.join(stream_maps.DATA_PATH, filename)
+        with open(filepath, 'rb') as manifest_file:
+            expected = manifest_file.read()
+        generate = stream_maps.manifest_generator(YouTubePlayerClient,
+                                                  frame_rate_hint)
+        manifest = generate(*stream_map)
+        self.assertEqual(manifest, expected)
+
+    def test_manifest_with_frame_rate_hint(self):
+        self._assert_manifest(True,
+                              'manifest_frame_rate.mpd',
+                              stream_maps.stream_map(NUM_REPRESENTATIONS))
+
+    def test_manifest_without_frame_rate_hint(self):
+        self._assert_manifest(False,
+                              'manifest_no_frame_rate.mpd',
+                              stream_maps.stream_map(NUM_REPRESENTATIONS))
+
+    def test_player_response_with_frame_rate_hint(self):
+        self._assert_manifest(
+            True,
+            'player_response_frame_rate.mpd',
+            stream_maps.player_response_stream_map(YouTubePlayerClient),
+        )
+
+    def test_player_response_without_frame_rate_hint(self):
+        self._assert_manifest(
+            False,
+            'player_response_no_frame_rate.mpd',
+            stream_maps.player_response_stream_map(YouTubePlayerClient),
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -15,6 +15,7 @@ __all__ = (
     'TCPServer',
     'ThreadingMixIn',
     'available_cpu_count',
+    'buffer_slice',
     'datetime_infolabel',
     'entity_escape',
     'generate_hash',
@@ -24,6 +25,7 @@ __all__ = (
     'quote',
     'quote_plus',
     'range_type',
+    'replace_file',
     'string_type',
     'to_str',
     'to_unicode',
@@ -84,6 +86,10 @@ try:
         return text
 
 
+    def buffer_slice(buffer, size):
+        return buffer[:size]
+
+
     def entity_escape(text,
                       entities=str.maketrans({
                           '&': '&amp;',
@@ -294,6 +300,12 @@ except ImportError:
         return text
 
 
+    # Socket file objects write str(data), which is the repr of a memoryview
+    # rather than its contents, so the slice is copied to a str
+    def buffer_slice(buffer, size):
+        return buffer[:size].tobytes()
+
+
     def entity_escape(text,
                       entities={
                           '&': '&amp;',
@@ -328,6 +340,20 @@ else:
     def datetime_infolabel(datetime_obj, str_format='%Y-%m-%d %H:%M:%S'):
         return datetime_obj.strftime(str_format)
 
+try:
+    from os import replace as replace_file
+except ImportError:
+    from os import remove as _remove, rename as _rename
+
+
+    def replace_file(src, dst):
+        # os.rename does not overwrite an existing file on Windows
+        try:
+            _remove(dst)
+        except OSError:
+            pass
+        _rename(src, dst)
+
 try:
     from os import sched_getaffinity as _sched_get_affinity
 except ImportError:
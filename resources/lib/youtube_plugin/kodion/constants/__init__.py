@@ -113,6 +113,7 @@ PLAYBACK_FAILED = 'playback_failed'
 PLAYBACK_STARTED = 'playback_started'
 PLAYBACK_STOPPED = 'playback_stopped'
 REFRESH_CONTAINER = 'refresh_container'
+REFRESH_RESOURCES = 'refresh_resources'
 RELOAD_ACCESS_MANAGER = 'reload_access_manager'
 SERVICE_IPC = 'service_ipc'
 SYNC_API_KEYS = 'sync_api_keys'
@@ -281,6 +282,7 @@ __all__ = (
     'PLAYBACK_STARTED',
     'PLAYBACK_STOPPED',
     'REFRESH_CONTAINER',
+    'REFRESH_RESOURCES',
     'RELOAD_ACCESS_MANAGER',
     'SERVICE_IPC',
     'SYNC_API_KEYS',
@@ -144,6 +144,9 @@ HTTPD_LISTEN = 'kodion.http.listen'  # (str)
 HTTPD_WHITELIST = 'kodion.http.ip.whitelist'  # (str)
 HTTPD_IDLE_SLEEP = 'youtube.http.idle_sleep'  # (bool)
 HTTPD_STREAM_REDIRECT = 'youtube.http.stream_redirect'  # (bool)
+HTTPD_READ_AHEAD = 'youtube.http.read_ahead'  # (bool)
+HTTPD_SEGMENT_CACHE_SIZE = 'youtube.http.segment_cache_size'  # (int)
+HTTPD_SPLIT_CONNECTIONS = 'youtube.http.split_connections'  # (int)
 
 LOG_LEVEL = 'kodion.debug.log.level'  # (int)
 EXEC_LIMIT = 'kodion.debug.exec.limit'  # (int)
@@ -33,6 +33,7 @@ from ..constants import (
     PLAY_FORCED,
     PLUGIN_WAKEUP,
     REFRESH_CONTAINER,
+    REFRESH_RESOURCES,
     RELOAD_ACCESS_MANAGER,
     RESUMABLE,
     SERVER_WAKEUP,
@@ -42,6 +43,7 @@ from ..constants import (
     VIDEO_ID,
 )
 from ..network import get_connect_address, get_http_server, httpd_status
+from ..utils.datetime import since_epoch
 from ..utils.methods import jsonrpc
 
 
@@ -52,8 +54,12 @@ class ServiceMonitor(xbmc.Monitor):
     _settings_collect = False
     get_idle_time = xbmc.getGlobalIdleTime
 
-    def __init__(self, context):
+    FEED_PREFETCH_PERIOD = 5 * 60
+    FEED_PREFETCH_MAX_BACKOFF = 60 * 60
+
+    def __init__(self, context, provider=None):
         self._context = context
+        self._provider = provider
 
         self._api_values = ('', '', '')
         self._httpd_address = None
@@ -73,6 +79,15 @@ class ServiceMonitor(xbmc.Monitor):
         self.refresh = False
         self.interrupt = False
 
+        self.refresh_resources_thread = None
+        self._refresh_resources_lock = Lock()
+        self._pending_resources = {}
+        self._refreshing_resources = (None, ())
+
+        self.feed_prefetch_thread = None
+        self._feed_prefetch_time = 0
+        self._feed_prefetch_backoff = 0
+
         self.file_access = {}
 
         self.onSettingsChanged(force=True)
@@ -241,6 +256,15 @@ class ServiceMonitor(xbmc.Monitor):
                                 finally:
                                     read_access.set()
 
+            elif target == REFRESH_RESOURCES:
+                resource_type = data.get('resource_type')
+                ids = data.get('ids')
+                if self._provider and resource_type and ids:
+                    self.refresh_resources(resource_type, ids)
+                    response = True
+                else:
+                    response = False
+
             else:
                 return
 
@@ -499,3 +523,97 @@ class ServiceMonitor(xbmc.Monitor):
             required = self._use_httpd
 
         return required
+
+    def refresh_resources(self, resource_type, ids):
+        """
+        Queues the ids to be refreshed by a single worker thread. Ids that are
+        already queued, or are being refreshed, are skipped.
+        """
+        with self._refresh_resources_lock:
+            refreshing_type, refreshing_ids = self._refreshing_resources
+            if resource_type == refreshing_type:
+                ids = [id_ for id_ in ids if id_ not in refreshing_ids]
+            pending = self._pending_resources.setdefault(resource_type, set())
+            pending.update(ids)
+            if not pending:
+                del self._pending_resources[resource_type]
+                return
+
+            if self.refresh_resources_thread is None:
+                thread = Thread(target=self._refresh_resources)
+                thread.daemon = True
+                self.refresh_resources_thread = thread
+                thread.start()
+
+    def _refresh_resources(self):
+        context = self._context
+        lock = self._refresh_resources_lock
+        while 1:
+            with lock:
+                if not self._pending_resources or self.abortRequested():
+                    self._refreshing_resources = (None, ())
+                    self.refresh_resources_thread = None
+                    return
+                resource_type, ids = self._pending_resources.popitem()
+                self._refreshing_resources = (resource_type, ids)
+            try:
+                resource_manager = self._provider.get_resource_manager(context)
+                resource_manager.refresh_items(resource_type, list(ids))
+            except Exception:
+                self.log.exception('Resource refresh failed')
+
+    def prefetch_feeds(self):
+        if not self._provider:
+            return False
+
+        thread = self.feed_prefetch_thread
+        if thread and thread.is_alive():
+            return False
+        if since_epoch() < self._feed_prefetch_time:
+            return False
+
+        thread = Thread(target=self._prefetch_feeds)
+        thread.daemon = True
+        self.feed_prefetch_thread = thread
+        thread.start()
+        return True
+
+    def _prefetch_feeds(self):
+        context = self._context
+        settings = context.get_settings()
+
+        filter_options = []
+        if settings.get_bool(settings.SHOW_MY_SUBSCRIPTIONS, True):
+            filter_options.append(False)
+        if settings.get_bool(settings.SHOW_MY_SUBSCRIPTIONS_FILTERED):
+            filter_options.append(True)
+
+        throttled = False
+        if filter_options:
+            client = self._provider.get_client(context)
+            for do_filter in filter_options:
+                if self.abortRequested():
+                    return
+                try:
+                    result = client.get_my_subscriptions(do_filter=do_filter,
+                                                         prefetch=True)
+                except Exception:
+                    self.log.exception('Feed prefetch failed')
+                    result = None
+                if result and result['throttled']:
+                    throttled = True
+                    break
+
+        if throttled:
+            backoff = min(2 * self._feed_prefetch_backoff
+                          or self.FEED_PREFETCH_PERIOD,
+                          self.FEED_PREFETCH_MAX_BACKOFF)
+            self.log.warning('Feed prefetch rate limited'
+                             ' - retrying in {backoff} seconds',
+                             backoff=backoff)
+        else:
+            backoff = 0
+        self._feed_prefetch_backoff = backoff
+        self._feed_prefetch_time = (since_epoch()
+                                    + self.FEED_PREFETCH_PERIOD
+                                    + backoff)
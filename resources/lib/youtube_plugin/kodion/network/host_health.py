@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+
+    Copyright (C) 2025 plugin.video.youtube
+
+    SPDX-License-Identifier: GPL-2.0-only
+    See LICENSES/GPL-2.0-only for more information.
+"""
+
+from __future__ import absolute_import, division, unicode_literals
+
+from collections import OrderedDict, deque
+from threading import Lock
+
+
+class HostHealth(object):
+    """
+    Latency and throughput of stream hosts, measured by the stream proxy and
+    kept for the lifetime of the service, so that hosts can be ranked by the
+    expected time taken to serve a request
+    """
+    # Weight of the latest sample in the moving averages
+    ALPHA = 0.3
+    MAX_HOSTS = 50
+    # TTFB sample recorded for a failed request, in seconds
+    FAILURE_PENALTY = 10
+    # Smallest transfer used to estimate throughput, in bytes
+    MIN_SAMPLE_SIZE = 256 * 1024
+    # Optimistic estimates, used for hosts that have not yet been measured,
+    # of TTFB in seconds and of throughput in bytes per second
+    PRIOR_TTFB = 0.1
+    PRIOR_THROUGHPUT = 10 * 1024 * 1024
+    # Number of recent TTFB samples used to estimate percentiles
+    MAX_TTFB_SAMPLES = 20
+    MIN_TTFB_SAMPLES = 5
+
+    _hosts = OrderedDict()
+    _lock = Lock()
+
+    @classmethod
+    def _get_host(cls, host):
+        hosts = cls._hosts
+        stats = hosts.get(host)
+        if stats is None:
+            stats = {
+                'ttfb': None,
+                'ttfb_samples': deque(maxlen=cls.MAX_TTFB_SAMPLES),
+                'throughput': None,
+                'requests': 0,
+                'failures': 0,
+            }
+            hosts[host] = stats
+            if len(hosts) > cls.MAX_HOSTS:
+                hosts.popitem(last=False)
+        else:
+            # Move to the end, as the most recently used host
+            hosts[host] = hosts.pop(host)
+        return stats
+
+    @classmethod
+    def _ewma(cls, average, sample):
+        if average is None:
+            return sample
+        return average + cls.ALPHA * (sample - average)
+
+    @classmethod
+    def record_response(cls, host, ttfb):
+        with cls._lock:
+            stats = cls._get_host(host)
+            stats['requests'] += 1
+            stats['ttfb'] = cls._ewma(stats['ttfb'], ttfb)
+            stats['ttfb_samples'].append(ttfb)
+
+    @classmethod
+    def record_transfer(cls, host, size, duration):
+        if size < cls.MIN_SAMPLE_SIZE or duration <= 0:
+            return
+        with cls._lock:
+            stats = cls._get_host(host)
+            stats['throughput'] = cls._ewma(stats['throughput'],
+                                            size / duration)
+
+    @classmethod
+    def record_failure(cls, host):
+        with cls._lock:
+            stats = cls._get_host(host)
+            stats['requests'] += 1
+            stats['failures'] += 1
+            stats['ttfb'] = cls._ewma(stats['ttfb'], cls.FAILURE_PENALTY)
+
+    @classmethod
+    def expected_latency(cls, host, size=None):
+        """
+        Expected time taken to receive a response of the given size from the
+        host. Optimistic estimates are used in place of measurements that are
+        not yet available, so that new hosts are tried and measured.
+        """
+        stats = cls._hosts.get(host)
+        if stats:
+            latency = stats['ttfb']
+            throughput = stats['throughput']
+        else:
+            latency = throughput = None
+        if latency is None:
+            latency = cls.PRIOR_TTFB
+        if size:
+            latency += size / (throughput or cls.PRIOR_THROUGHPUT)
+        return latency
+
+    @classmethod
+    def ttfb_percentile(cls, host, percentile=0.9):
+        """
+        TTFB of the host at the given percentile of recent successful
+        requests, or None if there are too few samples
+        """
+        with cls._lock:
+            stats = cls._hosts.get(host)
+            if not stats:
+                return None
+            samples = sorted(stats['ttfb_samples'])
+        num_samples = len(samples)
+        if num_samples < cls.MIN_TTFB_SAMPLES:
+            return None
+        return samples[min(int(num_samples * percentile), num_samples - 1)]
+
+    @classmethod
+    def sort(cls, hosts, size=None):
+        """
+        Sorts hosts in place by expected latency. The sort is stable so hosts
+        with equal expected latency keep their original order.
+        """
+        with cls._lock:
+            hosts.sort(key=lambda host: (
+                cls.expected_latency(host, size) if host else float('inf')
+            ))
+        return hosts
@@ -14,20 +14,23 @@ import re
 import socket
 from collections import deque
 from errno import errorcode
-from functools import partial
 from io import open
 from json import dumps as json_dumps, loads as json_loads
-from select import select
 from textwrap import dedent
+from threading import Condition, Lock, Thread
+from time import time
 
 from urllib3.exceptions import HTTPError
 
+from .host_health import HostHealth
+from .manifest_store import ManifestStore
 from .requests import BaseRequestsClass
+from .segment_cache import DiskSegmentCache, ReadAheadCache
 from .. import logging
 from ..compatibility import (
     BaseHTTPRequestHandler,
     TCPServer,
-    ThreadingMixIn,
+    buffer_slice,
     parse_qs,
     urlencode,
     urlsplit,
@@ -47,61 +50,104 @@ from ..utils.methods import wait
 from ..utils.redact import parse_and_redact_uri
 
 
-class HTTPServer(ThreadingMixIn, TCPServer):
+class HTTPServer(TCPServer, object):
+    """
+    TCPServer that handles connections with a fixed pool of MAX_WORKERS
+    worker threads. Accepted connections are queued and are handled in turn
+    by the next available worker.
+    """
     address_family = socket.AF_INET
     socket_type = socket.SOCK_STREAM
-    request_queue_size = 5
+    request_queue_size = 16
     allow_reuse_address = True
     allow_reuse_port = True
 
-    daemon_threads = False
-    block_on_close = True
+    MAX_WORKERS = 16
+    CLOSE_TIMEOUT = 2
 
-    _handlers = []
+    def __init__(self, *args, **kwargs):
+        self._closed = False
+        self._connections = set()
+        self._pending = deque()
+        self._condition = Condition(Lock())
+        self._workers = []
+        super(HTTPServer, self).__init__(*args, **kwargs)
+
+    def has_pending_requests(self):
+        return bool(self._pending)
+
+    def process_request(self, request, client_address):
+        with self._condition:
+            if self._closed:
+                self.shutdown_request(request)
+                return
+            if not self._workers:
+                for _ in range(self.MAX_WORKERS):
+                    thread = Thread(target=self.process_request_worker)
+                    thread.daemon = True
+                    thread.start()
+                    self._workers.append(thread)
+            self._connections.add(request)
+            self._pending.append((request, client_address))
+            self._condition.notify()
+
+    def process_request_worker(self):
+        condition = self._condition
+        pending = self._pending
+        while 1:
+            with condition:
+                while not pending and not self._closed:
+                    condition.wait()
+                if self._closed:
+                    return
+                request, client_address = pending.popleft()
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                with condition:
+                    self._connections.discard(request)
+                self.shutdown_request(request)
 
     def finish_request(self, request, client_address):
+        if self.RequestHandlerClass._close_all:
+            return
         handler = self.RequestHandlerClass(request, client_address, self)
-        HTTPServer._handlers.append(handler)
-
         try:
             handler.handle()
         finally:
-            wfile = handler.wfile
-            while (not handler._close_all
-                   and not wfile.closed
-                   and not select((), (wfile,), (), 0.1)[1]):
-                pass
-            if not handler._close_all and not wfile.closed:
-                handler.finish()
+            handler.finish()
 
     def server_close(self):
         request_handler = self.RequestHandlerClass
         request_handler._close_all = True
         request_handler.timeout = 0
 
-        for handler in HTTPServer._handlers:
-            handler.finish()
-        HTTPServer._handlers = []
-
-        try:
-            threads = self._threads.pop_all()
-        except AttributeError:
-            return
-        for thread in threads:
-            if not thread.is_alive():
-                continue
-            request = thread._args[0]
+        super(HTTPServer, self).server_close()
+
+        # Connections still waiting for a worker are closed without being
+        # handled. Shutting down the sockets of open connections interrupts
+        # any blocking reads or writes, allowing workers to finish promptly.
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+            pending = [request for request, _ in self._pending]
+            self._pending.clear()
+            self._connections.difference_update(pending)
+            connections = tuple(self._connections)
+            workers = tuple(self._workers)
+        for request in pending:
+            self.shutdown_request(request)
+        for request in connections:
             try:
                 request.shutdown(socket.SHUT_RDWR)
             except (OSError, socket.error):
                 pass
-            request.close()
-            try:
-                thread.join(2)
-                if not thread.is_alive():
-                    continue
-            except RuntimeError:
-                pass
+
+        deadline = time() + self.CLOSE_TIMEOUT
+        for thread in workers:
+            thread.join(max(deadline - time(), 0))
 
 
 class RequestHandler(BaseHTTPRequestHandler, object):
@@ -112,16 +158,51 @@ class RequestHandler(BaseHTTPRequestHandler, object):
 
     _context = None
     _close_all = False
+    _buffer = None
+    _keep_alive = False
 
     requests = None
     BASE_PATH = xbmcvfs.translatePath(TEMP_PATH)
     chunk_size = 1024 * 64
+    # Only connections used for stream segment requests are kept alive, and
+    # only for IDLE_TIMEOUT seconds between requests, as each idle connection
+    # holds one of the HTTPServer.MAX_WORKERS workers. Connections are not
+    # kept alive when other connections are waiting for a worker.
+    IDLE_TIMEOUT = 2
+
+    HOP_BY_HOP_HEADERS = (
+        'Connection',
+        'Keep-Alive',
+        'Proxy-Authenticate',
+        'Proxy-Authorization',
+        'TE',
+        'Trailer',
+        'Transfer-Encoding',
+        'Upgrade',
+    )
 
     server_priority_list = {
         'stream_ids': deque(),
         'server_lists': {},
     }
 
+    # Minimum delay, in seconds, before a stream request is also sent to an
+    # alternate server
+    MIN_HEDGE_DELAY = 0.25
+    # Maximum time, in seconds, to wait for the response headers of either
+    # hedged request, longer than the default requests connect and read
+    # timeouts
+    HEDGE_TIMEOUT = 60
+
+    # Ranges of at least SPLIT_MIN_SIZE bytes may be requested as sub-ranges
+    # of SPLIT_MIN_PART_SIZE to SPLIT_MAX_PART_SIZE bytes over parallel
+    # connections
+    SPLIT_MIN_SIZE = 2 * 1024 * 1024
+    SPLIT_MIN_PART_SIZE = 512 * 1024
+    SPLIT_MAX_PART_SIZE = 2 * 1024 * 1024
+
+    LOOPBACK_ADDRESSES = {'127.0.0.1', '::1', '::ffff:127.0.0.1'}
+
     SWALLOWED_ERRORS = {
         'ECONNABORTED',
         'ECONNREFUSED',
@@ -142,10 +223,10 @@ class RequestHandler(BaseHTTPRequestHandler, object):
         self.whitelist_ips = self._context.get_settings().httpd_whitelist()
 
         # Rather than calling BaseHTTPRequestHandler.__init__ we reimplement
-        # the same setup so that RequestHandlerClass instance can be stored
-        # after creation in HTTPServer.finish_request allowing
-        # RequestHandler.finish to be called in HTTPServer.server_close to
-        # ensure that all connections are properly closed.
+        # the same setup so that RequestHandler.handle and
+        # RequestHandler.finish are called separately by
+        # HTTPServer.finish_request, ensuring that all connections are
+        # properly closed.
         #
         # super(RequestHandler, self).__init__(request, client_address, server)
 
@@ -162,17 +243,16 @@ class RequestHandler(BaseHTTPRequestHandler, object):
         #     self.finish()
 
     def handle_one_request(self):
-        # Allow self.rfile.readline call to be interrupted by
-        # HTTPServer.server_close when connection is kept open by keep-alive
-        rfile = self.rfile
-        while (not self._close_all
-               and not rfile.closed
-               and not select((rfile,), (), (), 0.1)[0]):
-            pass
-        if self._close_all or rfile.closed:
+        # Blocking self.rfile.readline call, when connection is kept open by
+        # keep-alive, is interrupted by HTTPServer.server_close shutting down
+        # the connection socket
+        if self._close_all or self.rfile.closed:
             self.close_connection = True
             return
 
+        self.connection.settimeout(self.IDLE_TIMEOUT)
+        self._keep_alive = False
+
         try:
             super(RequestHandler, self).handle_one_request()
             return
@@ -186,6 +266,17 @@ class RequestHandler(BaseHTTPRequestHandler, object):
                 return
             raise exc
 
+    def parse_request(self):
+        # Request line has been received, so revert to the default timeout
+        # for the rest of the request
+        self.connection.settimeout(self.timeout)
+        return super(RequestHandler, self).parse_request()
+
+    def end_headers(self):
+        if not self._keep_alive and not self.close_connection:
+            self.send_header('Connection', 'close')
+        super(RequestHandler, self).end_headers()
+
     def finish(self):
         try:
             super(RequestHandler, self).finish()
@@ -280,8 +371,13 @@ class RequestHandler(BaseHTTPRequestHandler, object):
             self.wfile.write(client_json.encode('utf-8'))
 
         elif path['path'].startswith(PATHS.MPD):
+            file = path['params'].get('file', empty)[0]
+            manifest = ManifestStore.get(file) if file else None
+            if manifest:
+                self._send_manifest(manifest)
+                return
+
             try:
-                file = path['params'].get('file', empty)[0]
                 if file:
                     file_path = os.path.join(self.BASE_PATH, file)
                 else:
@@ -326,7 +422,7 @@ class RequestHandler(BaseHTTPRequestHandler, object):
                 wait(1)
                 self.send_response(301)
                 self.send_header('Location', url)
-                self.send_header('Connection', 'close')
+                self.send_header('Content-Length', '0')
                 self.end_headers()
             else:
                 self.send_error(501)
@@ -338,6 +434,7 @@ class RequestHandler(BaseHTTPRequestHandler, object):
             stream_id = params.pop('__id', empty)
             method = params.pop('__method', empty)[0] or 'POST'
             if original_path == '/videoplayback':
+                self._keep_alive = not self.server.has_pending_requests()
                 stream_id += params.get('itag', empty)
                 stream_id = tuple(stream_id)
                 stream_type = params.get('mime', empty)[0]
@@ -349,13 +446,6 @@ class RequestHandler(BaseHTTPRequestHandler, object):
                 server_lists = self.server_priority_list['server_lists']
                 if stream_id in ids:
                     priority_list = server_lists[stream_id]['list']
-                    if priority_list:
-                        request_servers.sort(
-                            key=partial(self._sort_servers,
-                                        _len=len(priority_list),
-                                        _index=priority_list.index),
-                            reverse=True,
-                        )
                 else:
                     ids.append(stream_id)
                     if len(ids) > 5:
@@ -387,6 +477,34 @@ class RequestHandler(BaseHTTPRequestHandler, object):
 
             byte_range = headers.get('Range')
             client = headers.get('X-YouTube-Client-Name')
+
+            if original_path == '/videoplayback':
+                try:
+                    range_start, _, range_end = byte_range[6:].partition('-')
+                    range_start = int(range_start)
+                    range_end = int(range_end)
+                except (TypeError, ValueError):
+                    range_start = range_end = range_size = None
+                else:
+                    range_size = range_end - range_start + 1
+                if len(request_servers) > 1:
+                    HostHealth.sort(request_servers, size=range_size)
+                if range_size and method != 'HEAD':
+                    read_ahead = settings.httpd_read_ahead()
+                    segment_cache_size = (
+                        settings.httpd_segment_cache_size() * 1024 * 1024
+                    )
+                    split_connections = settings.httpd_split_connections()
+                else:
+                    read_ahead = False
+                    segment_cache_size = 0
+                    split_connections = 1
+            else:
+                range_start = range_end = range_size = None
+                read_ahead = False
+                segment_cache_size = 0
+                split_connections = 1
+
             if self.log.debugging:
                 if 'c' in params:
                     if client:
@@ -431,10 +549,106 @@ class RequestHandler(BaseHTTPRequestHandler, object):
                        'Client: {client}',
                        'Range:  {byte_range!r}{timestamp}')
 
+            if read_ahead:
+                segment = ReadAheadCache.get(stream_id, range_start, range_end)
+            else:
+                segment = None
+            if segment:
+                source = 'read ahead'
+                segment_file = None
+                if segment_cache_size:
+                    DiskSegmentCache.put(stream_id,
+                                         range_start,
+                                         segment['data'],
+                                         segment.get('content_type'),
+                                         segment['total'],
+                                         segment_cache_size)
+            elif segment_cache_size:
+                segment = DiskSegmentCache.get(stream_id,
+                                               range_start,
+                                               range_end)
+                if segment:
+                    source = 'segment cache'
+                    segment, segment_file = segment
+            if segment:
+                self._send_segment(segment,
+                                   range_start,
+                                   range_end,
+                                   segment_file)
+                self.log.debug(('Stream proxy response from {source}',
+                                'Stream: {stream_id} - {stream_type}',
+                                'Range:  {byte_range!r}{timestamp}'),
+                               source=source,
+                               stream_id=stream_id,
+                               stream_type=stream_type,
+                               byte_range=byte_range,
+                               timestamp=timestamp)
+                if read_ahead:
+                    self._read_ahead(stream_id,
+                                     request_servers[0],
+                                     original_path,
+                                     original_query_str,
+                                     params.get('clen', empty)[0],
+                                     method,
+                                     headers,
+                                     range_end + 1,
+                                     range_size)
+                return
+
+            if (split_connections > 1
+                    and range_size >= self.SPLIT_MIN_SIZE
+                    and not stream_redirect
+                    and request_servers[0]):
+                server = request_servers[0]
+                captured = [] if segment_cache_size else None
+                result = self._split_request(server,
+                                             split_connections,
+                                             original_path,
+                                             original_query_str,
+                                             method,
+                                             headers,
+                                             range_start,
+                                             range_end,
+                                             captured)
+                if result:
+                    size, read_time, content_type, total = result
+                    HostHealth.record_transfer(server, size, read_time)
+                    self.log.debug(('Stream proxy response from split range',
+                                    'Stream: {stream_id} - {stream_type}',
+                                    'Server: {server!r}',
+                                    'Range:  {byte_range!r}{timestamp}'),
+                                   stream_id=stream_id,
+                                   stream_type=stream_type,
+                                   server=server,
+                                   byte_range=byte_range,
+                                   timestamp=timestamp)
+                    if size != range_size:
+                        return
+                    if read_ahead:
+                        self._read_ahead(stream_id,
+                                         server,
+                                         original_path,
+                                         original_query_str,
+                                         params.get('clen', empty)[0],
+                                         method,
+                                         headers,
+                                         range_end + 1,
+                                         range_size)
+                    if captured:
+                        DiskSegmentCache.put(stream_id,
+                                             range_start,
+                                             b''.join(captured),
+                                             content_type,
+                                             total,
+                                             segment_cache_size)
+                    return
+
             response = None
             server = None
             target = None
+            request_headers = headers
             iterator = iter(request_servers)
+            hedge = original_path == '/videoplayback'
             while 1:
                 if target:
                     _server = target
@@ -442,8 +656,10 @@ class RequestHandler(BaseHTTPRequestHandler, object):
                 else:
                     _server = next(iterator, Ellipsis)
                 if _server is Ellipsis:
+                    # No usable response from any server. send_error also
+                    # closes the connection with the player.
                     self.send_error(
-                        500 if response is None else response.status_code
+                        502 if response is None else response.status_code
                     )
                     break
                 if not _server or _server == server:
@@ -461,20 +677,34 @@ class RequestHandler(BaseHTTPRequestHandler, object):
                 if stream_redirect and server in priority_list:
                     self.send_response(301)
                     self.send_header('Location', stream_url)
-                    self.send_header('Connection', 'close')
+                    self.send_header('Content-Length', '0')
                     self.end_headers()
                     break
 
-                headers['Host'] = server
-                response = self.requests.request(
-                    stream_url,
-                    method=method,
-                    headers=headers,
-                    allow_redirects=False,
-                    stream=True,
-                    cache=False,
-                )
+                # Only the initial request is hedged, and only against the
+                # next best server
+                if hedge:
+                    hedge = False
+                    alt_server = next(
+                        (_server for _server in request_servers
+                         if _server and _server != server),
+                        None,
+                    )
+                else:
+                    alt_server = None
+                server, response = self._hedged_request(server,
+                                                        alt_server,
+                                                        original_path,
+                                                        original_query_str,
+                                                        method,
+                                                        headers)
+                if response is not None:
+                    # TTFB of server includes the time taken to follow
+                    # redirects
+                    response, target, ttfb = self._follow_redirects(response,
+                                                                    headers)
                 if response is None:
+                    HostHealth.record_failure(server)
                     self.log.log(
                         level=logging.WARNING,
                         msg=log_msg,
@@ -490,36 +720,10 @@ class RequestHandler(BaseHTTPRequestHandler, object):
                         byte_range=byte_range,
                         timestamp=timestamp,
                     )
-                    break
-                with response:
-                    while response.is_redirect:
-                        request = response.next
-                        if not request:
-                            break
+                    target = None
+                    continue
 
-                        target = urlsplit(request.url).hostname
-                        if (target.endswith('googlevideo.com')
-                                and 'Authorization' in headers):
-                            _headers = (
-                                ('Authorization', headers['Authorization']),
-                                ('Host', target),
-                                ('Referer', response.url)
-                            )
-                        else:
-                            _headers = (
-                                ('Host', target),
-                                ('Referer', response.url)
-                            )
-                        request.headers.update(_headers)
-
-                        response = self.requests.request(
-                            prepared_request=request,
-                            allow_redirects=False,
-                            stream=True,
-                            cache=False,
-                        )
-                        if response is None:
-                            break
+                with response:
                     status = response.status_code
                     reason = response.reason
 
@@ -528,11 +732,14 @@ class RequestHandler(BaseHTTPRequestHandler, object):
                         log_level = logging.DEBUG
                         if server not in priority_list:
                             priority_list.append(server)
+                        HostHealth.record_response(server, ttfb)
                     else:
                         success = False
                         log_level = logging.WARNING
                         if server in priority_list:
                             priority_list.remove(server)
+                        if status >= 500:
+                            HostHealth.record_failure(server)
 
                     self.log.log(
                         level=log_level,
@@ -554,41 +761,94 @@ class RequestHandler(BaseHTTPRequestHandler, object):
                         continue
 
                     self.send_response(status)
-                    if status == 200:
-                        content = response.content
-                        if stream_type[0] == 'track':
-                            content = fix_subtitle_stream(stream_type, content)
-                        response.headers['Content-Length'] = len(content)
-                        if 'Content-Encoding' in response.headers:
-                            del response.headers['Content-Encoding']
-                        if 'Transfer-Encoding' in response.headers:
-                            del response.headers['Transfer-Encoding']
-                        self.send_header('Connection', 'close')
+                    headers = response.headers
+                    # Hop-by-hop headers of the upstream connection are not
+                    # relayed, so that the connection with the player can be
+                    # kept alive independently
+                    for header in self.HOP_BY_HOP_HEADERS:
+                        if header in headers:
+                            del headers[header]
+                    chunked = False
+                    if status == 200 and stream_type[0] == 'track':
+                        # Subtitle tracks are rewritten, changing their
+                        # length, so are still buffered. They are small
+                        # compared to media streams, and SRT conversion needs
+                        # the whole track.
+                        content = fix_subtitle_stream(stream_type,
+                                                      response.content)
+                        headers['Content-Length'] = str(len(content))
+                        if 'Content-Encoding' in headers:
+                            del headers['Content-Encoding']
+                    elif (method == 'HEAD'
+                          or status in {204, 304}
+                          or status < 200):
+                        content = b''
                     else:
                         content = None
-                    for header, value in response.headers.items():
+                        # Body is relayed undecoded, delimited by the
+                        # upstream Content-Length if available, or otherwise
+                        # re-framed using chunked transfer encoding, or by
+                        # closing the connection for HTTP/1.0 clients
+                        if 'Content-Length' in headers:
+                            pass
+                        elif self.request_version == 'HTTP/1.1':
+                            chunked = True
+                            self.send_header('Transfer-Encoding', 'chunked')
+                        else:
+                            self.send_header('Connection', 'close')
+                    for header, value in headers.items():
                         self.send_header(header, value)
                     self.end_headers()
 
                     wfile = self.wfile
-                    while (not self._close_all
-                           and not wfile.closed
-                           and not select((), (wfile,), (), 0.1)[1]):
-                        pass
                     if self._close_all or wfile.closed:
+                        self.close_connection = True
                         break
-                    if content:
-                        wfile.write(content)
-                    else:
-                        while 1:
-                            content = response.raw.read(
-                                amt=1048576,
-                                decode_content=False,
-                                cache_content=False,
-                            )
-                            if not content:
-                                break
+                    if content is not None:
+                        if content:
                             wfile.write(content)
+                        break
+
+                    if (segment_cache_size
+                            and status == 206
+                            and not chunked
+                            and 'Content-Encoding' not in headers
+                            and int(headers.get('Content-Length', -1))
+                            <= DiskSegmentCache.MAX_SEGMENT_SIZE):
+                        captured = []
+                    else:
+                        captured = None
+
+                    size, read_time = self._relay_content(response,
+                                                          chunked,
+                                                          captured)
+                    HostHealth.record_transfer(server, size, read_time)
+                    # Player is unable to tell where the next response starts
+                    # if the body was cut short, so the connection is closed
+                    if (not chunked
+                            and size != int(headers.get('Content-Length', -1))):
+                        self.close_connection = True
+                        captured = None
+                    elif read_ahead and status == 206:
+                        self._read_ahead(stream_id,
+                                         target or server,
+                                         original_path,
+                                         original_query_str,
+                                         params.get('clen', empty)[0],
+                                         method,
+                                         request_headers,
+                                         range_end + 1,
+                                         range_size)
+                    if captured:
+                        DiskSegmentCache.put(
+                            stream_id,
+                            range_start,
+                            b''.join(captured),
+                            headers.get('Content-Type'),
+                            (headers.get('Content-Range', '').partition('/')[2]
+                             or '*'),
+                            segment_cache_size,
+                        )
                 break
 
         else:
@@ -604,8 +864,13 @@ class RequestHandler(BaseHTTPRequestHandler, object):
         empty = [None]
 
         if path['path'].startswith(PATHS.MPD):
+            file = path['params'].get('file', empty)[0]
+            manifest = ManifestStore.get(file) if file else None
+            if manifest:
+                self._send_manifest(manifest, send_body=False)
+                return
+
             try:
-                file = path['params'].get('file', empty)[0]
                 if file:
                     file_path = os.path.join(self.BASE_PATH, file)
                 else:
@@ -698,6 +963,41 @@ class RequestHandler(BaseHTTPRequestHandler, object):
             for chunk in self._get_chunks(html):
                 self.wfile.write(chunk)
 
+        elif path['path'].startswith(PATHS.MPD):
+            # Manifests are only stored by the plugin, running on this host,
+            # which connects from a loopback address or, if the httpd listens
+            # on another interface, from the address it is connecting to
+            client_ip = self.client_address[0]
+            if (client_ip not in self.LOOPBACK_ADDRESSES
+                    and client_ip != self.connection.getsockname()[0]):
+                self.send_error(403)
+                return
+
+            file = path['params'].get('file', empty)[0]
+            try:
+                expires = int(path['params'].get('expires', empty)[0])
+            except (TypeError, ValueError):
+                expires = None
+            length = int(self.headers.get('Content-Length') or 0)
+            if not file or not length:
+                self.send_error(400)
+                return
+            if length > ManifestStore.MAX_SIZE:
+                self.close_connection = True
+                self.send_error(413)
+                return
+
+            post_data = self.rfile.read(length)
+            etag = ManifestStore.put(file, post_data, expires=expires)
+            if not etag:
+                self.send_error(400)
+                return
+
+            self.send_response(201)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
         elif path['path'].startswith(PATHS.DRM):
             ui = self._context.get_ui()
 
@@ -789,18 +1089,446 @@ class RequestHandler(BaseHTTPRequestHandler, object):
     def log_message(self, format, *args):
         return
 
+    def _get_buffer(self):
+        buffer = self._buffer
+        if buffer is None:
+            buffer = memoryview(bytearray(self.chunk_size))
+            self._buffer = buffer
+        return buffer
+
+    def _send_manifest(self, manifest, send_body=True):
+        etag = manifest['etag']
+        max_age = max(int(manifest['expires'] - time()), 0)
+        if ManifestStore.etag_matches(etag,
+                                      self.headers.get('If-None-Match')):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control',
+                             'private, max-age={0}'.format(max_age))
+            self.end_headers()
+            return
+
+        data = manifest['data']
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/dash+xml')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control',
+                         'private, max-age={0}'.format(max_age))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(data)
+
+    def _relay_content(self, response, chunked=False, captured=None):
+        """
+        Relays the undecoded response body in chunks through a single
+        reusable buffer, rather than reading the entire response into memory.
+        Chunks are also copied into the captured list, if provided.
+        Returns a tuple of the size of the relayed body and the time, in
+        seconds, spent reading it from the upstream response.
+        """
+        buffer = self._get_buffer()
+        readinto = response.raw.readinto
+        write = self.wfile.write
+        total_size = 0
+        read_time = 0
+        while not self._close_all:
+            start_time = time()
+            size = readinto(buffer)
+            read_time += time() - start_time
+            if not size:
+                break
+            if chunked:
+                write(b'%X\r\n' % size)
+                write(buffer_slice(buffer, size))
+                write(b'\r\n')
+            else:
+                write(buffer_slice(buffer, size))
+            if captured is not None:
+                captured.append(buffer[:size].tobytes())
+            total_size += size
+        else:
+            self.close_connection = True
+            return total_size, read_time
+
+        if chunked:
+            write(b'0\r\n\r\n')
+        return total_size, read_time
+
+    def _send_segment(self, segment, start, end, segment_file=None):
+        """
+        Sends the requested range of a locally stored segment, from memory or
+        from segment_file, as a partial content response
+        """
+        size = end - start + 1
+        self.send_response(206)
+        if segment.get('content_type'):
+            self.send_header('Content-Type', segment['content_type'])
+        self.send_header('Content-Range', 'bytes {0}-{1}/{2}'.format(
+            start, end, segment['total'],
+        ))
+        self.send_header('Content-Length', str(size))
+        self.end_headers()
+
+        if segment_file is None:
+            self.wfile.write(segment['data'])
+            return
+
+        buffer = self._get_buffer()
+        buffer_size = len(buffer)
+        write = self.wfile.write
+        with segment_file:
+            while size and not self._close_all:
+                read_size = segment_file.readinto(
+                    buffer[:size] if size < buffer_size else buffer
+                )
+                if not read_size:
+                    break
+                write(buffer_slice(buffer, read_size))
+                size -= read_size
+        if size:
+            self.close_connection = True
+
+    def _split_request(self,
+                       server,
+                       num_connections,
+                       path,
+                       query,
+                       method,
+                       headers,
+                       start,
+                       end,
+                       captured=None):
+        """
+        Requests the range start-end from server as sub-ranges over parallel
+        connections, relaying them in order. The leading sub-range is relayed
+        as soon as its response is received. Following sub-ranges are read
+        into memory, so are limited to SPLIT_MAX_PART_SIZE bytes. The rest of
+        the range, including any sub-range that failed, is then requested
+        over a single connection.
+        Returns the size, upstream read time, content type and total size of
+        the relayed body, or None if nothing was sent and the request should
+        be retried normally.
+        """
+        size = end - start + 1
+        part_size = min(
+            max(-(-size // num_connections), self.SPLIT_MIN_PART_SIZE),
+            self.SPLIT_MAX_PART_SIZE,
+        )
+        split_end = min(end + 1, start + num_connections * part_size)
+        parts = [
+            (part_start, min(part_start + part_size, split_end) - 1)
+            for part_start in range(start, split_end, part_size)
+        ]
+
+        url = urlunsplit(('https', server, path, query, ''))
+        requests = self.requests
+
+        def _request(part_start, part_end):
+            _headers = dict(headers)
+            _headers['Host'] = server
+            _headers['Range'] = 'bytes={0}-{1}'.format(part_start, part_end)
+            response = requests.request(url,
+                                        method=method,
+                                        headers=_headers,
+                                        allow_redirects=False,
+                                        stream=True,
+                                        cache=False)
+            if response is not None:
+                response = self._follow_redirects(response, headers)[0]
+            if (response is None
+                    or response.status_code != 206
+                    or 'Content-Encoding' in response.headers
+                    or (int(response.headers.get('Content-Length', -1))
+                        != part_end - part_start + 1)):
+                if response is not None:
+                    response.close()
+                return None
+            return response
+
+        condition = Condition()
+        contents = {}
+        state = {'cancelled': False}
+
+        def _read(part):
+            content = None
+            try:
+                response = _request(*part)
+                if response is not None:
+                    with response:
+                        if not state['cancelled']:
+                            content = response.raw.read()
+            except (HTTPError, socket.error):
+                pass
+            finally:
+                if content and len(content) != part[1] - part[0] + 1:
+                    content = None
+                with condition:
+                    contents[part] = content
+                    condition.notify_all()
+
+        for part in parts[1:]:
+            thread = Thread(target=_read, args=(part,))
+            thread.daemon = True
+            thread.start()
+        try:
+            response = _request(*parts[0])
+            if response is None:
+                return None
+            with response:
+                response_headers = response.headers
+                content_type = response_headers.get('Content-Type')
+                total = (
+                    response_headers.get('Content-Range', '').partition('/')[2]
+                    or '*'
+                )
+                self.send_response(206)
+                if content_type:
+                    self.send_header('Content-Type', content_type)
+                self.send_header('Content-Range', 'bytes {0}-{1}/{2}'.format(
+                    start, end, total,
+                ))
+                self.send_header('Content-Length', str(size))
+                self.end_headers()
+                relayed, read_time = self._relay_content(response,
+                                                         captured=captured)
+            if relayed != parts[0][1] - parts[0][0] + 1:
+                self.close_connection = True
+                return relayed, read_time, content_type, total
+
+            write = self.wfile.write
+            for part in parts[1:]:
+                start_time = time()
+                with condition:
+                    while part not in contents:
+                        condition.wait()
+                    content = contents.pop(part)
+                read_time += time() - start_time
+                if content is None:
+                    self.log.warning(('Split range request failed',
+                                      'Server: {server!r}',
+                                      'Range:  {start}-{end}'),
+                                     server=server,
+                                     start=part[0],
+                                     end=part[1])
+                    break
+                write(content)
+                if captured is not None:
+                    captured.append(content)
+                relayed += len(content)
+
+            rest_start = start + relayed
+            if rest_start <= end and not self._close_all:
+                response = _request(rest_start, end)
+                if response is not None:
+                    with response:
+                        part_relayed, part_read_time = self._relay_content(
+                            response,
+                            captured=captured,
+                        )
+                    relayed += part_relayed
+                    read_time += part_read_time
+            if relayed != size:
+                self.close_connection = True
+            return relayed, read_time, content_type, total
+        finally:
+            state['cancelled'] = True
+
+    def _read_ahead(self,
+                    stream_id,
+                    server,
+                    path,
+                    query,
+                    clen,
+                    method,
+                    headers,
+                    start,
+                    size):
+        try:
+            max_end = int(clen) - 1
+        except (TypeError, ValueError):
+            max_end = None
+        headers = dict(headers)
+        requests = self.requests
+
+        def _fetch(start, end):
+            _headers = headers.copy()
+            _headers['Host'] = server
+            _headers['Range'] = 'bytes={0}-{1}'.format(start, end)
+            return requests.request(
+                urlunsplit(('https', server, path, query, '')),
+                method=method,
+                headers=_headers,
+                cache=False,
+            )
+
+        ReadAheadCache.read_ahead(stream_id, start, size, max_end, _fetch)
+
+    def _hedged_request(self, server, alt_server, path, query, method, headers):
+        """
+        Requests the stream from server and, if the request fails or response
+        headers have not been received within the p90 TTFB of server, from
+        alt_server as well.
+        Returns the first successful response along with the server that sent
+        it, otherwise the response from server. The response to the other
+        request is closed.
+        """
+        def _request(_server):
+            _headers = dict(headers)
+            _headers['Host'] = _server
+            return self.requests.request(
+                urlunsplit(('https', _server, path, query, '')),
+                method=method,
+                headers=_headers,
+                allow_redirects=False,
+                stream=True,
+                cache=False,
+            )
+
+        delay = HostHealth.ttfb_percentile(server) if alt_server else None
+        if delay is None:
+            return server, _request(server)
+        if delay < self.MIN_HEDGE_DELAY:
+            delay = self.MIN_HEDGE_DELAY
+
+        condition = Condition()
+        results = []
+        state = {'done': False}
+
+        def _hedge(_server):
+            response = None
+            discard = False
+            try:
+                response = _request(_server)
+            except Exception:
+                self.log.exception(('Stream request failed',
+                                    'Server: {server!r}'),
+                                   server=_server)
+            finally:
+                with condition:
+                    discard = state['done']
+                    if not discard:
+                        results.append((_server, response))
+                        condition.notify()
+            if discard:
+                self._discard_response(_server, response)
+
+        def _succeeded(result):
+            response = result[1]
+            return response is not None and response.status_code < 400
+
+        thread = Thread(target=_hedge, args=(server,))
+        thread.daemon = True
+        thread.start()
+        with condition:
+            if not results:
+                condition.wait(delay)
+            if results and _succeeded(results[0]):
+                state['done'] = True
+                return results[0]
+
+        self.log.debug(('Hedging stream request',
+                        'Server:    {server!r}',
+                        'Alternate: {alt_server!r}',
+                        'Delay:     {delay:.3f}s',
+                        'Failed:    {failed!r}'),
+                       server=server,
+                       alt_server=alt_server,
+                       delay=delay,
+                       failed=bool(results))
+        thread = Thread(target=_hedge, args=(alt_server,))
+        thread.daemon = True
+        thread.start()
+        deadline = time() + self.HEDGE_TIMEOUT
+        with condition:
+            while 1:
+                winner = next(
+                    (result for result in results if _succeeded(result)),
+                    None,
+                )
+                if winner or len(results) == 2:
+                    break
+                remaining = deadline - time()
+                if remaining <= 0:
+                    self.log.warning(('Hedged stream request timed out',
+                                      'Server:    {server!r}',
+                                      'Alternate: {alt_server!r}'),
+                                     server=server,
+                                     alt_server=alt_server)
+                    break
+                condition.wait(remaining)
+            state['done'] = True
+            completed = results[:]
+
+        if winner is None:
+            winner = next(
+                (result for result in completed if result[0] == server),
+                completed[0] if completed else (server, None),
+            )
+        for result in completed:
+            if result is not winner:
+                self._discard_response(*result)
+        return winner
+
+    @staticmethod
+    def _discard_response(server, response):
+        if response is None:
+            HostHealth.record_failure(server)
+            return
+        with response:
+            status = response.status_code
+            if status < 400:
+                HostHealth.record_response(server,
+                                           response.elapsed.total_seconds())
+            elif status >= 500:
+                HostHealth.record_failure(server)
+
+    def _follow_redirects(self, response, headers):
+        """
+        Follows redirects from response, with the Authorization header from
+        headers only sent to googlevideo.com hosts. Returns the final response,
+        or None if a redirect failed, the host of the last redirect target, and
+        the total time taken to receive the response headers.
+        """
+        target = None
+        elapsed = response.elapsed.total_seconds()
+        while response.is_redirect:
+            request = response.next
+            if not request:
+                break
+
+            target = urlsplit(request.url).hostname
+            if (target.endswith('googlevideo.com')
+                    and 'Authorization' in headers):
+                _headers = (
+                    ('Authorization', headers['Authorization']),
+                    ('Host', target),
+                    ('Referer', response.url)
+                )
+            else:
+                _headers = (
+                    ('Host', target),
+                    ('Referer', response.url)
+                )
+            request.headers.update(_headers)
+
+            redirect = response
+            response = self.requests.request(
+                prepared_request=request,
+                allow_redirects=False,
+                stream=True,
+                cache=False,
+            )
+            redirect.close()
+            if response is None:
+                break
+            elapsed += response.elapsed.total_seconds()
+        return response, target, elapsed
+
     def _get_chunks(self, data):
         for i in range(0, len(data), self.chunk_size):
             yield data[i:i + self.chunk_size]
 
-    @staticmethod
-    def _sort_servers(server, _len, _index):
-        try:
-            index = _index(server)
-        except ValueError:
-            return -1
-        return _len - index
-
     @classmethod
     def api_config_page(cls):
         settings = cls._context.get_settings()
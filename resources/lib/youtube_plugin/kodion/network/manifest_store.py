@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+
+    Copyright (C) 2025 plugin.video.youtube
+
+    SPDX-License-Identifier: GPL-2.0-only
+    See LICENSES/GPL-2.0-only for more information.
+"""
+
+from __future__ import absolute_import, division, unicode_literals
+
+from collections import OrderedDict
+from threading import Lock
+from time import time
+
+from ..utils.methods import generate_hash
+
+
+class ManifestStore(object):
+    """
+    Generated manifests served by the stream proxy, held in memory until the
+    stream urls they contain expire, keyed by video and stream parameters
+    """
+    MAX_ENTRIES = 20
+    MAX_SIZE = 4 * 1024 * 1024
+    # Lifetime, in seconds, of manifests stored without an expiry
+    DEFAULT_LIFETIME = 6 * 60 * 60
+
+    _manifests = OrderedDict()
+    _lock = Lock()
+
+    @classmethod
+    def _prune(cls, now):
+        manifests = cls._manifests
+        for key in [key for key, manifest in manifests.items()
+                    if manifest['expires'] <= now]:
+            del manifests[key]
+        while len(manifests) > cls.MAX_ENTRIES:
+            manifests.popitem(last=False)
+
+    @classmethod
+    def put(cls, key, data, expires=None):
+        """
+        Stores the manifest data, as bytes, until the expires timestamp.
+        Returns the ETag of the stored manifest, or None if it was not stored.
+        """
+        if not key or not data or len(data) > cls.MAX_SIZE:
+            return None
+        now = time()
+        if not expires:
+            expires = now + cls.DEFAULT_LIFETIME
+        elif expires <= now:
+            return None
+        etag = '"{0}"'.format(generate_hash(data))
+        with cls._lock:
+            # Replaced rather than updated, to move the key to the end
+            cls._manifests.pop(key, None)
+            cls._manifests[key] = {
+                'data': data,
+                'etag': etag,
+                'expires': expires,
+            }
+            cls._prune(now)
+        return etag
+
+    @classmethod
+    def get(cls, key):
+        """
+        Returns a dict of the data, ETag and expiry of the stored manifest,
+        otherwise None
+        """
+        with cls._lock:
+            cls._prune(time())
+            return cls._manifests.get(key)
+
+    @staticmethod
+    def etag_matches(etag, if_none_match):
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == '*':
+            return True
+        # Weak comparison, as is used for If-None-Match
+        etag = etag[2:] if etag.startswith('W/') else etag
+        for tag in if_none_match.split(','):
+            tag = tag.strip()
+            if tag.startswith('W/'):
+                tag = tag[2:]
+            if tag == etag:
+                return True
+        return False
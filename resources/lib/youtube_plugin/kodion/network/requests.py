@@ -12,7 +12,10 @@ from __future__ import absolute_import, division, unicode_literals
 import socket
 from atexit import register as atexit_register
 from collections import OrderedDict
+from copy import deepcopy
+from email.utils import mktime_tz, parsedate_tz
 from os.path import exists, isdir
+from threading import Event, Lock
 
 from requests.adapters import HTTPAdapter as _HTTPAdapter, Retry
 from requests.exceptions import InvalidJSONError, RequestException, URLRequired
@@ -28,7 +31,7 @@ from requests.utils import (
 from urllib3.util.ssl_ import create_urllib3_context
 
 from .. import logging
-from ..utils.datetime import imf_fixdate
+from ..utils.datetime import imf_fixdate, since_epoch
 from ..utils.methods import generate_hash
 
 
@@ -203,6 +206,16 @@ class BaseRequestsClass(object):
 
     METHODS_TO_CACHE = {'GET', 'HEAD'}
 
+    _cache_stats = {
+        'hit': 0,
+        'revalidate': 0,
+        'miss': 0,
+    }
+    _cache_stats_lock = Lock()
+
+    _in_flight = {}
+    _in_flight_lock = Lock()
+
     def __init__(self,
                  context=None,
                  verify_ssl=None,
@@ -259,6 +272,64 @@ class BaseRequestsClass(object):
     def __exit__(self, exc_type=None, exc_val=None, exc_tb=None):
         self._session.close()
 
+    @classmethod
+    def _update_cache_stats(cls, stat):
+        with cls._cache_stats_lock:
+            cls._cache_stats[stat] += 1
+
+    @classmethod
+    def get_cache_stats(cls):
+        with cls._cache_stats_lock:
+            return cls._cache_stats.copy()
+
+    @classmethod
+    def log_cache_stats(cls):
+        cls.log.debug(('Response cache stats',
+                       'Hit:        {hit}',
+                       'Revalidate: {revalidate}',
+                       'Miss:       {miss}'),
+                      **cls.get_cache_stats())
+
+    @staticmethod
+    def _get_lifetime(headers, ttl=None):
+        """
+        Freshness lifetime, in seconds, of a response with the given headers,
+        or the configured ttl of the endpoint, if provided
+        """
+        if ttl is not None:
+            return ttl
+        if not headers:
+            return None
+
+        cache_control = headers.get('Cache-Control')
+        if cache_control:
+            directives = {}
+            for directive in cache_control.lower().split(','):
+                name, _, value = directive.partition('=')
+                directives[name.strip()] = value.strip().strip('"')
+            if 'no-store' in directives or 'no-cache' in directives:
+                return None
+            max_age = directives.get('max-age')
+            if max_age:
+                try:
+                    lifetime = int(max_age) - int(headers.get('Age') or 0)
+                except ValueError:
+                    return None
+                return lifetime if lifetime > 0 else None
+
+        expires = headers.get('Expires')
+        if not expires:
+            return None
+        expires = parsedate_tz(expires)
+        if not expires:
+            return None
+        date = headers.get('Date')
+        date = parsedate_tz(date) if date else None
+        lifetime = mktime_tz(expires) - (
+            mktime_tz(date) if date else since_epoch()
+        )
+        return lifetime if lifetime > 0 else None
+
     @staticmethod
     def _raise_exception(new_exception, *args, **kwargs):
         if not new_exception:
@@ -333,6 +404,7 @@ class BaseRequestsClass(object):
                 error_info=None,
                 raise_exc=None,
                 cache=None,
+                cache_ttl=None,
                 **kwargs):
         if timeout is None:
             timeout = self._timeout
@@ -349,6 +421,8 @@ class BaseRequestsClass(object):
         cached_response = None
         etag = None
         timestamp = None
+        lifetime = None
+        new_lifetime = None
 
         if url:
             prepared_request = self._session.prepare_request(Request(
@@ -391,9 +465,31 @@ class BaseRequestsClass(object):
                 cache = False
                 cached_request = None
 
+            if cache and not cached_request:
+                self._update_cache_stats('miss')
+
             if cached_request:
-                etag, cached_response = cached_request['value']
-                if cached_response is not None:
+                etag, cached_response = cached_request['value'][:2]
+                if len(cached_request['value']) > 2:
+                    lifetime = cached_request['value'][2]
+                if cached_response is None:
+                    pass
+                elif (lifetime and since_epoch()
+                      < cached_request['timestamp'] + lifetime):
+                    self._update_cache_stats('hit')
+                    self.log.debug(('Using fresh cached response',
+                                    'Request ID: {request_id}',
+                                    'Etag:       {etag}',
+                                    'Expires in: {expires:.0f}s'),
+                                   request_id=request_id,
+                                   etag=etag,
+                                   expires=(cached_request['timestamp']
+                                            + lifetime
+                                            - since_epoch()),
+                                   stacklevel=stacklevel)
+                    return cached_response
+                else:
+                    self._update_cache_stats('revalidate')
                     if etag:
                         # Etag is meant to be enclosed in double quotes, but the
                         # Google servers don't seem to support this
@@ -409,137 +505,199 @@ class BaseRequestsClass(object):
                                    timestamp=timestamp,
                                    stacklevel=stacklevel)
 
-        if event_hook_kwargs is None:
-            event_hook_kwargs = {}
+        # Only allow one concurrent request for the same resource, with the
+        # same response hook. Other callers wait for, and then use a copy of,
+        # the parsed result of the same response.
+        coalesce_id = None
+        is_leader = False
+        in_flight = None
+        if response_hook and prepared_request and not stream:
+            if request_id:
+                coalesce_id = request_id
+            elif method in self.METHODS_TO_CACHE:
+                coalesce_id = generate_hash(
+                    method,
+                    url,
+                    headers,
+                    prepared_request.body,
+                )
+        if coalesce_id:
+            coalesce_id = (
+                coalesce_id,
+                getattr(response_hook, '__func__', response_hook),
+            )
+            in_flight_lock = self._in_flight_lock
+            with in_flight_lock:
+                in_flight = self._in_flight.get(coalesce_id)
+                is_leader = in_flight is None
+                if is_leader:
+                    in_flight = {'complete': Event()}
+                    self._in_flight[coalesce_id] = in_flight
+
+            if not is_leader:
+                in_flight['complete'].wait()
+                if 'response' in in_flight:
+                    self.log.debug(('Using coalesced response',
+                                    'URL: {method} {url!u}'),
+                                   method=method,
+                                   url=url,
+                                   stacklevel=stacklevel)
+                    return deepcopy(in_flight['response'])
 
+        is_shared = is_leader
         try:
-            if prepared_request:
-                response = self._session.send(
-                    request=prepared_request,
-                    stream=stream,
-                    verify=verify,
-                    proxies=proxies,
-                    cert=cert,
-                    timeout=timeout,
-                    allow_redirects=allow_redirects,
-                )
-            else:
-                raise URLRequired()
-
-            status_code = getattr(response, 'status_code', None)
-            if not status_code:
-                raise self._default_exc[0](response=response)
-
-            if cached_response is None or status_code != 304:
-                timestamp = response.headers.get('Date')
-                if response_hook:
-                    event_hook_kwargs['exception'] = self._default_exc[-1]
-                    event_hook_kwargs['raise_exc'] = raise_exc
-                    event_hook_kwargs['response'] = response
-                    etag, response = response_hook(**event_hook_kwargs)
+            if event_hook_kwargs is None:
+                event_hook_kwargs = {}
+
+            try:
+                if prepared_request:
+                    response = self._session.send(
+                        request=prepared_request,
+                        stream=stream,
+                        verify=verify,
+                        proxies=proxies,
+                        cert=cert,
+                        timeout=timeout,
+                        allow_redirects=allow_redirects,
+                    )
                 else:
-                    etag = None
-                    response.raise_for_status()
-                # Only clear cached response if there was no error response
-                cached_response = None
-
-        except self._default_exc as exc:
-            exc_response = exc.response or response
-            if exc_response is not None:
-                response_text = (
-                        getattr(exc_response, 'text', None)
-                        or repr(exc_response)
-                )
-                response_status = getattr(exc_response, 'status_code', 'Error')
-                response_reason = getattr(exc_response, 'reason', 'No response')
-            else:
-                response_text = None
-                response_status = 'Error'
-                response_reason = 'No response'
-
-            log_msg = [
-                '{title}',
-                'URL:      {method} {url!u}',
-                'Status:   {response_status} - {response_reason}',
-                'Response: {response_text}',
-            ]
-
-            kwargs.update(event_hook_kwargs)
-            kwargs['exc'] = exc
-            kwargs['response'] = exc_response
-
-            if error_hook:
-                error_response = error_hook(**kwargs)
-                _title, _info, _detail, _response, _exc = error_response
-                if _title is not None:
-                    error_title = _title
-                if _info:
-                    if isinstance(_info, (list, tuple)):
-                        log_msg.extend(_info)
+                    raise URLRequired()
+
+                status_code = getattr(response, 'status_code', None)
+                if not status_code:
+                    raise self._default_exc[0](response=response)
+
+                if cache:
+                    new_lifetime = self._get_lifetime(response.headers,
+                                                      cache_ttl)
+
+                if cached_response is None or status_code != 304:
+                    timestamp = response.headers.get('Date')
+                    if response_hook:
+                        event_hook_kwargs['exception'] = self._default_exc[-1]
+                        event_hook_kwargs['raise_exc'] = raise_exc
+                        event_hook_kwargs['response'] = response
+                        etag, response = response_hook(**event_hook_kwargs)
                     else:
-                        log_msg.append(_info)
-                if _detail is not None:
-                    kwargs.update(_detail)
-                if _response is not None:
-                    response = _response
+                        etag = None
+                        response.raise_for_status()
+                    # Only clear cached response if there was no error response
+                    cached_response = None
+
+            except self._default_exc as exc:
+                # Callers waiting on this request will retry it themselves
+                is_shared = False
+                exc_response = exc.response or response
+                if exc_response is not None:
                     response_text = (
-                            getattr(response, 'text', None)
-                            or repr(response)
-                            or response_text
+                            getattr(exc_response, 'text', None)
+                            or repr(exc_response)
                     )
-                if _exc is not None:
-                    raise_exc = _exc
-
-            if error_info:
-                if isinstance(error_info, (list, tuple)):
-                    log_msg.extend(error_info)
+                    response_status = getattr(exc_response,
+                                              'status_code',
+                                              'Error')
+                    response_reason = getattr(exc_response,
+                                              'reason',
+                                              'No response')
+                else:
+                    response_text = None
+                    response_status = 'Error'
+                    response_reason = 'No response'
+
+                log_msg = [
+                    '{title}',
+                    'URL:      {method} {url!u}',
+                    'Status:   {response_status} - {response_reason}',
+                    'Response: {response_text}',
+                ]
+
+                kwargs.update(event_hook_kwargs)
+                kwargs['exc'] = exc
+                kwargs['response'] = exc_response
+
+                if error_hook:
+                    error_response = error_hook(**kwargs)
+                    _title, _info, _detail, _response, _exc = error_response
+                    if _title is not None:
+                        error_title = _title
+                    if _info:
+                        if isinstance(_info, (list, tuple)):
+                            log_msg.extend(_info)
+                        else:
+                            log_msg.append(_info)
+                    if _detail is not None:
+                        kwargs.update(_detail)
+                    if _response is not None:
+                        response = _response
+                        response_text = (
+                                getattr(response, 'text', None)
+                                or repr(response)
+                                or response_text
+                        )
+                    if _exc is not None:
+                        raise_exc = _exc
+
+                if error_info:
+                    if isinstance(error_info, (list, tuple)):
+                        log_msg.extend(error_info)
+                    else:
+                        log_msg.append(error_info)
+
+                self.log.exception(log_msg,
+                                   title=(error_title or 'Failed'),
+                                   method=method,
+                                   url=url,
+                                   response_status=response_status,
+                                   response_reason=response_reason,
+                                   response_text=response_text,
+                                   stacklevel=stacklevel,
+                                   extra={'__redact_exc__': True},
+                                   **kwargs)
+
+                if raise_exc:
+                    if not isinstance(raise_exc, BaseException):
+                        if not callable(raise_exc):
+                            raise_exc = self._default_exc[-1]
+                        raise_exc = raise_exc(error_title)
+
+                    if isinstance(raise_exc, BaseException):
+                        raise_exc.__cause__ = exc
+                        raise raise_exc
+                    raise exc
+
+            if not cache:
+                pass
+            elif cached_response is not None:
+                self.log.debug(('Using cached response',
+                                'Request ID: {request_id}',
+                                'Etag:       {etag}',
+                                'Modified:   {timestamp}'),
+                               request_id=request_id,
+                               etag=etag,
+                               timestamp=timestamp,
+                               stacklevel=stacklevel)
+                if new_lifetime is None or new_lifetime == lifetime:
+                    cache.set(request_id)
                 else:
-                    log_msg.append(error_info)
-
-            self.log.exception(log_msg,
-                               title=(error_title or 'Failed'),
-                               method=method,
-                               url=url,
-                               response_status=response_status,
-                               response_reason=response_reason,
-                               response_text=response_text,
-                               stacklevel=stacklevel,
-                               extra={'__redact_exc__': True},
-                               **kwargs)
-
-            if raise_exc:
-                if not isinstance(raise_exc, BaseException):
-                    if not callable(raise_exc):
-                        raise_exc = self._default_exc[-1]
-                    raise_exc = raise_exc(error_title)
-
-                if isinstance(raise_exc, BaseException):
-                    raise_exc.__cause__ = exc
-                    raise raise_exc
-                raise exc
-
-        if not cache:
-            pass
-        elif cached_response is not None:
-            self.log.debug(('Using cached response',
-                            'Request ID: {request_id}',
-                            'Etag:       {etag}',
-                            'Modified:   {timestamp}'),
-                           request_id=request_id,
-                           etag=etag,
-                           timestamp=timestamp,
-                           stacklevel=stacklevel)
-            cache.set(request_id)
-            response = cached_response
-        elif response is not None:
-            self.log.debug(('Saving response to cache',
-                            'Request ID: {request_id}',
-                            'Etag:       {etag}',
-                            'Modified:   {timestamp}'),
-                           request_id=request_id,
-                           etag=etag,
-                           timestamp=timestamp,
-                           stacklevel=stacklevel)
-            cache.set(request_id, response, etag)
+                    cache.set(request_id, cached_response, etag, new_lifetime)
+                response = cached_response
+            elif response is not None:
+                self.log.debug(('Saving response to cache',
+                                'Request ID: {request_id}',
+                                'Etag:       {etag}',
+                                'Modified:   {timestamp}'),
+                               request_id=request_id,
+                               etag=etag,
+                               timestamp=timestamp,
+                               stacklevel=stacklevel)
+                cache.set(request_id, response, etag, new_lifetime)
+
+            if is_shared and response is not None:
+                in_flight['response'] = response
+        finally:
+            if is_leader:
+                with in_flight_lock:
+                    del self._in_flight[coalesce_id]
+                in_flight['complete'].set()
 
         return response
@@ -0,0 +1,407 @@
+# -*- coding: utf-8 -*-
+"""
+
+    Copyright (C) 2025 plugin.video.youtube
+
+    SPDX-License-Identifier: GPL-2.0-only
+    See LICENSES/GPL-2.0-only for more information.
+"""
+
+from __future__ import absolute_import, division, unicode_literals
+
+import os
+from bisect import bisect_right, insort
+from collections import OrderedDict, deque
+from io import open
+from threading import Event, Lock, Thread
+from time import time
+
+from .. import logging
+from ..compatibility import replace_file
+from ..constants import TEMP_PATH
+from ..utils.file_system import make_dirs
+from ..utils.methods import generate_hash
+
+
+class ReadAheadCache(object):
+    """
+    Stream segments read ahead of the player by the stream proxy, held in
+    memory until requested, keyed by stream and byte offset
+    """
+    log = logging.getLogger(__name__)
+
+    MAX_SIZE = 32 * 1024 * 1024
+    MAX_SEGMENT_SIZE = 8 * 1024 * 1024
+    # Number of segments to read ahead of the last requested segment
+    MAX_SEGMENTS = 2
+    # Streams that have not been requested for this long, in seconds, have
+    # their segments evicted
+    MAX_IDLE = 30
+    # Time, in seconds, to wait for a segment that is still being read,
+    # before the caller falls back to requesting the segment itself
+    WAIT_TIMEOUT = 1
+
+    _segments = OrderedDict()
+    _streams = {}
+    _size = 0
+    _lock = Lock()
+
+    @classmethod
+    def _evict(cls, key):
+        segment = cls._segments.pop(key)
+        data = segment['data']
+        if data is not None:
+            cls._size -= len(data)
+
+    @classmethod
+    def _prune(cls, now):
+        segments = cls._segments
+        streams = cls._streams
+
+        idle_streams = {
+            stream_id
+            for stream_id, accessed in streams.items()
+            if now - accessed > cls.MAX_IDLE
+        }
+        if idle_streams:
+            for stream_id in idle_streams:
+                del streams[stream_id]
+            for key in [key for key in segments if key[0] in idle_streams]:
+                cls._evict(key)
+
+        if cls._size > cls.MAX_SIZE:
+            for key in [key for key, segment in segments.items()
+                        if segment['data'] is not None]:
+                cls._evict(key)
+                if cls._size <= cls.MAX_SIZE:
+                    break
+
+    @classmethod
+    def get(cls, stream_id, start, end):
+        """
+        Returns a segment dict with the requested range of data, if it was
+        read ahead, waiting up to WAIT_TIMEOUT seconds for it if it is still
+        being read, otherwise None
+        """
+        key = (stream_id, start)
+        with cls._lock:
+            now = time()
+            cls._prune(now)
+            segment = cls._segments.get(key)
+            if segment is None:
+                return None
+            cls._streams[stream_id] = now
+
+        if not segment['complete'].wait(cls.WAIT_TIMEOUT):
+            return None
+
+        size = end - start + 1
+        with cls._lock:
+            data = segment['data']
+            if data is None or len(data) < size:
+                return None
+            # Remaining data is kept for the next request, which is expected
+            # to start where this one ended
+            if cls._segments.get(key) is segment:
+                cls._evict(key)
+                if len(data) > size:
+                    remainder = segment.copy()
+                    remainder['data'] = data[size:]
+                    remainder['start'] = end + 1
+                    cls._segments[(stream_id, end + 1)] = remainder
+                    cls._size += len(remainder['data'])
+
+        result = segment.copy()
+        result['data'] = data[:size]
+        result['end'] = end
+        return result
+
+    @classmethod
+    def read_ahead(cls, stream_id, start, size, max_end, fetch):
+        """
+        Reads a segment of the given size, following the last segment already
+        read ahead from start, using fetch(start, end) in the background
+        """
+        if size > cls.MAX_SEGMENT_SIZE:
+            size = cls.MAX_SEGMENT_SIZE
+        segments = cls._segments
+        with cls._lock:
+            now = time()
+            cls._streams[stream_id] = now
+            for _ in range(cls.MAX_SEGMENTS):
+                segment = segments.get((stream_id, start))
+                if segment is None:
+                    break
+                start = segment['end'] + 1
+            else:
+                return
+            if max_end is not None and start > max_end:
+                return
+            end = start + size - 1
+            if max_end is not None and end > max_end:
+                end = max_end
+
+            segment = {
+                'complete': Event(),
+                'data': None,
+                'start': start,
+                'end': end,
+            }
+            segments[(stream_id, start)] = segment
+
+        thread = Thread(target=cls._read, args=(stream_id, segment, fetch))
+        thread.daemon = True
+        thread.start()
+
+    @classmethod
+    def _read(cls, stream_id, segment, fetch):
+        key = (stream_id, segment['start'])
+        data = None
+        try:
+            response = fetch(segment['start'], segment['end'])
+            if response is not None:
+                with response:
+                    if response.status_code == 206:
+                        # Stored as bytes, as slices of the data are kept
+                        # for later requests, and a memoryview slice would
+                        # keep the whole response buffer alive
+                        data = response.content
+                        headers = response.headers
+                        segment['content_type'] = headers.get('Content-Type')
+                        segment['total'] = (
+                            headers.get('Content-Range', '').partition('/')[2]
+                            or '*'
+                        )
+        except Exception:
+            cls.log.exception(('Read ahead failed',
+                               'Stream: {stream_id}',
+                               'Range:  {start}-{end}'),
+                              stream_id=stream_id,
+                              start=segment['start'],
+                              end=segment['end'])
+        finally:
+            with cls._lock:
+                if cls._segments.get(key) is segment:
+                    if data:
+                        segment['data'] = data
+                        segment['end'] = segment['start'] + len(data) - 1
+                        cls._size += len(data)
+                        cls._prune(time())
+                    else:
+                        del cls._segments[key]
+            segment['complete'].set()
+
+
+class DiskSegmentCache(object):
+    """
+    Stream segments relayed by the stream proxy, stored on disk in the add-on
+    temp folder so that seeking back or replaying does not download them
+    again. Segments are evicted, least recently used first, once the cache
+    exceeds its maximum size.
+    """
+    log = logging.getLogger(__name__)
+
+    BASE_PATH = '/'.join((TEMP_PATH, 'segments'))
+    EXTENSION = '.seg'
+    MAX_SEGMENT_SIZE = 16 * 1024 * 1024
+    # Maximum size of the segments waiting to be written. Segments are not
+    # stored if the writer is this far behind.
+    MAX_PENDING_SIZE = 2 * MAX_SEGMENT_SIZE
+
+    # Files are only written by this process, and the temp folder is wiped
+    # whenever the service starts, so the index is only kept in memory
+    _files = OrderedDict()
+    _streams = {}
+    _size = 0
+    _lock = Lock()
+    # Segments are written in order by a single writer thread
+    _pending = deque()
+    _pending_ranges = {}
+    _pending_size = 0
+    _writer = None
+    # Evicted files that could not be removed, e.g. while still being read
+    # on Windows, and their sizes. Removal is retried before each write.
+    _orphans = {}
+
+    @classmethod
+    def get(cls, stream_id, start, end):
+        """
+        Returns a segment dict and a file object, positioned at start, of a
+        stored segment that covers the requested range, otherwise None
+        """
+        with cls._lock:
+            stream = cls._streams.get(stream_id)
+            if not stream:
+                return None
+            starts = stream['starts']
+            segments = stream['segments']
+            # Segments may overlap, so any segment starting before the
+            # requested range may cover it
+            for idx in range(bisect_right(starts, start) - 1, -1, -1):
+                segment = segments[starts[idx]]
+                if segment['end'] >= end:
+                    break
+            else:
+                return None
+
+            filename = segment['filename']
+            try:
+                file = open(segment['filepath'], 'rb')
+                file.seek(start - segment['start'])
+            except (IOError, OSError):
+                cls._evict(filename)
+                return None
+            cls._files[filename] = cls._files.pop(filename)
+        return segment, file
+
+    @classmethod
+    def put(cls, stream_id, start, data, content_type, total, max_size):
+        size = len(data)
+        if not size or size > min(max_size, cls.MAX_SEGMENT_SIZE):
+            return
+        end = start + size - 1
+        with cls._lock:
+            stream = cls._streams.get(stream_id)
+            if stream:
+                segment = stream['segments'].get(start)
+                if segment and segment['end'] >= end:
+                    return
+            if cls._pending_ranges.get((stream_id, start), -1) >= end:
+                return
+            if cls._pending_size + size > min(max_size,
+                                              cls.MAX_PENDING_SIZE):
+                cls.log.debug(('Segment not stored, writes pending',
+                               'Pending: {pending} bytes'),
+                              pending=cls._pending_size)
+                return
+            cls._pending_ranges[(stream_id, start)] = end
+            cls._pending_size += size
+            cls._pending.append((
+                stream_id,
+                {
+                    'start': start,
+                    'end': end,
+                    'size': size,
+                    'content_type': content_type,
+                    'total': total,
+                },
+                data,
+                max_size,
+            ))
+            if cls._writer is None:
+                thread = Thread(target=cls._write_pending)
+                thread.daemon = True
+                cls._writer = thread
+                thread.start()
+
+    @classmethod
+    def _write_pending(cls):
+        while 1:
+            with cls._lock:
+                if not cls._pending:
+                    cls._writer = None
+                    return
+                args = cls._pending[0]
+                if cls._orphans:
+                    cls._remove_orphans()
+            try:
+                cls._write(*args)
+            except Exception:
+                cls.log.exception('Segment write failed')
+            finally:
+                stream_id, segment, data, _ = args
+                key = (stream_id, segment['start'])
+                with cls._lock:
+                    cls._pending.popleft()
+                    cls._pending_size -= segment['size']
+                    if cls._pending_ranges.get(key) == segment['end']:
+                        del cls._pending_ranges[key]
+
+    @classmethod
+    def _write(cls, stream_id, segment, data, max_size):
+        filename = ''.join((
+            generate_hash(stream_id),
+            '_{start}-{end}'.format(**segment),
+            cls.EXTENSION,
+        ))
+        # Already stored segments are not written again, as the file may be
+        # open for reading
+        with cls._lock:
+            if filename in cls._files:
+                cls._files[filename] = cls._files.pop(filename)
+                return
+
+        base_path = make_dirs(cls.BASE_PATH)
+        if not base_path:
+            return
+        filepath = os.path.join(base_path, filename)
+        temp_filepath = filepath + '.tmp'
+        try:
+            with open(temp_filepath, 'wb') as segment_file:
+                segment_file.write(data)
+            replace_file(temp_filepath, filepath)
+        except (IOError, OSError):
+            cls.log.exception(('Failed to write segment',
+                               'Path: {path!r}'),
+                              path=filepath)
+            with cls._lock:
+                cls._remove(temp_filepath, segment['size'])
+            return
+        segment['filename'] = filename
+        segment['filepath'] = filepath
+
+        with cls._lock:
+            stream = cls._streams.setdefault(stream_id, {
+                'starts': [],
+                'segments': {},
+            })
+            start = segment['start']
+            existing = stream['segments'].get(start)
+            if existing:
+                if existing['end'] >= segment['end']:
+                    cls._remove(filepath, segment['size'])
+                    return
+                cls._evict(existing['filename'])
+                stream = cls._streams.setdefault(stream_id, stream)
+            insort(stream['starts'], start)
+            stream['segments'][start] = segment
+            cls._files[filename] = (stream_id, start)
+            cls._size += segment['size']
+
+            while cls._size > max_size and cls._files:
+                cls._evict(next(iter(cls._files)))
+
+    @classmethod
+    def _evict(cls, filename):
+        stream_id, start = cls._files.pop(filename)
+        stream = cls._streams[stream_id]
+        segment = stream['segments'].pop(start)
+        stream['starts'].remove(start)
+        if not stream['starts']:
+            del cls._streams[stream_id]
+        cls._size -= segment['size']
+        cls._remove(segment['filepath'], segment['size'])
+
+    @classmethod
+    def _remove(cls, filepath, size):
+        """
+        Removes the file, or keeps it as an orphan, counted in the size of
+        the cache, to be removed later if it cannot be removed now
+        """
+        try:
+            os.remove(filepath)
+        except OSError:
+            if os.path.exists(filepath) and filepath not in cls._orphans:
+                cls._orphans[filepath] = size
+                cls._size += size
+
+    @classmethod
+    def _remove_orphans(cls):
+        for filepath, size in tuple(cls._orphans.items()):
+            try:
+                os.remove(filepath)
+            except OSError:
+                if os.path.exists(filepath):
+                    continue
+            del cls._orphans[filepath]
+            cls._size -= size
@@ -23,6 +23,7 @@ from .constants import (
 )
 from .context import XbmcContext
 from .debug import Profiler
+from .network import BaseRequestsClass
 from .plugin import XbmcPlugin
 from ..youtube import Provider
 
@@ -150,5 +151,6 @@ def run(context=_context,
     finally:
         if log_level:
             profiler.print_stats()
+            BaseRequestsClass.log_cache_stats()
         gc.collect()
         gc.set_threshold(*gc_threshold)
@@ -35,6 +35,7 @@ from .constants import (
 )
 from .context import XbmcContext
 from .monitors import PlayerMonitor, ServiceMonitor
+from .network import BaseRequestsClass
 from .utils.file_system import rm_dir
 from ..youtube.provider import Provider
 
@@ -46,7 +47,7 @@ def run():
     context = XbmcContext()
     provider = Provider()
 
-    monitor = ServiceMonitor(context=context)
+    monitor = ServiceMonitor(context=context, provider=provider)
     player = PlayerMonitor(provider=provider,
                            context=context,
                            monitor=monitor)
@@ -74,7 +75,8 @@ def run():
         monitor.refresh_container()
     set_property(SERVICE_RUNNING_FLAG)
 
-    # wipe add-on temp folder on updates/restarts (subtitles, and mpd files)
+    # wipe add-on temp folder on updates/restarts (subtitles, mpd files, and
+    # stream segments)
     rm_dir(TEMP_PATH)
 
     loop_period = 10
@@ -137,6 +139,9 @@ def run():
             if plugin_is_idle:
                 plugin_is_idle = clear_property(PLUGIN_SLEEPING)
 
+        if not is_asleep and not is_idle:
+            monitor.prefetch_feeds()
+
         if not monitor.httpd:
             httpd_idle_time_ms = 0
         elif is_asleep:
@@ -263,5 +268,7 @@ def run():
     if monitor.httpd:
         monitor.shutdown_httpd(terminate=True)
 
+    BaseRequestsClass.log_cache_stats()
+
     provider.tear_down()
     context.tear_down()
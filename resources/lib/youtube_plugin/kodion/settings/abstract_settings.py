@@ -499,6 +499,21 @@ class AbstractSettings(object):
             return self.set_bool(SETTINGS.HTTPD_STREAM_REDIRECT, value)
         return self.get_bool(SETTINGS.HTTPD_STREAM_REDIRECT, False)
 
+    def httpd_read_ahead(self, value=None):
+        if value is not None:
+            return self.set_bool(SETTINGS.HTTPD_READ_AHEAD, value)
+        return self.get_bool(SETTINGS.HTTPD_READ_AHEAD, False)
+
+    def httpd_segment_cache_size(self, value=None):
+        if value is not None:
+            return self.set_int(SETTINGS.HTTPD_SEGMENT_CACHE_SIZE, value)
+        return self.get_int(SETTINGS.HTTPD_SEGMENT_CACHE_SIZE, 0)
+
+    def httpd_split_connections(self, value=None):
+        if value is not None:
+            return self.set_int(SETTINGS.HTTPD_SPLIT_CONNECTIONS, value)
+        return self.get_int(SETTINGS.HTTPD_SPLIT_CONNECTIONS, 1)
+
     def api_config_page(self):
         return self.get_bool(SETTINGS.API_CONFIG_PAGE, False)
 
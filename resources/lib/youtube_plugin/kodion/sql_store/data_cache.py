@@ -67,6 +67,9 @@ class DataCache(Storage):
     def del_item(self, content_id):
         self._remove(content_id)
 
+    def del_items_like(self, content_id):
+        self._remove_like(content_id)
+
     def update_item(self, content_id, item, timestamp=None):
         self._update(content_id, item, timestamp)
 
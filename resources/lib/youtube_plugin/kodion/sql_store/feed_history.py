@@ -36,6 +36,22 @@ class FeedHistory(Storage):
     def set_items(self, items):
         self._set_many(items, defer=True)
 
+    def refresh_items(self, content_ids):
+        self._refresh_many(content_ids)
+
+    def get_timeline(self, timeline_id, seconds=None):
+        result = self._get(timeline_id,
+                           seconds=seconds,
+                           as_dict=True,
+                           with_timestamp=True)
+        return result
+
+    def set_timeline(self, timeline_id, timeline, timestamp=None):
+        if timestamp:
+            self._update(timeline_id, timeline, timestamp=timestamp)
+        else:
+            self._set(timeline_id, timeline)
+
     def _optimize_item_count(self, limit=-1, defer=False):
         return False
 
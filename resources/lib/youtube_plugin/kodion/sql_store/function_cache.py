@@ -12,6 +12,7 @@ from __future__ import absolute_import, division, unicode_literals
 
 from functools import partial
 from itertools import chain
+from threading import Event, Lock, Thread
 
 from .storage import Storage
 from ..utils.methods import generate_hash
@@ -27,6 +28,9 @@ class FunctionCache(Storage):
     SCOPE_BUILTINS = 1
     SCOPE_ALL = 2
 
+    _in_flight = {}
+    _in_flight_lock = Lock()
+
     def __init__(self, filepath, max_file_size_mb=5):
         max_file_size_kb = max_file_size_mb * 1024
         super(FunctionCache, self).__init__(filepath,
@@ -110,6 +114,9 @@ class FunctionCache(Storage):
                            result, default None
         :keyword _retry_value: (Any) re-evaluate func if cached value is equal
                                _retry_value, default None
+        :keyword _max_stale: (int) return cached result older than seconds, but
+                             not older than _max_stale, and update cache with
+                             new result in the background, default None
         :return:
         """
         scope = kwargs.pop('_scope', self.SCOPE_ALL)
@@ -118,6 +125,7 @@ class FunctionCache(Storage):
         refresh = kwargs.pop('_refresh', False)
         process = kwargs.pop('_process', None)
         retry_value = kwargs.pop('_retry_value', None)
+        max_stale = kwargs.pop('_max_stale', None)
         partial_func = partial(func, *args, **kwargs)
 
         # if caching is disabled call the function
@@ -126,28 +134,109 @@ class FunctionCache(Storage):
 
         cache_id = self._create_id_from_func(partial_func, scope)
         old_data = self._get(cache_id, as_dict=True)
+        stale = False
         if old_data:
             age = old_data['age']
             old_data = old_data['value']
-            if age > seconds >= 0 or old_data == retry_value:
+            if old_data == retry_value:
                 refresh = True
+            elif age > seconds >= 0:
+                if not refresh and max_stale and age <= max_stale:
+                    stale = True
+                else:
+                    refresh = True
         else:
             old_data = None
             refresh = True
 
-        if refresh:
+        if stale:
+            # Stale-while-revalidate: return the cached result immediately,
+            # without updating it, and refresh it in a daemon thread, unless
+            # the same call is already in progress. If the interpreter exits
+            # before the refresh completes, the cached result remains stale.
+            with self._in_flight_lock:
+                if cache_id in self._in_flight:
+                    in_flight = None
+                else:
+                    in_flight = {'complete': Event()}
+                    self._in_flight[cache_id] = in_flight
+            if in_flight:
+                thread = Thread(target=self._run,
+                                args=(cache_id,
+                                      partial_func,
+                                      process,
+                                      old_data,
+                                      ignore_value,
+                                      oneshot,
+                                      in_flight))
+                thread.daemon = True
+                thread.start()
+            if callable(process):
+                return process(None, old_data)
+            return old_data
+
+        if not refresh:
+            if callable(process):
+                data = process(None, old_data)
+            else:
+                data = old_data
+            if data != ignore_value:
+                self._set(cache_id, data)
+            elif oneshot:
+                self._remove(cache_id)
+            return data
+
+        return self._run(cache_id,
+                         partial_func,
+                         process,
+                         old_data,
+                         ignore_value,
+                         oneshot)
+
+    def _run(self,
+             cache_id,
+             partial_func,
+             process,
+             old_data,
+             ignore_value,
+             oneshot,
+             in_flight=None):
+        # Only allow one concurrent call of the same function with the same
+        # arguments. Other callers wait for, and then use, the same result.
+        # A caller that has already registered the call passes in_flight.
+        in_flight_lock = self._in_flight_lock
+        if in_flight:
+            is_leader = True
+        else:
+            with in_flight_lock:
+                in_flight = self._in_flight.get(cache_id)
+                is_leader = in_flight is None
+                if is_leader:
+                    in_flight = {'complete': Event()}
+                    self._in_flight[cache_id] = in_flight
+
+        if not is_leader:
+            in_flight['complete'].wait()
+            if 'data' in in_flight:
+                return in_flight['data']
+
+        try:
             data = partial_func()
             if callable(process):
                 data = process(data, old_data)
-        elif callable(process):
-            data = process(None, old_data)
-        else:
-            data = old_data
 
-        if data != ignore_value:
-            self._set(cache_id, data)
-        elif oneshot:
-            self._remove(cache_id)
+            if data != ignore_value:
+                self._set(cache_id, data)
+            elif oneshot:
+                self._remove(cache_id)
+
+            if is_leader:
+                in_flight['data'] = data
+        finally:
+            if is_leader:
+                with in_flight_lock:
+                    del self._in_flight[cache_id]
+                in_flight['complete'].set()
 
         return data
 
@@ -32,9 +32,14 @@ class RequestCache(Storage):
                            with_timestamp=with_timestamp)
         return result
 
-    def set(self, request_id, response=None, etag=None, timestamp=None):
+    def set(self,
+            request_id,
+            response=None,
+            etag=None,
+            lifetime=None,
+            timestamp=None):
         if response:
-            item = (etag, response)
+            item = (etag, response, lifetime)
             if timestamp:
                 self._update(request_id, item, timestamp, defer=True)
             else:
@@ -100,11 +100,53 @@ class Storage(object):
             '  size INTEGER'
             ' );'
         ),
+        'create_index': (
+            'CREATE INDEX'
+            ' IF NOT EXISTS {table}_timestamp'
+            ' ON {table} (timestamp, size);'
+        ),
+        'create_size_table': (
+            'CREATE TABLE'
+            ' IF NOT EXISTS {table}_size ('
+            '  id INTEGER PRIMARY KEY CHECK (id = 0),'
+            '  total INTEGER NOT NULL'
+            ' );'
+        ),
+        'create_size_delete_trigger': (
+            'CREATE TRIGGER'
+            ' IF NOT EXISTS {table}_size_delete'
+            ' AFTER DELETE ON {table}'
+            ' BEGIN'
+            '  UPDATE {table}_size'
+            '  SET total = total - IFNULL(OLD.size, 0)'
+            '  WHERE id = 0;'
+            ' END;'
+        ),
+        'create_size_insert_trigger': (
+            'CREATE TRIGGER'
+            ' IF NOT EXISTS {table}_size_insert'
+            ' AFTER INSERT ON {table}'
+            ' BEGIN'
+            '  UPDATE {table}_size'
+            '  SET total = total + IFNULL(NEW.size, 0)'
+            '  WHERE id = 0;'
+            ' END;'
+        ),
+        'create_size_update_trigger': (
+            'CREATE TRIGGER'
+            ' IF NOT EXISTS {table}_size_update'
+            ' AFTER UPDATE OF size ON {table}'
+            ' BEGIN'
+            '  UPDATE {table}_size'
+            '  SET total = total - IFNULL(OLD.size, 0) + IFNULL(NEW.size, 0)'
+            '  WHERE id = 0;'
+            ' END;'
+        ),
         'drop_old_table': (
             'DELETE'
             ' FROM sqlite_master'
             ' WHERE type = "table"'
-            ' and name IS NOT "{table}";'
+            ' and name NOT IN ("{table}", "{table}_size");'
         ),
         'get': (
             'SELECT *'
@@ -116,6 +158,11 @@ class Storage(object):
             ' FROM {table}'
             ' WHERE key in ({{0}});'
         ),
+        'remove_by_key_like': (
+            'DELETE'
+            ' FROM {table}'
+            ' WHERE key like ?;'
+        ),
         'get_by_key_like': (
             'SELECT *'
             ' FROM {table}'
@@ -148,9 +195,15 @@ class Storage(object):
             ' ORDER BY {order_col} DESC'
             ' LIMIT {{0}};'
         ),
+        'get_sizes_by_age': (
+            'SELECT timestamp, size'
+            ' FROM {table}'
+            ' ORDER BY timestamp;'
+        ),
         'get_total_data_size': (
-            'SELECT SUM(size)'
-            'FROM {table}'
+            'SELECT total'
+            ' FROM {table}_size'
+            ' WHERE id = 0;'
         ),
         'get_database_size': (
             'SELECT page_size * page_count'
@@ -164,7 +217,15 @@ class Storage(object):
             ' SELECT 1'
             ' FROM sqlite_master'
             ' WHERE type = "table"'
-            ' and name IS NOT "{table}"'
+            ' and name NOT IN ("{table}", "{table}_size")'
+            ');'
+        ),
+        'has_size_table': (
+            'SELECT EXISTS ('
+            ' SELECT 1'
+            ' FROM sqlite_master'
+            ' WHERE type = "trigger"'
+            ' and name = "{table}_size_update"'
             ');'
         ),
         'is_empty': (
@@ -187,21 +248,20 @@ class Storage(object):
         'prune_by_size': (
             'DELETE'
             ' FROM {table}'
-            ' WHERE rowid IN ('
-            '  SELECT rowid'
-            '  FROM {table}'
-            '  WHERE ('
-            '   SELECT SUM(size)'
-            '   FROM {table} AS _'
-            '   WHERE timestamp<={table}.timestamp'
-            '  ) <= {{0}}'
-            ' );'
+            ' WHERE timestamp <= ?;'
         ),
         'prune_invalid': (
             'DELETE'
             ' FROM {table}'
             ' WHERE key IS NULL;'
         ),
+        'reset_size_table': (
+            'REPLACE'
+            ' INTO {table}_size'
+            ' (id, total)'
+            ' SELECT 0, IFNULL(SUM(size), 0)'
+            ' FROM {table};'
+        ),
         'refresh': (
             'UPDATE'
             ' {table}'
@@ -332,6 +392,7 @@ class Storage(object):
             table_queries.extend((
                 self._sql['create_table'],
             ))
+            table_queries.extend(self._size_accounting_queries())
             self._base._table_updated = True
 
         abort = False
@@ -382,6 +443,8 @@ class Storage(object):
             'PRAGMA mmap_size = -1;',
             'PRAGMA page_size = 4096;',
             'PRAGMA cache_size = -2000;',
+            # Required for size accounting triggers to fire on REPLACE
+            'PRAGMA recursive_triggers = TRUE;',
             # 'PRAGMA journal_mode = TRUNCATE;',
             # 'PRAGMA journal_mode = PERSIST;',
             # 'PRAGMA journal_mode = MEMORY;',
@@ -397,6 +460,10 @@ class Storage(object):
                         'PRAGMA writable_schema = 0;',
                     ))
                 break
+            for result in self._execute(cursor, self._sql['has_size_table']):
+                if result[0] == 0:
+                    table_queries.extend(self._size_accounting_queries())
+                break
 
         if table_queries:
             transaction_begin = len(queries) + 1
@@ -408,6 +475,17 @@ class Storage(object):
         self._db = db
         return db
 
+    def _size_accounting_queries(self):
+        sql = self._sql
+        return (
+            sql['create_index'],
+            sql['create_size_table'],
+            sql['reset_size_table'],
+            sql['create_size_delete_trigger'],
+            sql['create_size_insert_trigger'],
+            sql['create_size_update_trigger'],
+        )
+
     def _close(self, commit=False, event=None):
         close_timer = self._close_timer
         if close_timer:
@@ -424,29 +502,26 @@ class Storage(object):
                 return None
 
         if event or self._close_actions:
-            if not event:
-                queries = (
+            cursor = db.cursor()
+            if self._close_actions:
+                # Deferred items are written, and items pruned by count,
+                # before the cut-off for pruning by size is determined, so
+                # that it is based on the updated total data size
+                self._execute(cursor, (
                     'BEGIN IMMEDIATE;',
                     self._set_many(items=None, defer=True, flush=True),
                     'COMMIT;',
                     'BEGIN IMMEDIATE;',
+                    self._sql['prune_invalid'] if event else None,
                     self._optimize_item_count(defer=True),
-                    self._optimize_file_size(defer=True, db=db),
                     'COMMIT;',
-                    'VACUUM;',
-                )
-            elif self._close_actions:
+                ))
                 queries = (
                     'BEGIN IMMEDIATE;',
-                    self._set_many(items=None, defer=True, flush=True),
-                    'COMMIT;',
-                    'BEGIN IMMEDIATE;',
-                    self._sql['prune_invalid'],
-                    self._optimize_item_count(defer=True),
                     self._optimize_file_size(defer=True, db=db),
                     'COMMIT;',
                     'VACUUM;',
-                    'PRAGMA optimize;',
+                    'PRAGMA optimize;' if event else None,
                 )
             else:
                 queries = (
@@ -456,7 +531,7 @@ class Storage(object):
                     'VACUUM;',
                     'PRAGMA optimize;',
                 )
-            self._execute(db.cursor(), queries)
+            self._execute(cursor, queries)
 
         # Not needed if using db as a context manager
         if commit:
@@ -545,19 +620,40 @@ class Storage(object):
             result = self._execute(cursor, self._sql['get_total_data_size'])
             result = result.fetchone() if result else None
             result = result[0] if result else None
-        if result is not None:
-            size_kb = result // 1024
-        else:
-            try:
-                size_kb = (os.path.getsize(self._filepath) // 1024)
-            except OSError:
+            if result is not None:
+                size_kb = result // 1024
+            else:
+                try:
+                    size_kb = (os.path.getsize(self._filepath) // 1024)
+                except OSError:
+                    return False
+
+            if size_kb <= self._max_file_size_kb:
                 return False
 
-        if size_kb <= self._max_file_size_kb:
+            # Single ordered pass over the (timestamp, size) index to find the
+            # newest timestamp at which the cumulative size of all older rows
+            # is still within the amount of data to be pruned
+            prune_size = 1024 * int(size_kb - self._max_file_size_kb / 2)
+            pruned_size = 0
+            cut_off = None
+            timestamp = None
+            result = self._execute(cursor, self._sql['get_sizes_by_age'])
+            for row_timestamp, row_size in result:
+                if row_timestamp != timestamp:
+                    if pruned_size > prune_size:
+                        break
+                    cut_off = timestamp
+                    timestamp = row_timestamp
+                pruned_size += row_size or 0
+            else:
+                if pruned_size <= prune_size:
+                    cut_off = timestamp
+
+        if cut_off is None:
             return False
 
-        prune_size = 1024 * int(size_kb - self._max_file_size_kb / 2)
-        query = self._sql['prune_by_size'].format(prune_size)
+        query = (self._sql['prune_by_size'], (cut_off,), False)
         if defer:
             return query
         with self as (db, cursor):
@@ -738,6 +834,37 @@ class Storage(object):
             )
         return True
 
+    def _refresh_many(self, item_ids, timestamp=None):
+        if not timestamp:
+            timestamp = since_epoch()
+
+        memory_store = self._memory_store
+        values = []
+        for item_id in item_ids:
+            key = to_str(item_id)
+            if memory_store and key in memory_store:
+                item = memory_store[key]
+                memory_store[key] = (
+                    item_id,
+                    timestamp,
+                    item[2],
+                )
+            else:
+                values.append((timestamp, key))
+        if not values:
+            return None
+
+        with self as (db, cursor):
+            self._execute(
+                cursor,
+                (
+                    'BEGIN IMMEDIATE;',
+                    (self._sql['refresh'], values, True),
+                    'COMMIT;',
+                ),
+            )
+        return True
+
     def _update(self, item_id, item, timestamp=None, defer=False):
         key = to_str(item_id)
         if not timestamp:
@@ -997,3 +1124,20 @@ class Storage(object):
             )
             self._close_actions = True
         return True
+
+    def _remove_like(self, item_id):
+        with self as (db, cursor):
+            self._execute(
+                cursor,
+                (
+                    'BEGIN IMMEDIATE;',
+                    (
+                        self._sql['remove_by_key_like'],
+                        (to_str(item_id),),
+                        False,
+                    ),
+                    'COMMIT;',
+                ),
+            )
+            self._close_actions = True
+        return True
@@ -13,6 +13,7 @@ from __future__ import absolute_import, division, unicode_literals
 import json
 import threading
 from functools import partial
+from heapq import heapify, heappop, heapreplace
 from itertools import chain, islice
 from random import randint
 from re import compile as re_compile
@@ -38,12 +39,24 @@ from ...kodion.utils.datetime import (
     strptime,
     yt_datetime_offset,
 )
+from ...kodion.utils.methods import generate_hash
 
 
 class YouTubeDataClient(YouTubeLoginClient):
     log = logging.getLogger(__name__)
 
     _max_results = 50
+    MAX_TIMELINE_ITEMS = 1000
+    TIMELINE_TTL = 15 * 60
+    # Freshness lifetime of cached responses, for endpoints where the API
+    # only returns Cache-Control: max-age=0
+    CACHE_TTL = {
+        'commentThreads': 5 * 60,
+        'comments': 5 * 60,
+        'guideCategories': 24 * 60 * 60,
+        'search': 5 * 60,
+        'videoCategories': 24 * 60 * 60,
+    }
     _VIRTUAL_LISTS = frozenset(('WL', 'LL', 'HL'))
     JSON_PATHS = {
         'tv_grid': {
@@ -2265,9 +2278,13 @@ class YouTubeDataClient(YouTubeLoginClient):
                              refresh=False,
                              force_cache=False,
                              progress_dialog=None,
+                             prefetch=False,
                              **kwargs):
         """
         modified by PureHemp, using YouTube RSS for fetching latest videos
+
+        If prefetch is True, stale feeds are refreshed and the merged timeline
+        is stored without a page of items being returned.
         """
 
         v3_response = {
@@ -2302,31 +2319,117 @@ class YouTubeDataClient(YouTubeLoginClient):
 
         page = page_token or 1
         totals = {
-            'num': 0,
             'start': -self.max_results(),
             'end': page * self.max_results(),
-            'video_ids': set(),
         }
         totals['start'] += totals['end']
 
+        # Feeds are merged incrementally, so the total number of items is not
+        # known until all items have been merged. totalResults is the number
+        # of items merged so far, which is at least one more than the end of
+        # the current page if there is a next page.
+        def _get_page(items, num, totals=totals, v3_response=v3_response):
+            if num > totals['end']:
+                v3_response['nextPageToken'] = page + 1
+            if num > totals['start']:
+                items = items[totals['start']:min(num, totals['end'])]
+            else:
+                return None
+
+            v3_response['pageInfo']['totalResults'] = num
+            v3_response['items'] = items
+            v3_response['_item_filter'] = item_filter
+            return v3_response
+
+        def _get_timestamp(item):
+            if '_timestamp' in item:
+                timestamp = item['_timestamp']
+            else:
+                timestamp = since_epoch(item['snippet'].get('publishedAt'))
+                item['_timestamp'] = timestamp
+            return timestamp
+
         def _sort_by_date_time(item, limits):
             video_id = item['id']
             if video_id in limits['video_ids']:
                 return -1
             limits['num'] += 1
             limits['video_ids'].add(video_id)
-            if '_timestamp' in item:
-                timestamp = item['_timestamp']
+            return _get_timestamp(item)
+
+        def _merge_feeds(feeds, limit, cursor=None):
+            """
+            k-way merge of feed items, with the items of each feed already
+            sorted newest first, skipping duplicate videos.
+            Merging starts after the position of the cursor, if provided.
+            Returns a tuple of the list of up to limit merged items, and the
+            cursor for the next merge or None if all items have been merged.
+            The cursor holds the ids of all merged videos, as the same video
+            can have a different timestamp in different feeds, e.g. in a
+            playlist and in the channel uploads. These are bounded by the
+            MAX_TIMELINE_ITEMS limit on resuming a merge.
+            """
+            if cursor:
+                cut_off, seen = cursor
+                seen = set(seen)
             else:
-                timestamp = since_epoch(item['snippet'].get('publishedAt'))
-                item['_timestamp'] = timestamp
-            return timestamp
+                cut_off = None
+                seen = set()
+
+            heap = []
+            for feed_id, feed_items in feeds.items():
+                num_items = len(feed_items)
+                position = 0
+                if cut_off is not None:
+                    # Binary search for first item not newer than the cursor
+                    upper = num_items
+                    while position < upper:
+                        middle = (position + upper) // 2
+                        if _get_timestamp(feed_items[middle]) > cut_off:
+                            position = middle + 1
+                        else:
+                            upper = middle
+                if position < num_items:
+                    heap.append((
+                        -_get_timestamp(feed_items[position]),
+                        feed_id,
+                        position,
+                    ))
+            heapify(heap)
+
+            items = []
+            timestamp = cut_off
+            while heap and len(items) < limit:
+                negative_timestamp, feed_id, position = heap[0]
+                feed_items = feeds[feed_id]
+                item = feed_items[position]
+                position += 1
+                if position < len(feed_items):
+                    heapreplace(heap, (
+                        -_get_timestamp(feed_items[position]),
+                        feed_id,
+                        position,
+                    ))
+                else:
+                    heappop(heap)
+
+                timestamp = -negative_timestamp
+                video_id = item['id']
+                if video_id in seen:
+                    continue
+                seen.add(video_id)
+                items.append(item)
+
+            if heap:
+                return items, (timestamp, list(seen))
+            return items, None
 
         threaded_output = {
             'channel_ids': set(),
             'playlist_ids': set(),
             'feeds': {},
             'to_refresh': set(),
+            'throttled': False,
         }
 
         (use_subscriptions,
@@ -2337,6 +2440,50 @@ class YouTubeDataClient(YouTubeLoginClient):
             use_subscriptions = False
             use_saved_playlists = False
 
+        timeline_id = ','.join((
+            'timeline',
+            feed_type,
+            generate_hash(
+                use_subscriptions,
+                use_saved_playlists,
+                use_bookmarked_channels,
+                use_bookmarked_playlists,
+                channel_filters and channel_filters['blacklist'],
+                channel_filters and sorted(channel_filters['names']),
+            ),
+        ))
+        if not refresh and not prefetch:
+            timeline = feed_history.get_timeline(
+                timeline_id,
+                seconds=self.TIMELINE_TTL,
+            )
+        else:
+            timeline = None
+        if timeline:
+            timestamp = timeline['timestamp']
+            timeline = timeline['value']
+            items = timeline['items']
+            cursor = timeline['cursor']
+            if cursor and len(items) <= totals['end'] < self.MAX_TIMELINE_ITEMS:
+                # Resume merging of cached feeds from the end of the timeline
+                cached_feeds = feed_history.get_items(timeline['feed_ids'])
+                new_items, cursor = _merge_feeds(
+                    {
+                        feed_id: feed['value']['cached_items']
+                        for feed_id, feed in cached_feeds.items()
+                        if feed['value'].get('cached_items')
+                    },
+                    limit=(totals['end'] + 1 - len(items)),
+                    cursor=cursor,
+                )
+                items.extend(new_items)
+                timeline['cursor'] = cursor
+                feed_history.set_timeline(timeline_id,
+                                          timeline,
+                                          timestamp=timestamp)
+            if not cursor or len(items) > totals['end']:
+                return _get_page(items, len(items))
+
         if use_bookmarked_channels or use_bookmarked_playlists:
             bookmarks = context.get_bookmarks_list().get_items()
             if bookmarks:
@@ -2379,7 +2526,10 @@ class YouTubeDataClient(YouTubeLoginClient):
                              feed_type=feed_type,
                              refresh=refresh,
                              feed_history=feed_history,
-                             ttl=feed_history.ONE_HOUR):
+                             ttl=feed_history.ONE_HOUR,
+                             spread=(feed_history.ONE_MINUTE * 15
+                                     if prefetch else
+                                     0)):
             feeds = output['feeds']
             to_refresh = output['to_refresh']
 
@@ -2406,7 +2556,11 @@ class YouTubeDataClient(YouTubeLoginClient):
                     if channel_id:
                         feed_details.setdefault('channel_id', channel_id)
 
-                    _refresh = refresh or cached['age'] > ttl
+                    # Stagger refreshes of prefetched feeds across the TTL
+                    # rather than refreshing all feeds at the same time
+                    _refresh = refresh or cached['age'] > (
+                        ttl - randint(0, spread) if spread else ttl
+                    )
                     feed_details['refresh'] = _refresh
                     if _refresh:
                         to_refresh.add(channel_id or item_id)
@@ -2442,6 +2596,21 @@ class YouTubeDataClient(YouTubeLoginClient):
                 channel_id = None
                 item_id = input
 
+            feeds = output['feeds']
+            cached = feeds.get(item_id)
+            if cached and cached.get('cached_items'):
+                etag = cached.get('etag')
+                last_modified = cached.get('last_modified')
+                if etag or last_modified:
+                    headers = headers.copy()
+                    if etag:
+                        headers['If-None-Match'] = etag
+                    if last_modified:
+                        headers['If-Modified-Since'] = last_modified
+            else:
+                etag = None
+                last_modified = None
+
             response = self.request(
                 ''.join((self.BASE_URL,
                          '/feeds/videos.xml?playlist_id=',
@@ -2455,8 +2624,12 @@ class YouTubeDataClient(YouTubeLoginClient):
             with response:
                 status_code = response.status_code
                 if status_code == 429:
+                    output['throttled'] = True
                     return False, True
-                if status_code == 404:
+                if status_code == 304:
+                    # Feed has not changed, use cached items without parsing
+                    content = None
+                elif status_code == 404:
                     content = None
                 elif stream:
                     parser = ET_XMLParser(encoding='utf-8')
@@ -2467,13 +2640,17 @@ class YouTubeDataClient(YouTubeLoginClient):
                 else:
                     response.encoding = 'utf-8'
                     content = ET_XML(response.content)
+                if content is not None:
+                    etag = response.headers.get('ETag')
+                    last_modified = response.headers.get('Last-Modified')
 
             _output = {
                 'channel_id': channel_id,
                 'content': content,
                 'refresh': content is not None,
+                'etag': etag,
+                'last_modified': last_modified,
             }
-            feeds = output['feeds']
             if item_id in feeds:
                 feeds[item_id].update(_output)
             else:
@@ -2488,7 +2665,6 @@ class YouTubeDataClient(YouTubeLoginClient):
 
         def _parse_feeds(feeds,
                          sort_method,
-                         sort_limits,
                          progress_dialog=None,
                          filters=channel_filters,
                          ns=namespaces,
@@ -2508,6 +2684,7 @@ class YouTubeDataClient(YouTubeLoginClient):
 
             all_items = {}
             new_cache = {}
+            unchanged = []
             for item_id, feed in feeds.items():
                 channel_id = feed.get('channel_id')
                 channel_name = feed.get('channel_name')
@@ -2570,8 +2747,6 @@ class YouTubeDataClient(YouTubeLoginClient):
                     feed_items = []
 
                 if feed_items:
-                    if cached_items:
-                        feed_items.extend(cached_items)
                     feed_limits = {
                         'num': 0,
                         'video_ids': set(),
@@ -2579,10 +2754,36 @@ class YouTubeDataClient(YouTubeLoginClient):
                     feed_items.sort(reverse=True,
                                     key=partial(sort_method,
                                                 limits=feed_limits))
-                    feed_items = feed_items[:min(1000, feed_limits['num'])]
+                    feed_items = feed_items[:feed_limits['num']]
+                    # Cached items are replaced by the items of the same
+                    # videos from the feed. The remaining cached items are
+                    # already sorted, and only need to be sorted again if they
+                    # are not all older than the items from the feed.
+                    if cached_items:
+                        video_ids = feed_limits['video_ids']
+                        cached_items = [
+                            item
+                            for item in cached_items
+                            if item['id'] not in video_ids
+                        ]
+                        resort = (
+                            cached_items
+                            and _get_timestamp(cached_items[0])
+                            > _get_timestamp(feed_items[-1])
+                        )
+                        feed_items.extend(cached_items)
+                        if resort:
+                            feed_items.sort(reverse=True, key=_get_timestamp)
+                    feed_items = feed_items[:1000]
                 elif cached_items:
                     feed_items = cached_items
-                    refresh_feed = root is None
+                    # Feed was requested but is unchanged (304) or missing
+                    # (404). The cached items and their ETag and
+                    # Last-Modified validators are still current, so only
+                    # the timestamp of the cached feed is updated rather than
+                    # storing all of the cached items again.
+                    if 'content' in feed and root is None:
+                        unchanged.append(item_id)
                 else:
                     refresh_feed = True
 
@@ -2591,6 +2792,8 @@ class YouTubeDataClient(YouTubeLoginClient):
                         'channel_id': channel_id,
                         'channel_name': channel_name,
                         'cached_items': feed_items,
+                        'etag': feed.get('etag'),
+                        'last_modified': feed.get('last_modified'),
                     }
                 if not feed_items:
                     continue
@@ -2613,15 +2816,10 @@ class YouTubeDataClient(YouTubeLoginClient):
 
             if new_cache:
                 feed_history.set_items(new_cache)
+            if unchanged:
+                feed_history.refresh_items(unchanged)
 
-            # filter, sorting by publish date and trim
-            if all_items:
-                return sorted(
-                    chain.from_iterable(all_items.values()),
-                    reverse=True,
-                    key=partial(sort_method, limits=sort_limits),
-                )
-            return None
+            return all_items or None
 
         def _threaded_fetch(kwargs,
                             do_batch,
@@ -2970,26 +3168,29 @@ class YouTubeDataClient(YouTubeLoginClient):
             counts['all'] += 1
             new_thread.start()
 
-        items = _parse_feeds(
+        all_items = _parse_feeds(
             threaded_output['feeds'],
             sort_method=_sort_by_date_time,
-            sort_limits=totals,
             progress_dialog=progress_dialog,
         )
-        if not items:
-            return None
-
-        if totals['num'] > totals['end']:
-            v3_response['nextPageToken'] = page + 1
-        if totals['num'] > totals['start']:
-            items = items[totals['start']:min(totals['num'], totals['end'])]
+        if all_items:
+            items, cursor = _merge_feeds(all_items, limit=(totals['end'] + 1))
+            feed_history.set_timeline(timeline_id, {
+                'feed_ids': list(all_items),
+                'items': items,
+                'cursor': cursor,
+            })
         else:
-            return None
+            items = None
 
-        v3_response['pageInfo']['totalResults'] = totals['num']
-        v3_response['items'] = items
-        v3_response['_item_filter'] = item_filter
-        return v3_response
+        if prefetch:
+            return {
+                'num': len(items) if items else 0,
+                'throttled': threaded_output['throttled'],
+            }
+        if not items:
+            return None
+        return _get_page(items, len(items))
 
     @classmethod
     def v3_api_available(cls):
@@ -3071,39 +3272,9 @@ class YouTubeDataClient(YouTubeLoginClient):
         if not json_data or 'error' not in json_data:
             return 'API request error', None, None, data, exception
 
-        details = json_data['error']
-        reason = details.get('errors', [{}])[0].get('reason', 'Unknown')
-        message = strip_html_from_text(details.get('message', 'Unknown error'))
-
+        reason, message = self._get_error_details(json_data)
         if getattr(exc, 'notify', True):
-            context = self._context
-            ok_dialog = False
-            if reason in {'accessNotConfigured', 'forbidden'}:
-                notification = context.localize('key.requirement')
-                ok_dialog = True
-            elif reason == 'keyInvalid' and message == 'Bad Request':
-                notification = context.localize('api.key.incorrect')
-            elif reason in {'quotaExceeded', 'dailyLimitExceeded'}:
-                notification = message
-            elif reason == 'authError':
-                auth_type = kwargs.get('_auth_type')
-                if auth_type:
-                    if auth_type in self._access_tokens:
-                        self._access_tokens[auth_type] = None
-                    self.set_access_token(self._access_tokens)
-                    context.get_access_manager().update_access_token(
-                        context.get_param('addon_id'),
-                        access_token=self.convert_access_tokens(to_list=True),
-                    )
-                notification = message
-            else:
-                notification = message
-
-            title = ': '.join((context.get_name(), reason))
-            if ok_dialog:
-                context.get_ui().on_ok(title, notification)
-            else:
-                context.get_ui().show_notification(notification, title)
+            self._notify_error(reason, message, kwargs.get('_auth_type'))
 
         info = (
             'Reason:   {error_reason}',
@@ -3115,6 +3286,56 @@ class YouTubeDataClient(YouTubeLoginClient):
         }
         return 'API request error', info, details, data, exception
 
+    @staticmethod
+    def _get_error_details(json_data):
+        details = json_data['error']
+        reason = details.get('errors', [{}])[0].get('reason', 'Unknown')
+        message = strip_html_from_text(details.get('message', 'Unknown error'))
+        return reason, message
+
+    def _notify_error(self, reason, message, auth_type=None):
+        context = self._context
+        ok_dialog = False
+        if reason in {'accessNotConfigured', 'forbidden'}:
+            notification = context.localize('key.requirement')
+            ok_dialog = True
+        elif reason == 'keyInvalid' and message == 'Bad Request':
+            notification = context.localize('api.key.incorrect')
+        elif reason in {'quotaExceeded', 'dailyLimitExceeded'}:
+            notification = message
+        elif reason == 'authError':
+            if auth_type:
+                if auth_type in self._access_tokens:
+                    self._access_tokens[auth_type] = None
+                self.set_access_token(self._access_tokens)
+                context.get_access_manager().update_access_token(
+                    context.get_param('addon_id'),
+                    access_token=self.convert_access_tokens(to_list=True),
+                )
+            notification = message
+        else:
+            notification = message
+
+        title = ': '.join((context.get_name(), reason))
+        if ok_dialog:
+            context.get_ui().on_ok(title, notification)
+        else:
+            context.get_ui().show_notification(notification, title)
+
+    def notify_request_error(self, exc):
+        """
+        Notifies the API error of a request made with notify=False, e.g. one
+        of several concurrent requests, from the exception it raised.
+        Returns True if there was an API error to notify, otherwise False.
+        """
+        exc = getattr(exc, '__cause__', None) or exc
+        json_data = getattr(exc, 'json_data', None)
+        if not json_data or 'error' not in json_data:
+            return False
+        reason, message = self._get_error_details(json_data)
+        self._notify_error(reason, message, getattr(exc, '_auth_type', None))
+        return True
+
     def api_request(self,
                     client='v3',
                     method='GET',
@@ -3237,9 +3458,15 @@ class YouTubeDataClient(YouTubeLoginClient):
         elif cache is not False and context.refresh_requested():
             cache = 'refresh'
 
+        # Auth type is also passed to the response hook, so that it is set on
+        # the exception raised for an API error
+        kwargs['_auth_type'] = client.get('_auth_type')
         return self.request(response_hook=self._request_response_hook,
                             event_hook_kwargs=kwargs,
                             error_hook=self._request_error_hook,
                             stacklevel=3,
                             cache=cache,
+                            cache_ttl=(self.CACHE_TTL.get(path)
+                                       if method == 'GET' else
+                                       None),
                             **client)
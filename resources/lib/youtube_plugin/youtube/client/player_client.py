@@ -11,13 +11,18 @@
 from __future__ import absolute_import, division, unicode_literals
 
 from base64 import urlsafe_b64encode
+from copy import deepcopy
 from json import dumps as json_dumps, loads as json_loads
+from operator import itemgetter
 from os import path as os_path
 from random import choice as random_choice
 from re import compile as re_compile, sub as re_sub
+from threading import Event, Thread
 
 from .data_client import YouTubeDataClient
 from .subtitles import SUBTITLE_SELECTIONS, Subtitles
+from ..helper.mpd_template import MPDTemplate
+from ..helper.player_js import PlayerJS
 from ..helper.ratebypass import ratebypass
 from ..helper.signature.cipher import Cipher
 from ..helper.utils import THUMB_TYPES, THUMB_URL
@@ -26,7 +31,6 @@ from ...kodion import logging
 from ...kodion.compatibility import (
     entity_escape,
     parse_qs,
-    quote,
     unescape,
     unquote,
     urlencode,
@@ -36,9 +40,9 @@ from ...kodion.compatibility import (
 )
 from ...kodion.constants import INCOGNITO, PATHS, TEMP_PATH, VALUE_TO_STR
 from ...kodion.network import get_connect_address
-from ...kodion.utils.datetime import fromtimestamp
+from ...kodion.utils.datetime import fromtimestamp, since_epoch
 from ...kodion.utils.file_system import make_dirs
-from ...kodion.utils.methods import merge_dicts
+from ...kodion.utils.methods import generate_hash, merge_dicts
 
 
 class YouTubePlayerClient(YouTubeDataClient):
@@ -823,6 +827,151 @@ class YouTubePlayerClient(YouTubeDataClient):
         )),
     }
 
+    # Maximum number of player requests, for the first available client of
+    # each client group, that are sent concurrently ahead of the sequential
+    # processing of the player responses in load_stream_info
+    CONCURRENT_CLIENTS = 4
+    # Maximum time, in seconds, to wait for a prefetched player response
+    # before sending the request again instead
+    PREFETCH_TIMEOUT = 30
+
+    # Processed stream info is reused until the stream urls expire, less the
+    # duration of the video and this margin, in seconds
+    STREAM_INFO_EXPIRY_MARGIN = 5 * 60
+
+    # MPD fragments compiled once, with only the attributes of each
+    # AdaptationSet and Representation substituted when generating a manifest
+    MPD_ADAPTATION_SET = MPDTemplate(
+        '\t\t<AdaptationSet'
+            ' subsegmentAlignment="true"'
+            ' subsegmentStartsWithSAP="1"'
+            ' bitstreamSwitching="true"'
+            ' id="{set_id}"'
+            ' contentType="{mediaType}"'
+            ' mimeType="{mimeType}"'
+            ' lang="{langCode}"'
+            # name attribute is ISA specific and does not exist in the
+            # MPD spec. Should be a child Label element instead
+            ' name="[B]{label}[/B]"'
+            # original / default / impaired are ISA specific attributes
+            ' original="{original}"'
+            ' default="{default}"'
+            ' impaired="{impaired}"'
+            '>\n'
+        # AdaptationSet Label element not currently used by ISA
+        '\t\t\t<Label>{label}</Label>\n'
+        '\t\t\t<Role'
+            ' schemeIdUri="urn:mpeg:dash:role:2011"'
+            ' value="{role}"'
+            '/>\n',
+        extra_fields=(
+            'set_id',
+            'label',
+            'original',
+            'default',
+            'impaired',
+            'role',
+        ),
+    )
+    MPD_AUDIO_REPRESENTATION = MPDTemplate(
+        '\t\t\t<Representation'
+            ' id="{id}"'
+            ' codecs="{codecs}"'
+            ' mimeType="{mimeType}"'
+            ' bandwidth="{bitrate}"'
+            ' sampleRate="{sampleRate}"'
+            ' numChannels="{channels}"'
+            # quality and priority attributes are not used by ISA
+            ' qualityRanking="{quality}"'
+            ' selectionPriority="{priority}"'
+            '>\n'
+        '\t\t\t\t<AudioChannelConfiguration'
+            ' schemeIdUri="urn:mpeg:dash:23003:3:audio_channel_configuration:2011"'
+            ' value="{channels}"'
+            '/>\n'
+        # Representation Label element is not used by ISA
+        '\t\t\t\t<Label>{label}</Label>\n'
+        '\t\t\t\t<BaseURL>{baseUrl}</BaseURL>\n'
+        '\t\t\t\t<SegmentBase indexRange="{indexRange}" timescale="1000">\n'
+        '\t\t\t\t\t<Initialization range="{initRange}"/>\n'
+        '\t\t\t\t</SegmentBase>\n'
+        '\t\t\t</Representation>\n',
+        extra_fields=('quality', 'priority'),
+    )
+    MPD_VIDEO_REPRESENTATION = (
+        '\t\t\t<Representation'
+            ' id="{id}"'
+            ' codecs="{codecs}"'
+            ' mimeType="{mimeType}"'
+            ' bandwidth="{bitrate}"'
+            ' width="{width}"'
+            ' height="{height}"'
+            '{frame_rate}'
+            # quality and priority attributes are not used by ISA
+            ' qualityRanking="{quality}"'
+            ' selectionPriority="{priority}"'
+            '>\n'
+        # Representation Label element is not used by ISA
+        '\t\t\t\t<Label>{label}</Label>\n'
+        '\t\t\t\t<BaseURL>{baseUrl}</BaseURL>\n'
+        '\t\t\t\t<SegmentBase indexRange="{indexRange}">\n'
+        '\t\t\t\t\t<Initialization range="{initRange}"/>\n'
+        '\t\t\t\t</SegmentBase>\n'
+        '\t\t\t</Representation>\n'
+    )
+    # Keyed by whether the frameRate attribute is used as a frame rate hint
+    MPD_VIDEO_REPRESENTATIONS = {
+        True: MPDTemplate(
+            MPD_VIDEO_REPRESENTATION.replace(
+                '{frame_rate}',
+                ' frameRate="{frameRate}"',
+            ),
+            extra_fields=('quality', 'priority'),
+        ),
+        False: MPDTemplate(
+            MPD_VIDEO_REPRESENTATION.replace('{frame_rate}', ''),
+            extra_fields=('quality', 'priority'),
+        ),
+    }
+    MPD_SUBTITLE_ADAPTATION_SET = MPDTemplate(
+        '\t\t<AdaptationSet'
+            ' id="{set_id}"'
+            ' contentType="text"'
+            ' mimeType="{mime_type}"'
+            ' lang="{lang}"'
+            # name attribute is ISA specific and does not exist in
+            # the MPD spec. Should be a child Label element instead
+            ' name="[B]{label}[/B]"'
+            # original / default are ISA specific attributes
+            ' original="{original}"'
+            ' default="{default}"'
+            '>\n'
+        # AdaptationSet Label element not currently used by ISA
+        '\t\t\t<Label>{label}</Label>\n'
+        '\t\t\t<Role'
+            ' schemeIdUri="urn:mpeg:dash:role:2011"'
+            ' value="subtitle"'
+            '/>\n'
+        '\t\t\t<Representation'
+            ' id="subs_{kind}"'
+            ' codecs="{codec}"'
+            ' mimeType="{mime_type}"'
+            # unsure about what value to use for bandwidth
+            # ' bandwidth="0"'
+            '>\n'
+        '\t\t\t\t<BaseURL>{url}</BaseURL>\n'
+        '\t\t\t</Representation>\n'
+        '\t\t</AdaptationSet>\n',
+        extra_fields=(
+            'set_id',
+            'label',
+            'original',
+            'default',
+            'kind',
+            'url',
+        ),
+    )
+
     def __init__(self,
                  context,
                  clients=None,
@@ -856,6 +1005,7 @@ class YouTubePlayerClient(YouTubeDataClient):
             INCOGNITO: None,
         }
         self._visitor_data_key = 'current'
+        self._stream_info_cache = {}
         self._client_groups = (
             ('custom', clients if clients else ()),
             ('auth_enabled|initial_request|no_playable_streams', (
@@ -1061,7 +1211,7 @@ class YouTubePlayerClient(YouTubeDataClient):
         if not js_url:
             player_config = self._get_player_config()
             if not player_config:
-                return ''
+                return False
 
             js_url = player_config.get('PLAYER_JS_URL')
             if not js_url:
@@ -1072,16 +1222,22 @@ class YouTubePlayerClient(YouTubeDataClient):
                         break
 
         if not js_url:
-            return ''
+            return False
 
         js_url = self._normalize_url(js_url)
         data_cache.set_item('player_js_url', {'url': js_url})
 
-        js_cache_key = quote(js_url)
-        cached = data_cache.get_item(js_cache_key, data_cache.ONE_HOUR * 4)
-        cached = cached and cached.get('js')
-        if cached:
-            return cached
+        player_js = PlayerJS(js_url)
+        if player_js.exists():
+            return player_js
+        if PlayerJS.is_empty():
+            # Player JavaScript used to be stored in the data cache, keyed by
+            # the quoted url. Remove these entries when the first player
+            # version is stored on disk. Both cases of the quoted colon are
+            # matched, rather than relying on LIKE being case-insensitive.
+            for url in ('https%3a//www.youtube.com/s/player/%',
+                        'https%3A//www.youtube.com/s/player/%'):
+                data_cache.del_items_like(url)
 
         client_name = 'web'
         client_data = {'json': {'videoId': self.video_id}}
@@ -1100,10 +1256,10 @@ class YouTubePlayerClient(YouTubeDataClient):
             cache=False,
         )
         if not result:
-            return ''
+            return False
 
-        data_cache.set_item(js_cache_key, {'js': result})
-        return result
+        player_js.save(result)
+        return player_js
 
     @staticmethod
     def _prepare_headers(headers, cookies=None, new_headers=None):
@@ -1436,7 +1592,8 @@ class YouTubePlayerClient(YouTubeDataClient):
                 self._player_js = self._get_player_js()
             if self._calculate_n is True:
                 self.log.debug('Detected nsig in stream url')
-                self._calculate_n = ratebypass.CalculateN(self._player_js)
+                self._calculate_n = ratebypass.CalculateN(self._context,
+                                                          self._player_js)
 
             # Cipher n to get the updated value
             new_n = self._calculate_n.calculate_n(params['n'][0])
@@ -1520,6 +1677,140 @@ class YouTubePlayerClient(YouTubeDataClient):
 
         return parts.geturl()
 
+    def _process_stream_urls(self,
+                             urls,
+                             headers=None,
+                             cpn=False,
+                             method='POST',
+                             digits_re=re_compile(r'\d+')):
+        """
+        Batch version of _process_url_params(url, stream_proxy=True) for the
+        urls of all the streams from a player response. Parameters and
+        headers common to all the urls are only processed and encoded once,
+        nsig is only calculated once for each unique n value, and the query
+        string of each url is rewritten without decoding and re-encoding all
+        of its parameters.
+        """
+        if not urls:
+            return []
+
+        if headers:
+            headers.setdefault(
+                'X-Goog-Visitor-Id',
+                self._visitor_data[self._visitor_data_key],
+            )
+            headers.setdefault(
+                'Referer',
+                'https://www.youtube.com/watch?v=%s' % self.video_id,
+            )
+
+        common_params = {
+            '__id': self.video_id,
+            '__method': method,
+            '__headers': urlsafe_b64encode(
+                json_dumps(headers or {}).encode('utf-8')
+            ),
+        }
+        if cpn is not False:
+            common_params['cpn'] = cpn or self._generate_cpn()
+        common_query = urlencode(common_params)
+        replaced_params = frozenset(common_params).union(('__host', '__path'))
+        proxy_url = urlunsplit((
+            'http',
+            get_connect_address(self._context, as_netloc=True),
+            PATHS.STREAM_PROXY,
+            '',
+            '',
+        ))
+
+        snippet = (self.yt_item or {}).get('snippet')
+        set_modified = snippet and 'publishedAt' not in snippet
+        calculated_n = {}
+        new_urls = []
+
+        for url in urls:
+            if not url:
+                new_urls.append(url)
+                continue
+
+            parts = urlsplit(url)
+            query = []
+            n = mn = fvip = None
+            for param in parts.query.split('&'):
+                key, _, value = param.partition('=')
+                # Blank values are dropped, as parse_qs would do
+                if not value or key in replaced_params:
+                    continue
+                if key == 'n':
+                    n = value
+                    continue
+                if key == 'mn':
+                    mn = unquote(value)
+                elif key == 'fvip':
+                    fvip = unquote(value)
+                elif key == 'lmt' and set_modified:
+                    try:
+                        modified = fromtimestamp(int(value) // 1000000)
+                    except (OSError, OverflowError, ValueError):
+                        modified = None
+                    snippet['publishedAt'] = modified
+                    set_modified = False
+                query.append(param)
+
+            if n:
+                if n in calculated_n:
+                    new_n = calculated_n[n]
+                elif not self._calculate_n:
+                    new_urls.append(None)
+                    continue
+                else:
+                    if self._player_js is None:
+                        self._player_js = self._get_player_js()
+                    if self._calculate_n is True:
+                        self.log.debug('Detected nsig in stream url')
+                        self._calculate_n = ratebypass.CalculateN(
+                            self._context,
+                            self._player_js,
+                        )
+                    new_n = self._calculate_n.calculate_n(unquote(n))
+                    if not new_n:
+                        self.log.error('nsig handling failed')
+                        self._calculate_n = False
+                    calculated_n[n] = new_n
+                if new_n:
+                    query = [param for param in query
+                             if not param.startswith('ratebypass=')]
+                    query.append(urlencode({'n': new_n}))
+                    query.append('ratebypass=yes')
+                else:
+                    query.append('n=' + n)
+
+            hostname = parts.hostname
+            hosts = [hostname]
+            if mn and fvip:
+                primary, _, secondary = mn.partition(',')
+                prefix, separator, server = hostname.partition('---')
+                if primary and secondary:
+                    hosts.append(separator.join((
+                        digits_re.sub(fvip, prefix),
+                        server.replace(primary, secondary),
+                    )))
+
+            query.append(common_query)
+            query.append(urlencode({
+                '__host': hosts,
+                '__path': parts.path,
+            }, doseq=True))
+            new_urls.append('?'.join((proxy_url, '&'.join(query))))
+
+        if calculated_n:
+            self.log.debug(('Processed stream urls',
+                            'URLs:     {num_urls}',
+                            'nsig for: {n}'),
+                           num_urls=len(new_urls),
+                           n=list(calculated_n))
+        return new_urls
+
     def _process_captions(self, subtitles, responses):
         all_subs = SUBTITLE_SELECTIONS['all']
         default_lang = None
@@ -1611,6 +1902,140 @@ class YouTubePlayerClient(YouTubeDataClient):
             return result['simpleText']
         return None
 
+    def _prefetch_player_responses(self,
+                                   video_id,
+                                   client_data,
+                                   use_mpd,
+                                   use_remote_history,
+                                   ask_for_quality,
+                                   max_clients=None):
+        if max_clients is None:
+            max_clients = self.CONCURRENT_CLIENTS
+        prefetched = {}
+        # Without visitor data, the visitor data from the first response is
+        # used for all subsequent requests, so these cannot be sent ahead.
+        # Nothing is prefetched on first use, in incognito mode, or after the
+        # visitor data has expired, and all requests are sent sequentially.
+        visitor_data = client_data.get('_visitor_data')
+        if max_clients < 2 or not visitor_data:
+            return prefetched
+
+        client_data = client_data.copy()
+
+        for name, clients in self._client_groups:
+            if len(prefetched) >= max_clients:
+                break
+            if not clients:
+                continue
+            if name == 'mpd' and not use_mpd:
+                continue
+            if name == 'ask' and use_mpd and not ask_for_quality:
+                continue
+            if name.startswith('auth_enabled|initial_request'):
+                # Whether this group is used depends on the responses to the
+                # preceding groups, unless remote history is used
+                if not use_remote_history:
+                    break
+                client_data['_auth_requested'] = True
+
+            for client_name in clients:
+                if client_name in prefetched:
+                    continue
+                client_data['_cpn'] = self._generate_cpn()
+                client = self.build_client(client_name, client_data)
+                if not client:
+                    continue
+
+                prefetch = {
+                    'client': client,
+                    'visitor_data': visitor_data,
+                    'result': None,
+                    'complete': Event(),
+                    'cancelled': False,
+                }
+                thread = Thread(
+                    target=self._prefetch_player_response,
+                    args=(prefetch, video_id, client_name),
+                )
+                thread.daemon = True
+                thread.start()
+                prefetched[client_name] = prefetch
+                break
+            else:
+                continue
+
+            # The authentication used by subsequent clients depends on the
+            # response to an authenticated request
+            if client.get('_has_auth'):
+                break
+        return prefetched
+
+    def _prefetch_player_response(self, prefetch, video_id, client_name):
+        if prefetch['cancelled']:
+            prefetch['complete'].set()
+            return
+        client = prefetch['client']
+        try:
+            result = self.request(
+                response_hook=self._response_hook_json,
+                error_title='Player request failed',
+                error_hook=self._player_error_hook,
+                video_id=video_id,
+                client_name=client_name,
+                has_auth=client.get('_has_auth'),
+                visitor_data=prefetch['visitor_data'],
+                cache=False,
+                pass_data=True,
+                raise_exc=False,
+                **client
+            )
+            if not prefetch['cancelled']:
+                prefetch['result'] = result
+        except Exception:
+            self.log.exception('Prefetch failed - Client: %r', client_name)
+        finally:
+            prefetch['complete'].set()
+
+    def _get_playback_stats(self, playback_tracking=None, cpn=None):
+        playback_stats = {
+            'playback_url': 'videostatsPlaybackUrl',
+            'watchtime_url': 'videostatsWatchtimeUrl',
+        }
+        if not playback_tracking:
+            return dict.fromkeys(playback_stats, '')
+
+        if not cpn:
+            cpn = self._generate_cpn()
+        for key, url_key in playback_stats.items():
+            url = playback_tracking.get(url_key, {}).get('baseUrl')
+            if url and url.startswith('http'):
+                playback_stats[key] = '&cpn='.join((url, cpn))
+            else:
+                playback_stats[key] = ''
+        return playback_stats
+
+    @staticmethod
+    def _get_stream_url_expiry(responses,
+                               expire_re=re_compile(r'[?&/]expire[=/](\d+)')):
+        expiry = None
+        for response in responses.values():
+            urls = [
+                stream_map.get('url')
+                for stream_map in (response['adaptive_fmts']
+                                   or response['progressive_fmts']
+                                   or ())[:1]
+            ]
+            urls.extend((response['hls_manifest'], response['mpd_manifest']))
+            for url in urls:
+                match = url and expire_re.search(url)
+                if not match:
+                    continue
+                expire = int(match.group(1))
+                if not expiry or expire < expiry:
+                    expiry = expire
+                break
+        return expiry
+
     def load_stream_info(self,
                          video_id,
                          ask_for_quality=None,
@@ -1652,6 +2077,42 @@ class YouTubePlayerClient(YouTubeDataClient):
                 and settings.use_remote_history()
         )
 
+        stream_info_params = (
+            video_id,
+            ask_for_quality,
+            audio_only,
+            use_mpd,
+            logged_in,
+            use_remote_history,
+        )
+        if not incognito:
+            cached = self._stream_info_cache.get(video_id)
+            if (cached
+                    and cached['expiry'] > since_epoch()
+                    and cached['key'] == generate_hash(
+                        stream_info_params,
+                        self._visitor_data[visitor_data_key],
+                    )):
+                manifest = cached['manifest']
+                if manifest and not self._store_mpd_manifest(**manifest):
+                    self.log.warning(('Unable to store cached MPD manifest',
+                                      'video_id: %r'),
+                                     video_id)
+                    del self._stream_info_cache[video_id]
+                else:
+                    self.log.debug('Using cached stream info - video_id: %r',
+                                   video_id)
+                    # Playback stats urls are not reused, so that each
+                    # playback is reported with a new cpn
+                    playback_stats = self._get_playback_stats(
+                        cached['playback_tracking']
+                    )
+                    streams = deepcopy(cached['streams'])
+                    for stream in streams:
+                        stream['playback_stats'] = playback_stats
+                    self.yt_item = yt_item = deepcopy(cached['yt_item'])
+                    return streams, yt_item
+
         _client_name = None
         _client = None
         _has_auth = None
@@ -1695,6 +2156,14 @@ class YouTubePlayerClient(YouTubeDataClient):
         if use_remote_history:
             client_data['_auth_requested'] = True
 
+        prefetched = self._prefetch_player_responses(
+            video_id=video_id,
+            client_data=client_data,
+            use_mpd=use_mpd,
+            use_remote_history=use_remote_history,
+            ask_for_quality=ask_for_quality,
+        )
+
         for name, clients in self._client_groups:
             if not clients:
                 continue
@@ -1733,19 +2202,36 @@ class YouTubePlayerClient(YouTubeDataClient):
                         _reason = None
                         continue
 
-                    _result = self.request(
-                        response_hook=self._response_hook_json,
-                        error_title='Player request failed',
-                        error_hook=self._player_error_hook,
-                        video_id=video_id,
-                        client_name=_client_name,
-                        has_auth=_has_auth,
-                        visitor_data=visitor_data,
-                        cache=False,
-                        pass_data=True,
-                        raise_exc=False,
-                        **_client
-                    ) or {}
+                    # Only use a prefetched response if the client was built
+                    # with the same authentication and visitor data as the
+                    # current request. Otherwise discard it and send the
+                    # request again.
+                    prefetch = prefetched.pop(_client_name, None)
+                    if (prefetch
+                            and prefetch['visitor_data'] == visitor_data
+                            and (prefetch['client'].get('_has_auth')
+                                 == _has_auth)
+                            and prefetch['complete'].wait(
+                                self.PREFETCH_TIMEOUT
+                            )):
+                        _client = prefetch['client']
+                        _result = prefetch['result'] or {}
+                    else:
+                        if prefetch:
+                            prefetch['cancelled'] = True
+                        _result = self.request(
+                            response_hook=self._response_hook_json,
+                            error_title='Player request failed',
+                            error_hook=self._player_error_hook,
+                            video_id=video_id,
+                            client_name=_client_name,
+                            has_auth=_has_auth,
+                            visitor_data=visitor_data,
+                            cache=False,
+                            pass_data=True,
+                            raise_exc=False,
+                            **_client
+                        ) or {}
 
                     if not visitor_data:
                         visitor_data = self.json_traverse(
@@ -1904,6 +2390,12 @@ class YouTubePlayerClient(YouTubeDataClient):
                         and video_details.get('isPrivate')):
                     client_data['_auth_required'] = True
 
+        # Discard the responses to any prefetched requests that were not used.
+        # Requests that have already been sent are not aborted, but their
+        # responses are not used.
+        for prefetch in prefetched.values():
+            prefetch['cancelled'] = True
+
         if not responses:
             if _status == 'LIVE_STREAM_OFFLINE':
                 if not _reason:
@@ -1985,26 +2477,16 @@ class YouTubePlayerClient(YouTubeDataClient):
         }
 
         if use_remote_history and auth_client:
-            playback_stats = {
-                'playback_url': 'videostatsPlaybackUrl',
-                'watchtime_url': 'videostatsWatchtimeUrl',
-            }
             playback_tracking = (auth_client
                                  .get('result', {})
                                  .get('playbackTracking', {}))
-            cpn = auth_client.get('_cpn') or self._generate_cpn()
-
-            for key, url_key in playback_stats.items():
-                url = playback_tracking.get(url_key, {}).get('baseUrl')
-                if url and url.startswith('http'):
-                    playback_stats[key] = '&cpn='.join((url, cpn))
-                else:
-                    playback_stats[key] = ''
+            playback_stats = self._get_playback_stats(
+                playback_tracking,
+                auth_client.get('_cpn'),
+            )
         else:
-            playback_stats = {
-                'playback_url': '',
-                'watchtime_url': '',
-            }
+            playback_tracking = None
+            playback_stats = self._get_playback_stats()
 
         if not is_live or was_live:
             subtitles = Subtitles(context, video_id, use_mpd=use_mpd)
@@ -2029,6 +2511,9 @@ class YouTubePlayerClient(YouTubeDataClient):
                 'is_asr': False,
             }
 
+        url_expiry = self._get_stream_url_expiry(responses)
+        manifest = None
+
         # extract adaptive streams and create MPEG-DASH manifest
         if use_mpd and not audio_only:
             video_data, audio_data = self._process_adaptive_streams(
@@ -2037,8 +2522,12 @@ class YouTubePlayerClient(YouTubeDataClient):
                                    if default_lang['original'] == 'und' else
                                    default_lang['original']),
             )
-            manifest_url, main_stream = self._generate_mpd_manifest(
-                video_data, audio_data, subs_data,
+            manifest_url, main_stream, manifest = self._generate_mpd_manifest(
+                video_data,
+                audio_data,
+                subs_data,
+                key=generate_hash(stream_info_params),
+                expiry=url_expiry,
             )
 
             if main_stream:
@@ -2112,6 +2601,47 @@ class YouTubePlayerClient(YouTubeDataClient):
         else:
             raise YouTubeException('No streams found')
 
+        if incognito:
+            return stream_list.values(), yt_item
+
+        # Streams of live and post live content change over time, so are not
+        # reused
+        if url_expiry and not is_live and not post_live:
+            expiry = (url_expiry
+                      - self.STREAM_INFO_EXPIRY_MARGIN
+                      - int(video_details.get('lengthSeconds', 0)))
+        else:
+            expiry = None
+        now = since_epoch()
+        stream_info_cache = self._stream_info_cache
+        for _video_id, cached in tuple(stream_info_cache.items()):
+            if cached['expiry'] <= now:
+                del stream_info_cache[_video_id]
+        if expiry and expiry > now:
+            # Only one set of stream info is kept for each video. The
+            # generated MPD manifest is kept with it, to be stored again when
+            # the stream info is reused, as the httpd may have since evicted
+            # or lost the manifest
+            stream_info_cache[video_id] = {
+                'key': generate_hash(
+                    stream_info_params,
+                    self._visitor_data[visitor_data_key],
+                ),
+                'expiry': expiry,
+                'streams': [
+                    deepcopy({
+                        key: value
+                        for key, value in stream.items()
+                        if key != 'playback_stats'
+                    })
+                    for stream in stream_list.values()
+                ],
+                'playback_tracking': deepcopy(playback_tracking),
+                'yt_item': deepcopy(yt_item),
+                'manifest': manifest if '9999' in stream_list else None,
+            }
+        elif video_id in stream_info_cache:
+            del stream_info_cache[video_id]
         return stream_list.values(), yt_item
 
     def _process_adaptive_streams(self,
@@ -2134,6 +2664,7 @@ class YouTubePlayerClient(YouTubeDataClient):
         allow_spa = 'spa' in stream_features
         allow_ssa = 'ssa' in stream_features
         allow_vr = 'vr' in stream_features
+        alt_sort = 'alt_sort' in stream_features
         prefer_dub = 'prefer_dub' in stream_features
         prefer_auto_dub = 'prefer_auto_dub' in stream_features
         fps_map = (self.INTEGER_FPS_SCALE
@@ -2171,21 +2702,12 @@ class YouTubePlayerClient(YouTubeDataClient):
             log_audio_header = None
             log_video_header = None
 
+            streams = []
+            urls = []
             for stream in stream_data:
-                mime_type = stream.get('mimeType')
-                if not mime_type:
-                    continue
-
-                itag_id = itag = str(stream.get('itag'))
-                if not itag:
-                    continue
-
-                index_range = stream.get('indexRange')
-                if not index_range:
-                    continue
-
-                init_range = stream.get('initRange')
-                if not init_range:
+                if (not stream.get('mimeType')
+                        or not stream.get('indexRange')
+                        or not stream.get('initRange')):
                     continue
 
                 url = stream.get('url')
@@ -2194,6 +2716,23 @@ class YouTubePlayerClient(YouTubeDataClient):
                 if not url:
                     continue
 
+                streams.append(stream)
+                urls.append(unquote(url))
+
+            # Urls of all the streams are rewritten in a single batch, so that
+            # the work common to all the urls is only done once per client
+            urls = self._process_stream_urls(
+                urls,
+                headers=client['headers'],
+                cpn=client.get('_cpn'),
+            )
+
+            for stream, url in zip(streams, urls):
+                mime_type = stream['mimeType']
+                itag_id = itag = str(stream.get('itag'))
+                index_range = stream['indexRange']
+                init_range = stream['initRange']
+
                 mime_type, codecs = unquote(mime_type).split('; ')
                 codecs = codec_re.match(codecs)
                 if codecs:
@@ -2421,18 +2960,36 @@ class YouTubePlayerClient(YouTubeDataClient):
                     if log_video_header is None:
                         log_video_header = debugging
 
-                urls = self._process_url_params(
-                    unquote(url),
-                    stream_proxy=True,
-                    headers=client['headers'],
-                    cpn=client.get('_cpn'),
-                )
-                if not urls:
+                if not url:
                     continue
 
+                biased_bitrate = bitrate * quality_factor_map.get(codec, 1)
+                # Rank of the stream within its groups, computed once here
+                # rather than each time one of its groups is sorted
+                if media_type == 'video':
+                    rank = (
+                        - preferred_codec,
+                        - height
+                        if preferred_codec or not alt_sort else
+                        height,
+                        not is_vr,
+                        not is_3d,
+                        - fps,
+                        - is_hdr,
+                        - biased_bitrate,
+                    )
+                else:
+                    rank = (
+                        - preferred_codec,
+                        not is_spa,
+                        - channels,
+                        - biased_bitrate,
+                        is_drc,
+                    )
+
                 details = {
                     'mimeType': mime_type,
-                    'baseUrl': entity_escape(urls),
+                    'baseUrl': entity_escape(url),
                     'mediaType': media_type,
                     'container': container,
                     'codecs': codecs,
@@ -2443,7 +3000,7 @@ class YouTubePlayerClient(YouTubeDataClient):
                     'height': height,
                     'label': label,
                     'bitrate': bitrate,
-                    'biasedBitrate': bitrate * quality_factor_map.get(codec, 1),
+                    'biasedBitrate': biased_bitrate,
                     # integer round up
                     'duration': -(-int(stream.get('approxDurationMs', 0))
                                   // 1000),
@@ -2465,7 +3022,7 @@ class YouTubePlayerClient(YouTubeDataClient):
                 }
                 mime_group = data.setdefault(mime_group, {})
                 quality_group = data.setdefault(quality_group, {})
-                mime_group[itag] = quality_group[itag] = details
+                mime_group[itag] = quality_group[itag] = (rank, details)
 
                 if log_client:
                     self.log.debug('{_:{_}^100}', _='=', extra=sep)
@@ -2564,32 +3121,9 @@ class YouTubePlayerClient(YouTubeDataClient):
             self.log.debug('No video mime-types found')
             return None, None
 
-        def _stream_sort(stream, alt_sort=('alt_sort' in stream_features)):
-            if not stream:
-                return (1,)
-
-            preferred = stream['preferred_codec']
-            return (
-                - preferred,
-                - stream['height']
-                if preferred or not alt_sort else
-                stream['height'],
-                not stream['projection'],
-                not stream['stereoLayout'],
-                - stream['fps'],
-                - stream['hdr'],
-                - stream['biasedBitrate'],
-            ) if stream['mediaType'] == 'video' else (
-                - preferred,
-                not stream['spatial'],
-                - stream['channels'],
-                - stream['biasedBitrate'],
-                stream['drc'],
-            )
-
         def _group_sort(item):
             group, streams = item
-            main_stream = streams[0]
+            rank, main_stream = streams[0]
 
             key = (
                 group[0] != main_stream['mimeType'],
@@ -2600,32 +3134,42 @@ class YouTubePlayerClient(YouTubeDataClient):
                 main_stream['langName'],
                 - main_stream['roleOrder'],
             )
-            return key + _stream_sort(main_stream)
+            return key + rank
+
+        rank_getter = itemgetter(0)
 
-        video_data = sorted((
-            (group, sorted(streams.values(), key=_stream_sort))
-            for group, streams in video_data.items()
-        ), key=_group_sort)
+        video_data = [
+            (group, [stream for _, stream in streams])
+            for group, streams in sorted((
+                (group, sorted(streams.values(), key=rank_getter))
+                for group, streams in video_data.items()
+            ), key=_group_sort)
+        ]
 
-        audio_data = sorted((
-            (group, sorted(streams.values(), key=_stream_sort))
-            for group, streams in audio_data.items()
-        ), key=_group_sort)
+        audio_data = [
+            (group, [stream for _, stream in streams])
+            for group, streams in sorted((
+                (group, sorted(streams.values(), key=rank_getter))
+                for group, streams in audio_data.items()
+            ), key=_group_sort)
+        ]
 
         return video_data, audio_data
 
     def _generate_mpd_manifest(self,
                                video_data,
                                audio_data,
-                               subs_data):
+                               subs_data,
+                               key=None,
+                               expiry=None):
         # Following line can be uncommented if needed to use mpd for audio only
         # if (not video_data and not self._audio_only) or not audio_data:
         if not video_data or not audio_data:
-            return None, None
+            return None, None, None
 
         if not self.BASE_PATH:
             self.log.error_trace('Unable to access temp directory')
-            return None, None
+            return None, None, None
 
         def _filter_group(previous_group, previous_stream, item):
             skip_group = True
@@ -2704,6 +3248,11 @@ class YouTubePlayerClient(YouTubeDataClient):
             '\t<Period>\n'
         ]
 
+        adaptation_set = self.MPD_ADAPTATION_SET
+        audio_representation = self.MPD_AUDIO_REPRESENTATION
+        video_representation = self.MPD_VIDEO_REPRESENTATIONS[frame_rate_hint]
+        subtitle_adaptation_set = self.MPD_SUBTITLE_ADAPTATION_SET
+
         set_id = 0
         group = stream = None
         languages = set()
@@ -2757,106 +3306,24 @@ class YouTubePlayerClient(YouTubeDataClient):
             languages.add(language)
             roles.add(role)
 
-            output.extend((
-                '\t\t<AdaptationSet'
-                    ' subsegmentAlignment="true"'
-                    ' subsegmentStartsWithSAP="1"'
-                    ' bitstreamSwitching="true"'
-                    ' id="', str(set_id), '"'
-                    ' contentType="', media_type, '"'
-                    ' mimeType="', mime_type, '"'
-                    ' lang="', language, '"'
-                    # name attribute is ISA specific and does not exist in the
-                    # MPD spec. Should be a child Label element instead
-                    ' name="[B]', label, '[/B]"'
-                    # original / default / impaired are ISA specific attributes
-                    ' original="', VALUE_TO_STR[original], '"'
-                    ' default="', VALUE_TO_STR[default], '"'
-                    ' impaired="', VALUE_TO_STR[impaired], '"'
-                    '>\n'
-                # AdaptationSet Label element not currently used by ISA
-                '\t\t\t<Label>', label, '</Label>\n'
-                '\t\t\t<Role'
-                    ' schemeIdUri="urn:mpeg:dash:role:2011"'
-                    ' value="', role, '"'
-                    '/>\n'
+            output.append(adaptation_set.render(
+                stream,
+                set_id,
+                label,
+                VALUE_TO_STR[original],
+                VALUE_TO_STR[default],
+                VALUE_TO_STR[impaired],
+                role,
             ))
 
+            representation = (audio_representation
+                              if media_type == 'audio' else
+                              video_representation)
             num_streams = len(streams)
-            if media_type == 'audio':
-                output.extend([(
-                    '\t\t\t<Representation'
-                        ' id="{id}"'
-                        ' codecs="{codecs}"'
-                        ' mimeType="{mimeType}"'
-                        ' bandwidth="{bitrate}"'
-                        ' sampleRate="{sampleRate}"'
-                        ' numChannels="{channels}"'
-                        # quality and priority attributes are not used by ISA
-                        ' qualityRanking="{quality}"'
-                        ' selectionPriority="{priority}"'
-                        '>\n'
-                    '\t\t\t\t<AudioChannelConfiguration'
-                        ' schemeIdUri="urn:mpeg:dash:23003:3:audio_channel_configuration:2011"'
-                        ' value="{channels}"'
-                        '/>\n'
-                    # Representation Label element is not used by ISA
-                    '\t\t\t\t<Label>{label}</Label>\n'
-                    '\t\t\t\t<BaseURL>{baseUrl}</BaseURL>\n'
-                    # '\t\t\t\t<BaseURL>{url}</BaseURL>\n'
-                    # + ''.join([''.join([
-                    # '\t\t\t\t<BaseURL>', entity_escape(url), '</BaseURL>\n',
-                    # ]) for url in stream['baseUrl'] if url]) +
-                    '\t\t\t\t<SegmentBase indexRange="{indexRange}" timescale="1000">\n'
-                    '\t\t\t\t\t<Initialization range="{initRange}"/>\n'
-                    '\t\t\t\t</SegmentBase>\n'
-                    '\t\t\t</Representation>\n'
-                ).format(
-                    quality=(idx + 1),
-                    priority=(num_streams - idx),
-                    # url=entity_escape(url),
-                    **stream
-                )
-                    for idx, stream in enumerate(streams)
-                    # for url in stream['baseUrl']
-                    # if url
-                ])
-
-            elif media_type == 'video':
-                output.extend([(
-                    '\t\t\t<Representation'
-                        ' id="{id}"'
-                        ' codecs="{codecs}"'
-                        ' mimeType="{mimeType}"'
-                        ' bandwidth="{bitrate}"'
-                        ' width="{width}"'
-                        ' height="{height}"' +
-                        (' frameRate="{frameRate}"' if frame_rate_hint else '') +
-                        # quality and priority attributes are not used by ISA
-                        ' qualityRanking="{quality}"'
-                        ' selectionPriority="{priority}"'
-                        '>\n'
-                    # Representation Label element is not used by ISA
-                    '\t\t\t\t<Label>{label}</Label>\n'
-                    '\t\t\t\t<BaseURL>{baseUrl}</BaseURL>\n'
-                    # '\t\t\t\t<BaseURL>{url}</BaseURL>\n'
-                    # + ''.join([''.join([
-                    # '\t\t\t\t<BaseURL>', entity_escape(url), '</BaseURL>\n',
-                    # ]) for url in stream['baseUrl'] if url]) +
-                    '\t\t\t\t<SegmentBase indexRange="{indexRange}">\n'
-                    '\t\t\t\t\t<Initialization range="{initRange}"/>\n'
-                    '\t\t\t\t</SegmentBase>\n'
-                    '\t\t\t</Representation>\n'
-                ).format(
-                    quality=(idx + 1),
-                    priority=(num_streams - idx),
-                    # url=entity_escape(url),
-                    **stream
-                )
-                    for idx, stream in enumerate(streams)
-                    # for url in stream['baseUrl']
-                    # if url
-                ])
+            output.extend([
+                representation.render(stream, idx + 1, num_streams - idx)
+                for idx, stream in enumerate(streams)
+            ])
 
             output.append('\t\t</AdaptationSet>\n')
             set_id += 1
@@ -2881,35 +3348,14 @@ class YouTubePlayerClient(YouTubeDataClient):
                 if not url:
                     continue
 
-                output.extend((
-                    '\t\t<AdaptationSet'
-                        ' id="', str(set_id), '"'
-                        ' contentType="text"'
-                        ' mimeType="', subtitle['mime_type'], '"'
-                        ' lang="', lang_code, '"'
-                        # name attribute is ISA specific and does not exist in
-                        # the MPD spec. Should be a child Label element instead
-                        ' name="[B]', label, '[/B]"'
-                        # original / default are ISA specific attributes
-                        ' original="', VALUE_TO_STR[subtitle['original']], '"'
-                        ' default="', VALUE_TO_STR[subtitle['default']], '"'
-                        '>\n'
-                    # AdaptationSet Label element not currently used by ISA
-                    '\t\t\t<Label>', label, '</Label>\n'
-                    '\t\t\t<Role'
-                        ' schemeIdUri="urn:mpeg:dash:role:2011"'
-                        ' value="subtitle"'
-                        '/>\n'
-                    '\t\t\t<Representation'
-                        ' id="subs_', kind, '"'
-                        ' codecs="', subtitle['codec'], '"'
-                        ' mimeType="', subtitle['mime_type'], '"'
-                        # unsure about what value to use for bandwidth
-                        # ' bandwidth="0"'
-                        '>\n'
-                    '\t\t\t\t<BaseURL>', url, '</BaseURL>\n'
-                    '\t\t\t</Representation>\n'
-                    '\t\t</AdaptationSet>\n'
+                output.append(subtitle_adaptation_set.render(
+                    subtitle,
+                    set_id,
+                    label,
+                    VALUE_TO_STR[subtitle['original']],
+                    VALUE_TO_STR[subtitle['default']],
+                    kind,
+                    url,
                 ))
                 set_id += 1
 
@@ -2922,20 +3368,58 @@ class YouTubePlayerClient(YouTubeDataClient):
         if roles.difference({'', 'main', 'dub'}):
             main_stream['multi_audio'] = True
 
-        filename = '.'.join((self.video_id, 'mpd'))
-        filepath = os_path.join(self.BASE_PATH, filename)
-        try:
-            with xbmcvfs.File(filepath, 'w') as mpd_file:
-                success = mpd_file.write(output)
-        except (IOError, OSError):
-            self.log.exception(('File write failed', 'File: %s'), filepath)
+        if key:
+            filename = '.'.join((self.video_id, key, 'mpd'))
+        else:
+            filename = '.'.join((self.video_id, 'mpd'))
+        manifest = {
+            'filename': filename,
+            'output': output,
+            'expiry': expiry,
+        }
+        manifest_url = self._store_mpd_manifest(**manifest)
+        if manifest_url:
+            return manifest_url, main_stream, manifest
+        return None, None, None
+
+    def _store_mpd_manifest(self, filename, output, expiry=None):
+        context = self._context
+        netloc = get_connect_address(context, as_netloc=True)
+
+        # The manifest is sent to the httpd, running in the service, to be
+        # served from memory. It is only written to the temp directory, to be
+        # served from there instead, if the httpd could not store it.
+        query = {'file': filename}
+        if expiry:
+            query['expires'] = expiry
+        response = self.request(
+            urlunsplit(('http', netloc, PATHS.MPD, urlencode(query), '')),
+            method='POST',
+            data=output.encode('utf-8'),
+            headers={'Content-Type': 'application/dash+xml'},
+            cache=False,
+        )
+        if response is not None:
+            with response:
+                success = response.status_code == 201
+        else:
             success = False
+
+        if not success:
+            filepath = os_path.join(self.BASE_PATH, filename)
+            try:
+                with xbmcvfs.File(filepath, 'w') as mpd_file:
+                    success = mpd_file.write(output)
+            except (IOError, OSError):
+                self.log.exception(('File write failed', 'File: %s'),
+                                   filepath)
+                success = False
         if success:
             return urlunsplit((
                 'http',
-                get_connect_address(context, as_netloc=True),
+                netloc,
                 PATHS.MPD,
                 urlencode({'file': filename}),
                 '',
-            )), main_stream
-        return None, None
+            ))
+        return None
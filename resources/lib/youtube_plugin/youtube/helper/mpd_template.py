@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+
+    Copyright (C) 2025 plugin.video.youtube
+
+    SPDX-License-Identifier: GPL-2.0-only
+    See LICENSES/GPL-2.0-only for more information.
+"""
+
+from __future__ import absolute_import, division, unicode_literals
+
+from operator import itemgetter
+from string import Formatter
+
+
+class MPDTemplate(object):
+    """
+    MPD fragment template, using str.format style {field} placeholders,
+    compiled once to a %-style format string and itemgetters of the values
+    to substitute. Fields named in extra_fields are substituted from the
+    positional values passed to render, all others from the mapping.
+    """
+
+    def __init__(self, template, extra_fields=()):
+        parts = []
+        fields = []
+        placeholders = []
+        for literal, field, _, _ in Formatter().parse(template):
+            parts.append(literal.replace('%', '%%'))
+            if field is None:
+                continue
+            parts.append('%s')
+            if field in extra_fields:
+                placeholders.append((True, extra_fields.index(field)))
+            else:
+                placeholders.append((False, len(fields)))
+                fields.append(field)
+
+        self._format = ''.join(parts)
+        self._getter = self._itemgetter(fields)
+        # Values from the mapping are followed by the positional values, then
+        # reordered to match the order of the placeholders in the template
+        self._order = self._itemgetter([
+            len(fields) + idx if is_extra else idx
+            for is_extra, idx in placeholders
+        ])
+
+    @staticmethod
+    def _itemgetter(items):
+        if len(items) > 1:
+            return itemgetter(*items)
+        if items:
+            item = items[0]
+            return lambda values: (values[item],)
+        return lambda values: ()
+
+    def render(self, mapping, *extra):
+        return self._format % self._order(self._getter(mapping) + extra)
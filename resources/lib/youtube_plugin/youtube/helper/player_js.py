@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+
+    Copyright (C) 2025 plugin.video.youtube
+
+    SPDX-License-Identifier: GPL-2.0-only
+    See LICENSES/GPL-2.0-only for more information.
+"""
+
+from __future__ import absolute_import, division, unicode_literals
+
+import os
+import zlib
+from mmap import ACCESS_READ, mmap
+from re import compile as re_compile
+
+from ...kodion import logging
+from ...kodion.compatibility import replace_file, xbmcvfs
+from ...kodion.constants import DATA_PATH
+from ...kodion.utils.file_system import make_dirs
+from ...kodion.utils.methods import generate_hash
+
+
+class PlayerJS(object):
+    """
+    Player JavaScript (base.js) for a single player version, stored as a
+    compressed file on disk rather than in the data cache
+    """
+    log = logging.getLogger(__name__)
+
+    # Directory is only created when the first player version is saved
+    BASE_PATH = xbmcvfs.translatePath('/'.join((DATA_PATH, 'player_js', '')))
+    EXTENSION = '.js.z'
+    MAX_VERSIONS = 3
+
+    _VERSION_RE = re_compile(r'/player/(?P<version>[\w-]+)/')
+
+    def __init__(self, url):
+        match = self._VERSION_RE.search(url)
+        version = match.group('version') if match else generate_hash(url)
+
+        self.url = url
+        self.version = version
+        self.filepath = os.path.join(self.BASE_PATH, version + self.EXTENSION)
+        self._javascript = None
+
+    def exists(self):
+        return os.path.isfile(self.filepath)
+
+    def load(self):
+        javascript = self._javascript
+        if javascript is not None:
+            return javascript
+
+        filepath = self.filepath
+        try:
+            with open(filepath, 'rb') as js_file:
+                # mmap is not a context manager on Python 2
+                data = mmap(js_file.fileno(), 0, access=ACCESS_READ)
+                try:
+                    javascript = zlib.decompress(data)
+                finally:
+                    data.close()
+            javascript = javascript.decode('utf-8')
+            # Update modified time so that the least recently used player
+            # versions are pruned first
+            os.utime(filepath, None)
+        except (IOError, OSError, ValueError, zlib.error):
+            self.log.exception(('Failed to read player JavaScript',
+                                'Path: %r'),
+                               filepath)
+            return None
+
+        self._javascript = javascript
+        return javascript
+
+    def save(self, javascript):
+        self._javascript = javascript
+
+        if not make_dirs(self.BASE_PATH):
+            return False
+        filepath = self.filepath
+        temp_filepath = filepath + '.tmp'
+        try:
+            with open(temp_filepath, 'wb') as js_file:
+                js_file.write(zlib.compress(javascript.encode('utf-8')))
+            replace_file(temp_filepath, filepath)
+        except (IOError, OSError):
+            self.log.exception(('Failed to write player JavaScript',
+                                'Path: %r'),
+                               filepath)
+            return False
+
+        self.prune()
+        return True
+
+    @classmethod
+    def is_empty(cls):
+        base_path = cls.BASE_PATH
+        try:
+            return not any(filename.endswith(cls.EXTENSION)
+                           for filename in os.listdir(base_path))
+        except OSError:
+            return not os.path.isdir(base_path)
+
+    @classmethod
+    def prune(cls, max_versions=None):
+        base_path = cls.BASE_PATH
+        if max_versions is None:
+            max_versions = cls.MAX_VERSIONS
+        try:
+            filepaths = [
+                os.path.join(base_path, filename)
+                for filename in os.listdir(base_path)
+                if filename.endswith(cls.EXTENSION)
+            ]
+            filepaths.sort(key=os.path.getmtime, reverse=True)
+        except OSError:
+            return
+
+        for filepath in filepaths[max_versions:]:
+            try:
+                os.remove(filepath)
+            except OSError:
+                pass
@@ -237,9 +237,21 @@ class CalculateN(object):
         (r"for\(var \w=\w\.length;\w;\)\w\.push\(\w\.splice\(--\w,1\)\[0\]\)}", throttling_reverse),  # noqa:E501
     )
 
-    def __init__(self, js):
-        self.calculated_n = None
-        self.throttling_function_code = self.get_throttling_function_code(js)
+    THROTTLING_FUNCTIONS = {
+        fn.__name__: fn for _, fn in MAPPING_FUNC_PATTERNS
+    }
+
+    # Element types of the compiled 'c' array template
+    ELEMENT_VALUE = 0
+    ELEMENT_FUNCTION = 1
+    ELEMENT_ARRAY = 2
+    ELEMENT_N = 3
+
+    def __init__(self, context, player_js):
+        self._context = context
+        self._player_js = player_js
+        self._plan = None
+        self._calculated = {}
 
     @staticmethod
     def get_throttling_function_code(js):
@@ -250,6 +262,10 @@ class CalculateN(object):
         :returns:
             The JS code of the function as a string, with linebreaks removed.
         """
+        if not js:
+            logging.debug('player JavaScript not available')
+            return None
+
         # This pattern is only present in the throttling function code.
         fiduciary_index = js.find('enhanced_except_')
         if fiduciary_index == -1:
@@ -345,15 +361,15 @@ class CalculateN(object):
                     yield piece
 
     @classmethod
-    def get_throttling_function_array(cls, mutable_n_list, raw_code):
+    def get_throttling_function_template(cls, raw_code):
         """Extract the 'c' array that comes with values and functions
-        used to unscramble the initial 'n' value.
-        :param list mutable_n_list:
-            Mutable list with the characters of the 'initial n' value.
+        used to unscramble the initial 'n' value, as a template that can be
+        cached and then used to build the array for each 'n' value.
         :param str raw_code:
             The response from get_throttling_function_code(js).
         :returns:
-            The array of various integers, arrays, and functions.
+            A list of (element type, value) tuples, one for each element of
+            the 'c' array, where functions are referenced by name.
         """
 
         array_start_pattern = ",c=["
@@ -371,10 +387,10 @@ class CalculateN(object):
 
         array_code = raw_code[array_start_index:array_end_index]
 
-        converted_array = []
+        template = []
         for el in cls.array_reverse_split_gen(array_code):
             try:
-                converted_array.append(int(el))
+                template.append((cls.ELEMENT_VALUE, int(el)))
                 continue
             except ValueError:
                 # Not an integer value.
@@ -382,80 +398,158 @@ class CalculateN(object):
 
             if el == 'null':
                 # Replace null elements in this array with references to itself.
-                converted_array.append(converted_array)
+                template.append((cls.ELEMENT_ARRAY, None))
                 continue
 
             if el[0] == '"' or el[0] == "'":
                 # Strip quotation marks in string elements.
-                converted_array.append(el.strip('\'"'))
+                template.append((cls.ELEMENT_VALUE, el.strip('\'"')))
                 continue
 
             if el.startswith('function'):
-                found = False
                 for pattern, fn in cls.MAPPING_FUNC_PATTERNS:
                     if re.search(pattern, el):
-                        converted_array.append(fn)
-                        found = True
+                        template.append((cls.ELEMENT_FUNCTION, fn.__name__))
                         break
                 else:
                     logging.debug('unknown mapping function: %s', el)
-                if found:
-                    continue
+                    template.append((cls.ELEMENT_N, None))
+                continue
 
             # Probably the single 'b' references (references to the list with
             # initial 'n' characters).
-            converted_array.append(mutable_n_list)
+            template.append((cls.ELEMENT_N, None))
 
-        # Reverse in-place (instead of using a [::-1] slice), important as
-        # there are references to this array within itself.
-        converted_array.reverse()
-        return converted_array
+        template.reverse()
+        return template
 
-    def calculate_n(self, mutable_n_list):
-        """Converts n to the correct value to prevent throttling.
+    @classmethod
+    def get_throttling_function_array(cls, mutable_n_list, template):
+        """Build the 'c' array from a template.
         :param list mutable_n_list:
-            A list with the characters of the initial 'n' string. This list
-            will be modified by this function.
+            Mutable list with the characters of the 'initial n' value.
+        :param list template:
+            The response from get_throttling_function_template(raw_code).
+        :returns:
+            The array of various integers, arrays, and functions.
+        """
+        functions = cls.THROTTLING_FUNCTIONS
+        array = []
+        for element_type, value in template:
+            if element_type == cls.ELEMENT_VALUE:
+                array.append(value)
+            elif element_type == cls.ELEMENT_FUNCTION:
+                array.append(functions[value])
+            elif element_type == cls.ELEMENT_ARRAY:
+                array.append(array)
+            else:
+                array.append(mutable_n_list)
+        return array
+
+    def _compile_plan(self, version):
+        """Extract the 'c' array template and the throttling plan from the
+        player JavaScript, so that the JavaScript only needs to be parsed once
+        for each player version.
+        :param str version:
+            Player version, used as the cache key for the compiled plan.
+        :returns:
+            A dict with the 'c' array template and the list of steps of the
+            throttling plan as tuples of integer indices, or None on failure.
+        """
+        player_js = self._player_js
+        raw_code = self.get_throttling_function_code(
+            player_js.load() if player_js else None
+        )
+        if not raw_code:
+            return None
+
+        try:
+            template = self.get_throttling_function_template(raw_code)
+            steps = [
+                tuple(map(int, step))
+                for step in self.get_throttling_plan_gen(raw_code)
+            ]
+        except Exception:
+            logging.exception('Error compiling "n" plan for player: %s',
+                              version)
+            return None
+
+        for step in steps:
+            if template[step[0]][0] != self.ELEMENT_FUNCTION:
+                logging.debug(('%s is not callable', 'Throttling array:', '%r'),
+                              template[step[0]],
+                              template)
+                return None
+
+        return {
+            'template': template,
+            'steps': steps,
+        }
+
+    def get_plan(self):
+        plan = self._plan
+        if plan is None:
+            if self._player_js:
+                function_cache = self._context.get_function_cache()
+                plan = function_cache.run(
+                    self._compile_plan,
+                    function_cache.ONE_DAY,
+                    version=self._player_js.version,
+                )
+            self._plan = plan = plan or False
+        return plan
+
+    def calculate_n(self, initial_n):
+        """Converts n to the correct value to prevent throttling.
+        :param str initial_n:
+            The initial 'n' value from the video stream URL.
         :returns:
             The new value of 'n' as a string, to replace the value in the
             video stream URL.
         """
-        if self.calculated_n:
-            logging.debug('Reusing calculated "n": %s', self.calculated_n)
-            return self.calculated_n
+        calculated_n = self._calculated.get(initial_n)
+        if calculated_n:
+            logging.debug('Reusing calculated "n": %s', calculated_n)
+            return calculated_n
 
-        if not self.throttling_function_code:
+        plan = self.get_plan()
+        if not plan:
             return None
 
+        data_cache = self._context.get_data_cache()
+        cache_id = '.'.join(('nsig', self._player_js.version, initial_n))
+        calculated_n = data_cache.get_item(cache_id, data_cache.ONE_HOUR * 4)
+        calculated_n = calculated_n and calculated_n.get('n')
+        if calculated_n:
+            self._calculated[initial_n] = calculated_n
+            return calculated_n
+
         logging.debug('Attempting to calculate "n" from initial: %s',
-                      ''.join(mutable_n_list))
+                      initial_n)
 
         # For each step in the plan, get the first item of the step as the
         # index of the function to call, and then call that function using
         # the throttling array elements indexed by the remaining step items.
+        mutable_n_list = list(initial_n)
         try:
             throttling_array = self.get_throttling_function_array(
                 mutable_n_list,
-                self.throttling_function_code
+                plan['template'],
             )
-            for step in self.get_throttling_plan_gen(self.throttling_function_code):
-                curr_func = throttling_array[int(step[0])]
+            for step in plan['steps']:
+                curr_func = throttling_array[step[0]]
                 if not callable(curr_func):
                     logging.debug('%s is not callable', curr_func)
                     logging.debug(('Throttling array:', '%r'), throttling_array)
                     return None
 
-                first_arg = throttling_array[int(step[1])]
-
-                if len(step) == 2:
-                    curr_func(first_arg)
-                elif len(step) == 3:
-                    second_arg = throttling_array[int(step[2])]
-                    curr_func(first_arg, second_arg)
+                curr_func(*[throttling_array[index] for index in step[1:]])
         except Exception:
             logging.exception('Error calculating "n"')
             return None
 
-        self.calculated_n = ''.join(mutable_n_list)
-        logging.debug('Calculated "n": %s', self.calculated_n)
-        return self.calculated_n
+        calculated_n = ''.join(mutable_n_list)
+        logging.debug('Calculated "n": %s', calculated_n)
+        self._calculated[initial_n] = calculated_n
+        data_cache.set_item(cache_id, {'n': calculated_n}, defer=True)
+        return calculated_n
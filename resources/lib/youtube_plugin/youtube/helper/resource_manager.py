@@ -10,16 +10,25 @@
 
 from __future__ import absolute_import, division, unicode_literals
 
+from collections import deque
 from itertools import chain
+from threading import Condition, Thread
 
 from .utils import get_thumbnail
 from ...kodion import logging
-from ...kodion.constants import CHANNEL_ID, FANART_TYPE, INCOGNITO
+from ...kodion.constants import (
+    CHANNEL_ID,
+    FANART_TYPE,
+    INCOGNITO,
+    REFRESH_RESOURCES,
+)
 
 
 class ResourceManager(object):
     log = logging.getLogger(__name__)
 
+    MAX_WORKERS = 4
+
     def __init__(self, provider, context, client, progress_dialog=None):
         self._provider = provider
         self._context = context
@@ -49,16 +58,190 @@ class ResourceManager(object):
             old_progress_dialog.close()
         self._progress_dialog = progress_dialog
 
-    def _list_batch(self, input_list, n=50):
+    @staticmethod
+    def _list_batch(input_list, n=50):
         if not isinstance(input_list, (list, tuple)):
             input_list = list(input_list)
         num_items = len(input_list)
         for i in range(0, num_items, n):
             yield input_list[i:i + n]
-            if self._progress_dialog:
-                self._progress_dialog.update(steps=min(n, num_items))
 
-    def get_channels(self, ids, suppress_errors=False, defer_cache=False):
+    def _get_batches(self, func, ids, *args, **kwargs):
+        """
+        Requests ids in batches of 50, using a bounded number of worker
+        threads if more than one batch is required.
+        Returns a tuple of the list of responses, in the same order as the
+        requested ids, and the set of ids from batches that failed.
+        Exceptions from a failed batch are only re-raised if all batches fail.
+        """
+        batches = list(self._list_batch(ids, n=50))
+        num_batches = len(batches)
+        results = [None] * num_batches
+        failed = set()
+        error = None
+        progress_dialog = self._progress_dialog
+
+        if num_batches > 1:
+            batch_kwargs = dict(kwargs, notify=False)
+        else:
+            batch_kwargs = kwargs
+        completed = self._run_batches(func, batches, *args, **batch_kwargs)
+
+        for idx, result, exc in completed:
+            batch = batches[idx]
+            if exc:
+                error = error or exc
+            if result:
+                results[idx] = result
+            else:
+                failed.update(batch)
+            if progress_dialog:
+                progress_dialog.update(steps=len(batch))
+
+        # Errors are not notified by concurrent batch requests, to avoid
+        # showing the same error for each batch. Instead the first error is
+        # notified once.
+        if error and num_batches > 1 and kwargs.get('notify'):
+            self._client.notify_request_error(error)
+
+        if error and len(failed) == len(set(ids)):
+            raise error
+        return results, failed
+
+    def _run_batch(self, func, idx, batch, *args, **kwargs):
+        try:
+            return idx, func(batch, *args, **kwargs), None
+        except Exception as exc:
+            self.log.exception(('Batch request failed',
+                                'IDs: {ids}'),
+                               ids=batch)
+            return idx, None, exc
+
+    def _run_batches(self, func, batches, *args, **kwargs):
+        """
+        Generator of (index, result, exception) tuples of the batches, in the
+        order the batch requests complete. Batches are requested concurrently
+        by up to MAX_WORKERS threads.
+        """
+        num_batches = len(batches)
+        if num_batches == 1:
+            yield self._run_batch(func, 0, batches[0], *args, **kwargs)
+            return
+
+        pending = iter(enumerate(batches))
+        completed = deque()
+        condition = Condition()
+
+        def _worker():
+            while 1:
+                with condition:
+                    idx, batch = next(pending, (None, None))
+                if batch is None:
+                    return
+                result = self._run_batch(func, idx, batch, *args, **kwargs)
+                with condition:
+                    completed.append(result)
+                    condition.notify()
+
+        for _ in range(min(self.MAX_WORKERS, num_batches)):
+            thread = Thread(target=_worker)
+            thread.daemon = True
+            thread.start()
+
+        for _ in range(num_batches):
+            with condition:
+                while not completed:
+                    condition.wait()
+                result = completed.popleft()
+            yield result
+
+    def _get_cached_items(self, resource_type, ids, seconds, max_stale=None):
+        """
+        Returns cached items not older than seconds.
+        If max_stale is provided, cached items older than seconds, but not
+        older than max_stale, are also returned and are refreshed in the
+        background.
+        """
+        data_cache = self._context.get_data_cache()
+        if not seconds or not max_stale or max_stale <= seconds:
+            return data_cache.get_items(ids, seconds)
+
+        result = data_cache.get_items(ids, max_stale, values_only=False)
+        stale_ids = [
+            id_
+            for id_, item in result.items()
+            if item['age'] > seconds
+        ]
+        if stale_ids:
+            self.log.debugging and self.log.debug(
+                ('Using stale cached data for {num} {resource_type}',
+                 'IDs: {ids}'),
+                num=len(stale_ids),
+                resource_type=resource_type,
+                ids=stale_ids,
+            )
+            self._refresh_stale_items(resource_type, stale_ids)
+        return {
+            id_: item['value']
+            for id_, item in result.items()
+        }
+
+    def _refresh_stale_items(self, resource_type, ids):
+        if self._incognito:
+            return
+        # Refresh in the service if it is running, otherwise refresh in a
+        # non-daemon thread that will complete before the interpreter exits
+        try:
+            self._context.ipc_exec(
+                REFRESH_RESOURCES,
+                payload={
+                    'resource_type': resource_type,
+                    'ids': ids,
+                },
+                raise_exc=True,
+            )
+        except RuntimeError:
+            thread = Thread(target=self.refresh_items,
+                            args=(resource_type, ids))
+            thread.start()
+
+    def refresh_items(self, resource_type, ids):
+        client = self._client
+        if resource_type == 'channels':
+            func = client.get_channels
+            kwargs = {}
+        elif resource_type == 'playlists':
+            func = client.get_playlists
+            kwargs = {}
+        elif resource_type == 'videos':
+            func = client.get_videos
+            kwargs = {'live_details': True}
+        else:
+            return None
+
+        new_data = {}
+        for list_of_50 in self._list_batch(ids, n=50):
+            json_data = func(list_of_50,
+                             max_results=50,
+                             notify=False,
+                             raise_exc=False,
+                             **kwargs)
+            if not json_data:
+                continue
+            new_data.update({
+                yt_item['id']: yt_item
+                for yt_item in json_data.get('items', [])
+                if yt_item
+            })
+
+        self.cache_data(new_data)
+        return new_data
+
+    def get_channels(self,
+                     ids,
+                     suppress_errors=False,
+                     defer_cache=False,
+                     max_stale=None):
         context = self._context
         client = self._client
 
@@ -100,10 +283,11 @@ class ResourceManager(object):
         if refresh or not ids:
             result = {}
         else:
-            data_cache = context.get_data_cache()
-            result = data_cache.get_items(
+            result = self._get_cached_items(
+                'channels',
                 ids,
-                None if forced_cache else data_cache.ONE_DAY,
+                None if forced_cache else context.get_data_cache().ONE_DAY,
+                max_stale,
             )
         to_update = (
             []
@@ -127,15 +311,18 @@ class ResourceManager(object):
 
         if to_update:
             notify_and_raise = not suppress_errors
-            new_data = [client.get_channels(list_of_50,
-                                            max_results=50,
-                                            notify=notify_and_raise,
-                                            raise_exc=notify_and_raise)
-                        for list_of_50 in self._list_batch(to_update, n=50)]
+            new_data, _ = self._get_batches(
+                client.get_channels,
+                to_update,
+                max_results=50,
+                notify=notify_and_raise,
+                raise_exc=notify_and_raise,
+            )
             if any(new_data):
                 new_data = {
                     yt_item['id']: yt_item
                     for batch in new_data
+                    if batch
                     for yt_item in batch.get('items', [])
                     if yt_item
                 }
@@ -169,7 +356,8 @@ class ResourceManager(object):
                          ids,
                          channel_data=None,
                          suppress_errors=False,
-                         defer_cache=False):
+                         defer_cache=False,
+                         max_stale=None):
         context = self._context
         client = self._client
 
@@ -196,10 +384,11 @@ class ResourceManager(object):
                          or not result[id_]
                          or result[id_].get('_partial'))]
         if to_check:
-            data_cache = context.get_data_cache()
-            result.update(data_cache.get_items(
+            result.update(self._get_cached_items(
+                'channels',
                 to_check,
-                None if forced_cache else data_cache.ONE_MONTH,
+                None if forced_cache else context.get_data_cache().ONE_MONTH,
+                max_stale,
             ))
         to_update = (
             []
@@ -223,15 +412,18 @@ class ResourceManager(object):
 
         if to_update:
             notify_and_raise = not suppress_errors
-            new_data = [client.get_channels(list_of_50,
-                                            max_results=50,
-                                            notify=notify_and_raise,
-                                            raise_exc=notify_and_raise)
-                        for list_of_50 in self._list_batch(to_update, n=50)]
+            new_data, _ = self._get_batches(
+                client.get_channels,
+                to_update,
+                max_results=50,
+                notify=notify_and_raise,
+                raise_exc=notify_and_raise,
+            )
             if any(new_data):
                 new_data = {
                     yt_item['id']: yt_item
                     for batch in new_data
+                    if batch
                     for yt_item in batch.get('items', [])
                     if yt_item
                 }
@@ -291,7 +483,11 @@ class ResourceManager(object):
 
         return result
 
-    def get_playlists(self, ids, suppress_errors=False, defer_cache=False):
+    def get_playlists(self,
+                      ids,
+                      suppress_errors=False,
+                      defer_cache=False,
+                      max_stale=None):
         ids = tuple(ids)
 
         context = self._context
@@ -312,10 +508,11 @@ class ResourceManager(object):
         if refresh or not ids:
             result = {}
         else:
-            data_cache = context.get_data_cache()
-            result = data_cache.get_items(
+            result = self._get_cached_items(
+                'playlists',
                 ids,
-                None if forced_cache else data_cache.ONE_DAY,
+                None if forced_cache else context.get_data_cache().ONE_DAY,
+                max_stale,
             )
         to_update = (
             []
@@ -339,15 +536,18 @@ class ResourceManager(object):
 
         if to_update:
             notify_and_raise = not suppress_errors
-            new_data = [client.get_playlists(list_of_50,
-                                             max_results=50,
-                                             notify=notify_and_raise,
-                                             raise_exc=notify_and_raise)
-                        for list_of_50 in self._list_batch(to_update, n=50)]
+            new_data, _ = self._get_batches(
+                client.get_playlists,
+                to_update,
+                max_results=50,
+                notify=notify_and_raise,
+                raise_exc=notify_and_raise,
+            )
             if any(new_data):
                 new_data = {
                     yt_item['id']: yt_item
                     for batch in new_data
+                    if batch
                     for yt_item in batch.get('items', [])
                     if yt_item
                 }
@@ -580,7 +780,8 @@ class ResourceManager(object):
                    live_details=False,
                    suppress_errors=False,
                    defer_cache=False,
-                   yt_items_dict=None):
+                   yt_items_dict=None,
+                   max_stale=None):
         ids = tuple(ids)
 
         context = self._context
@@ -601,10 +802,11 @@ class ResourceManager(object):
         if refresh or not ids:
             result = {}
         else:
-            data_cache = context.get_data_cache()
-            result = data_cache.get_items(
+            result = self._get_cached_items(
+                'videos',
                 ids,
-                None if forced_cache else data_cache.ONE_MONTH,
+                None if forced_cache else context.get_data_cache().ONE_MONTH,
+                max_stale,
             )
         to_update = (
             []
@@ -631,16 +833,19 @@ class ResourceManager(object):
 
         if to_update:
             notify_and_raise = not suppress_errors
-            new_data = [client.get_videos(list_of_50,
-                                          live_details,
-                                          max_results=50,
-                                          notify=notify_and_raise,
-                                          raise_exc=notify_and_raise)
-                        for list_of_50 in self._list_batch(to_update, n=50)]
+            new_data, failed = self._get_batches(
+                client.get_videos,
+                to_update,
+                live_details,
+                max_results=50,
+                notify=notify_and_raise,
+                raise_exc=notify_and_raise,
+            )
             if any(new_data):
                 new_data = {
                     yt_item['id']: yt_item
                     for batch in new_data
+                    if batch
                     for yt_item in batch.get('items', [])
                     if yt_item
                 }
@@ -656,8 +861,10 @@ class ResourceManager(object):
                 num=len(to_update),
                 ids=to_update,
             )
-            new_data = dict(dict.fromkeys(to_update, {'_unavailable': True}),
-                            **new_data)
+            new_data = dict(dict.fromkeys(
+                [id_ for id_ in to_update if id_ not in failed],
+                {'_unavailable': True},
+            ), **new_data)
             result.update(new_data)
             self.cache_data(new_data, defer=defer_cache)
 
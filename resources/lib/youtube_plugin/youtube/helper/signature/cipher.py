@@ -23,10 +23,15 @@ class Cipher(object):
         self._object_cache = {}
 
     def get_signature(self, signature):
+        if not self._javascript:
+            return ''
+
+        # Keyed by player version so that the player JavaScript is only read
+        # from disk if the json script has not already been cached
         function_cache = self._context.get_function_cache()
         json_script = function_cache.run(self._load_javascript,
                                          function_cache.ONE_DAY,
-                                         javascript=self._javascript)
+                                         version=self._javascript.version)
 
         if json_script:
             json_script_engine = JsonScriptEngine(json_script)
@@ -34,7 +39,11 @@ class Cipher(object):
 
         return ''
 
-    def _load_javascript(self, javascript):
+    def _load_javascript(self, version):
+        javascript = self._javascript.load()
+        if not javascript:
+            raise Exception('Player JavaScript not found: %s' % version)
+
         function_name = self._find_signature_function_name(javascript)
         if not function_name:
             raise Exception('Signature function not found')
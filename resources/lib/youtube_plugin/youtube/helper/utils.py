@@ -1221,9 +1221,12 @@ def update_channel_info(provider,
     channel_ids = list(channel_items_dict)
     if channel_ids and not data:
         resource_manager = provider.get_resource_manager(context)
-        data = resource_manager.get_channel_info(channel_ids,
-                                                 channel_data=channel_data,
-                                                 suppress_errors=True)
+        data = resource_manager.get_channel_info(
+            channel_ids,
+            channel_data=channel_data,
+            suppress_errors=True,
+            max_stale=(3 * context.get_data_cache().ONE_MONTH),
+        )
 
     if not data:
         return
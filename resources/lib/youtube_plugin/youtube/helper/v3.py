@@ -533,6 +533,7 @@ def _process_list_response(provider,
         progress_dialog.update(steps=delta)
 
     resource_manager = provider.get_resource_manager(context, progress_dialog)
+    max_stale = context.get_data_cache().ONE_WEEK
     resources = {
         1: {
             'fetcher': resource_manager.get_videos,
@@ -568,6 +569,7 @@ def _process_list_response(provider,
             ),
             'kwargs': {
                 'defer_cache': True,
+                'max_stale': max_stale,
             },
             'thread': None,
             'updater': update_playlist_items,
@@ -591,6 +593,7 @@ def _process_list_response(provider,
             'kwargs': {
                 '_force_run': True,
                 'defer_cache': True,
+                'max_stale': max_stale,
             },
             'thread': None,
             'updater': update_channel_items,
@@ -68,6 +68,7 @@ def _process_related_videos(provider, context, client):
             client.get_related_for_home,
             function_cache.ONE_HOUR,
             _refresh=refresh,
+            _max_stale=function_cache.ONE_DAY,
         )
         if not json_data:
             return False, None
@@ -137,6 +138,7 @@ def _process_recommendations(provider, context, client):
         client.get_browse_items,
         function_cache.ONE_HOUR,
         _refresh=refresh,
+        _max_stale=function_cache.ONE_DAY,
         browse_id=browse_id,
         client=browse_client,
         do_auth=True,